@@ -2176,77 +2176,79 @@ print(json.dumps({"id": id_, "filePath": filePath}, ensure_ascii=False))
         return { storageName }
     }
 
-    const postVideoToSocialAutoUpload = async (payload: Record<string, any>) => {
-        await new Promise<void>((resolve, reject) => {
-            const body = JSON.stringify(payload)
-            const req = http.request('http://127.0.0.1:5409/postVideo', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                    'Content-Length': Buffer.byteLength(body),
-                },
-            }, (res) => {
-                let data = ''
-                res.on('data', (c) => data += c.toString())
-                res.on('end', () => {
-                    const status = res.statusCode || 0
+    const buildSocialAutoUploadHint = () => {
+        const userData = app.getPath('userData')
+        const logFile = path.join(userData, 'logs', 'social-auto-upload.log')
+        const mediaDir = path.join(userData, 'social-auto-upload', 'media')
 
-                    const userData = app.getPath('userData')
-                    const logFile = path.join(userData, 'logs', 'social-auto-upload.log')
-                    const mediaDir = path.join(userData, 'social-auto-upload', 'media')
-
-                    const rejectCancelled = (msg?: string) => {
-                        const err: any = new Error(msg || '鐢ㄦ埛鍙栨秷鍙戝竷')
-                        err.name = 'PublishCancelledError'
-                        err.code = 499
-                        err.httpStatus = status
-                        reject(err)
-                    }
+        const tailLog = () => {
+            try {
+                if (!fs.existsSync(logFile)) return ''
+                const buf = fs.readFileSync(logFile)
+                const slice = buf.length > 65536 ? buf.subarray(buf.length - 65536) : buf
+                const text = stripAnsi(slice.toString('utf-8'))
+                const lines = text.split(/\r?\n/g).filter(Boolean)
+                return lines.slice(-120).join('\n')
+            } catch {
+                return ''
+            }
+        }
 
-                    const tailLog = () => {
+        const listMedia = () => {
+            try {
+                if (!fs.existsSync(mediaDir)) return [] as string[]
+                const items = fs.readdirSync(mediaDir)
+                    .map((name) => {
+                        const p = path.join(mediaDir, name)
                         try {
-                            if (!fs.existsSync(logFile)) return ''
-                            const buf = fs.readFileSync(logFile)
-                            const slice = buf.length > 65536 ? buf.subarray(buf.length - 65536) : buf
-                            const text = stripAnsi(slice.toString('utf-8'))
-                            const lines = text.split(/\r?\n/g).filter(Boolean)
-                            return lines.slice(-120).join('\n')
+                            const st = fs.statSync(p)
+                            return { name, mtime: st.mtimeMs }
                         } catch {
-                            return ''
+                            return { name, mtime: 0 }
                         }
-                    }
+                    })
+                    .sort((a, b) => b.mtime - a.mtime)
+                    .slice(0, 10)
+                    .map(x => x.name)
+                return items
+            } catch {
+                return [] as string[]
+            }
+        }
 
-                    const listMedia = () => {
-                        try {
-                            if (!fs.existsSync(mediaDir)) return [] as string[]
-                            const items = fs.readdirSync(mediaDir)
-                                .map((name) => {
-                                    const p = path.join(mediaDir, name)
-                                    try {
-                                        const st = fs.statSync(p)
-                                        return { name, mtime: st.mtimeMs }
-                                    } catch {
-                                        return { name, mtime: 0 }
-                                    }
-                                })
-                                .sort((a, b) => b.mtime - a.mtime)
-                                .slice(0, 10)
-                                .map(x => x.name)
-                            return items
-                        } catch {
-                            return [] as string[]
-                        }
-                    }
+        const tail = tailLog()
+        const media = listMedia()
+        return [
+            `璇锋煡鐪嬫棩蹇楋細${logFile}`,
+            media.length ? `璇婃柇鏂囦欢锛堟渶鏂?10 涓級锛?{media.join(', ')}` : '',
+            tail ? `---- social-auto-upload.log (tail) ----\n${tail}` : '',
+        ].filter(Boolean).join('\n')
+    }
 
-                    const buildHint = () => {
-                        const tail = tailLog()
-                        const media = listMedia()
-                        return [
-                            `璇锋煡鐪嬫棩蹇楋細${logFile}`,
-                            media.length ? `璇婃柇鏂囦欢锛堟渶鏂?10 涓級锛?{media.join(', ')}` : '',
-                            tail ? `---- social-auto-upload.log (tail) ----\n${tail}` : '',
-                        ].filter(Boolean).join('\n')
-                    }
+    const createPublishCancelledError = (msg?: string, httpStatus = 499) => {
+        const err: any = new Error(msg || '鐢ㄦ埛鍙栨秷鍙戝竷')
+        err.name = 'PublishCancelledError'
+        err.code = 499
+        err.httpStatus = httpStatus
+        return err
+    }
+
+    const requestSocialAutoUpload = async (urlPath: string, payload?: Record<string, any>) => {
+        return await new Promise<any>((resolve, reject) => {
+            const body = payload ? JSON.stringify(payload) : ''
+            const req = http.request(`http://127.0.0.1:5409${urlPath}`, {
+                method: payload ? 'POST' : 'GET',
+                headers: payload ? {
+                    'Content-Type': 'application/json',
+                    'Content-Length': Buffer.byteLength(body),
+                } : {},
+            }, (res) => {
+                let data = ''
+                res.on('data', (c) => data += c.toString())
+                res.on('end', () => {
+                    const status = res.statusCode || 0
+                    const rejectCancelled = (msg?: string) => reject(createPublishCancelledError(msg, status))
+                    const buildHint = buildSocialAutoUploadHint
 
                     if (status === 499) {
                         try {
@@ -2265,7 +2267,8 @@ print(json.dumps({"id": id_, "filePath": filePath}, ensure_ascii=False))
                     }
                     try {
                         const parsed = JSON.parse(data)
-                        if (parsed?.code && parsed.code !== 200) {
+                        // 202：同步等待超时，任务仍在后台执行
+                        if (parsed?.code && parsed.code !== 200 && parsed.code !== 202) {
                             if (parsed.code === 499) {
                                 rejectCancelled(parsed?.msg || '鐢ㄦ埛鍙栨秷鍙戝竷')
                                 return
@@ -2274,18 +2277,58 @@ print(json.dumps({"id": id_, "filePath": filePath}, ensure_ascii=False))
                             reject(new Error(`鍙戝竷澶辫触: ${parsed?.msg || data.slice(0, 200)}\n${hint ? `\n${hint}` : ''}`))
                             return
                         }
-                        resolve()
+                        resolve(parsed)
                     } catch {
-                        resolve()
+                        resolve(null)
                     }
                 })
             })
             req.on('error', reject)
-            req.write(body)
+            if (payload) req.write(body)
             req.end()
         })
     }
 
+    const SOCIAL_AUTO_UPLOAD_JOB_POLL_MS = 3000
+    // 轮询 /getJob 的最长时间：后端等待上传（UPLOAD_WAIT_TIMEOUT 3600s）+ 等待发布确认（PUBLISH_CONFIRM_TIMEOUT 600s），再留 5 分钟余量
+    const SOCIAL_AUTO_UPLOAD_JOB_MAX_WAIT_MS = (3600 + 600 + 300) * 1000
+
+    // 与 sau_backend /postVideo 的判断一致：用户关闭浏览器窗口或任务被取消，视为取消发布
+    const isPublishCancelledMessage = (msg: string) => {
+        const low = msg.toLowerCase()
+        return low.includes('target closed') || low.includes('browser has been closed') || low.includes('page closed') || msg.includes('任务已取消')
+    }
+
+    // 返回 { jobId, status }：status 为 'success'，或超过最长等待时间后为 'running'（任务仍在后台执行）
+    const postVideoToSocialAutoUpload = async (payload: Record<string, any>, signal?: AbortSignal) => {
+        const posted = await requestSocialAutoUpload('/postVideo', payload)
+        const jobId = posted?.data?.jobId
+        if (!jobId) return { jobId: undefined, status: 'success' }
+        // 发布在后台任务中执行：按 jobId 轮询 /getJob 直到结束，不再挂起一个长时间的请求
+        const deadline = Date.now() + SOCIAL_AUTO_UPLOAD_JOB_MAX_WAIT_MS
+        while (Date.now() < deadline) {
+            if (signal?.aborted) {
+                // 用户取消：通知后端取消任务，取消失败（如任务刚好结束）不影响本地退出
+                await requestSocialAutoUpload(`/cancelJob?id=${encodeURIComponent(jobId)}`, {}).catch(() => undefined)
+                throw createPublishCancelledError()
+            }
+            const polled = await requestSocialAutoUpload(`/getJob?id=${encodeURIComponent(jobId)}`)
+            const job = polled?.data
+            if (job?.status === 'success') return { jobId, status: 'success' }
+            if (job?.status === 'failed') {
+                const msg = String((job.tasks || []).map((t: any) => t?.error).find(Boolean) || '')
+                if (isPublishCancelledMessage(msg)) throw createPublishCancelledError()
+                const hint = buildSocialAutoUploadHint()
+                throw new Error(`发布失败: ${msg.slice(0, 2000) || 'unknown'}\n${hint ? `\n${hint}` : ''}`)
+            }
+            await new Promise<void>((r) => {
+                const timer = setTimeout(r, SOCIAL_AUTO_UPLOAD_JOB_POLL_MS)
+                signal?.addEventListener('abort', () => { clearTimeout(timer); r() }, { once: true })
+            })
+        }
+        return { jobId, status: 'running' }
+    }
+
     const pickLatestPublishCookieEntry = (platform: PublishPlatformKey) => {
         const entries = readPublishCookieStore().filter(e => e.platform === platform)
         if (!entries.length) return null
@@ -2308,6 +2351,7 @@ print(json.dumps({"id": id_, "filePath": filePath}, ensure_ascii=False))
     }
 
     let publishOneClickBusy = false
+    let publishOneClickController: AbortController | null = null
 
     ipcMain.handle('social-auto-upload-open', async (_event, params?: { videoPath?: string, title?: string }) => {
         try {
@@ -2346,12 +2390,15 @@ print(json.dumps({"id": id_, "filePath": filePath}, ensure_ascii=False))
         const platforms = Array.isArray(params?.platforms) ? params.platforms : []
         const videoPath = (params?.videoPath || '').trim()
         const title = (params?.title || '').trim()
+        let controller: AbortController | null = null
 
         try {
             if (publishOneClickBusy) {
                 throw new Error('正在发布中，请等待当前发布完成后再试（避免重复点击导致不稳定）')
             }
             publishOneClickBusy = true
+            controller = new AbortController()
+            publishOneClickController = controller
 
             logPublish('publish-one-click:start', { platforms, hasVideoPath: !!videoPath, titleLen: title.length })
             if (!videoPath || !fs.existsSync(videoPath)) throw new Error('鏈壘鍒拌鍙戝竷鐨勮棰戞枃浠讹紝璇峰厛瀹屾垚鍑虹墖')
@@ -2377,10 +2424,11 @@ print(json.dumps({"id": id_, "filePath": filePath}, ensure_ascii=False))
             const { storageName } = await uploadToSocialAutoUpload(videoPath, filenameBase)
             logPublish('publish-one-click:uploadSave:ok', { storageName })
 
-            const results: Array<{ platform: PublishPlatformKey; ok: boolean; error?: string }> = []
+            const results: Array<{ platform: PublishPlatformKey; ok: boolean; error?: string; pending?: boolean; jobId?: string }> = []
             let cancelled = false
             for (const platform of platforms) {
                 try {
+                    if (controller.signal.aborted) throw createPublishCancelledError()
                     const entry = pickLatestPublishCookieEntry(platform)
                     if (!entry) throw new Error(`未找到「${platform}」的 Cookie，请先在「设置 → 全网分发账号」里保存一次`)
 
@@ -2398,7 +2446,13 @@ print(json.dumps({"id": id_, "filePath": filePath}, ensure_ascii=False))
                     }
                     if (platform === 'douyin' && fs.existsSync(coverPath)) payload.thumbnail = coverPath
 
-                    await postVideoToSocialAutoUpload(payload)
+                    const job = await postVideoToSocialAutoUpload(payload, controller.signal)
+                    if (job.status === 'running') {
+                        // 超过最长等待时间仍未结束：不再轮询，任务留在后台继续，可在 social-auto-upload 中按 jobId 查看
+                        logPublish('publish-one-click:postVideo:still-running', { platform, jobId: job.jobId })
+                        results.push({ platform, ok: true, pending: true, jobId: job.jobId })
+                        continue
+                    }
                     logPublish('publish-one-click:postVideo:ok', { platform })
                     results.push({ platform, ok: true })
                 } catch (e: any) {
@@ -2439,10 +2493,21 @@ print(json.dumps({"id": id_, "filePath": filePath}, ensure_ascii=False))
             logPublish('publish-one-click:error', { error: safeErrorMessage(error), logFile })
             return { success: false, error: `${safeErrorMessage(error)}；请查看日志：${logFile}` }
         } finally {
-            publishOneClickBusy = false
+            if (controller) {
+                // 只有本次调用真正开始发布时才释放占用，重复点击被拒绝时不影响正在进行的发布
+                publishOneClickBusy = false
+                if (publishOneClickController === controller) publishOneClickController = null
+            }
         }
     })
 
+    ipcMain.handle('publish-one-click-cancel', async () => {
+        if (!publishOneClickController) return { success: false, error: '当前没有进行中的发布' }
+        try { publishOneClickController.abort() } catch { /* ignore */ }
+        logPublish('publish-one-click:cancel', {})
+        return { success: true }
+    })
+
     ipcMain.handle('publish-cookie-apply', async (_event, params: { platform: PublishPlatformKey; userName: string }) => {
         try {
             const platform = params?.platform
@@ -4,3 +4,50 @@ BASE_DIR = Path(__file__).parent.resolve()
 XHS_SERVER = "http://127.0.0.1:11901"
 LOCAL_CHROME_PATH = ""   # change me necessary！ for example C:/Program Files/Google/Chrome/Application/chrome.exe
 LOCAL_CHROME_HEADLESS = False
+# 后台发布队列的工作线程数（实际并发还受下面的上限约束）。所有工作线程的上传在同一个事件循环中执行，
+# 共用一个浏览器池：同样启动参数的上传共用一个 Chromium 进程，而不是每个工作线程各启动一个
+PUBLISH_WORKERS = 4
+# 浏览器池（整个发布队列共用一个）中单个浏览器最多复用多少次（分配多少个账号上下文）后重启
+BROWSER_POOL_MAX_USES = 20
+# 本机同时进行的上传总数上限
+PUBLISH_MAX_CONCURRENCY = 4
+# 每个平台同时进行的上传数上限（1 小红书 2 视频号 3 抖音 4 快手），同一账号始终逐个上传
+PUBLISH_PLATFORM_CONCURRENCY = {1: 2, 2: 2, 3: 3, 4: 2}
+# /postVideo 传 wait=true 时最多同步等待多少秒，超时返回 202 和 jobId
+POST_VIDEO_WAIT_TIMEOUT = 30
+# 点击发布后等待发布成功的最长时间（秒），超时任务记为失败
+PUBLISH_CONFIRM_TIMEOUT = 600
+# 等待视频上传完成的最长时间（秒），上传进度由页面 DOM 变化触发检查
+UPLOAD_WAIT_TIMEOUT = 3600
+# 上传和 cookie 校验时拦截图片、字体、音视频预览和第三方统计请求（精简模式），页面异常时可关闭
+LEAN_CONTEXT = True
+# 精简模式下默认放行页面、脚本、样式、图片（扫码登录二维码、验证码）和接口请求；按平台收窄放行的资源类型，
+# 只放行列表中的类型，例如 {"tencent": ["document", "script", "stylesheet", "xhr", "fetch", "websocket", "other"]} 不加载图片
+LEAN_ALLOWED_RESOURCES = {}
+# 诊断快照：正常流程中记录快照的上传比例（0~1）、每次上传在内存中保留的快照数、media/diagnostics 的总大小上限（字节）
+# 快照只在上传失败时写入磁盘
+DIAGNOSTICS_SAMPLE_RATE = 0.1
+DIAGNOSTICS_BUFFER_SIZE = 5
+DIAGNOSTICS_MAX_BYTES = 200 * 1024 * 1024
+# 批量校验账号 cookie 时同时打开的页面数
+COOKIE_CHECK_CONCURRENCY = 5
+# 账号 cookie 校验结果缓存（秒）：TTL 内直接返回上次结果，过期但不超过 STALE 时先返回旧结果并在后台重新校验
+COOKIE_CHECK_TTL = 600
+COOKIE_CHECK_STALE = 86400
+# 校验 cookie 时先请求平台的创作者接口快速判断，无法判断时再打开浏览器
+COOKIE_PROBE_ENABLED = True
+COOKIE_PROBE_TIMEOUT = 3
+# 接口探测的地址前缀，留空使用平台真实域名；调试时可指向本地桩服务，例如 http://127.0.0.1:8000
+COOKIE_PROBE_BASE_URL = ""
+# SQLite 连接池的空闲连接数、数据库被锁时的最长等待时间（毫秒）
+DB_POOL_SIZE = 8
+DB_BUSY_TIMEOUT = 30000
+# 分片上传：单个文件大小上限（字节）、建议分片大小（字节）、未完成会话的保留时间（秒）
+UPLOAD_MAX_SIZE = 8 * 1024 * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+UPLOAD_SESSION_TTL = 86400
+# 上传后在后台用 ffprobe / ffmpeg 提取视频时长、分辨率、编码、码率和封面；留空时从 PATH 查找，找不到则跳过
+FFPROBE_PATH = ""
+FFMPEG_PATH = ""
+MEDIA_INFO_WORKERS = 2
+MEDIA_INFO_TIMEOUT = 60
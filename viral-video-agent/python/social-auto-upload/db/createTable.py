@@ -1,6 +1,10 @@
 import sqlite3
-import json
-import os
+import sys
+from pathlib import Path
+
+# 表结构统一定义在 myUtils/db.py 的 SCHEMA 中，这里直接复用
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from myUtils.db import migrate  # noqa: E402
 
 # 数据库文件路径（如果不存在会自动创建）
 db_file = './database.db'
@@ -11,32 +15,9 @@ db_file = './database.db'
 
 # 连接到SQLite数据库（如果文件不存在则会自动创建）
 conn = sqlite3.connect(db_file)
-cursor = conn.cursor()
-
-# 创建账号记录表
-cursor.execute('''
-CREATE TABLE IF NOT EXISTS user_info (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    type INTEGER NOT NULL,
-    filePath TEXT NOT NULL,  -- 存储文件路径
-    userName TEXT NOT NULL,
-    status INTEGER DEFAULT 0
-)
-''')
-
-# 创建文件记录表
-cursor.execute('''CREATE TABLE IF NOT EXISTS file_records (
-    id INTEGER PRIMARY KEY AUTOINCREMENT, -- 唯一标识每条记录
-    filename TEXT NOT NULL,               -- 文件名
-    filesize REAL,                     -- 文件大小（单位：MB）
-    upload_time DATETIME DEFAULT CURRENT_TIMESTAMP, -- 上传时间，默认当前时间
-    file_path TEXT                        -- 文件路径
-)
-''')
-
 
-# 提交更改
-conn.commit()
+# 创建所有表和索引（已存在的表会补齐缺少的字段），并提交更改
+migrate(conn)
 print("✅ 表创建成功")
 # 关闭连接
-conn.close()
\ No newline at end of file
+conn.close()
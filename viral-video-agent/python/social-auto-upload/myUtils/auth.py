@@ -1,22 +1,43 @@
 import asyncio
 import configparser
 import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
-from playwright.async_api import async_playwright
+from playwright.async_api import Error as PlaywrightError
 from xhs import XhsClient
 
-from conf import BASE_DIR, LOCAL_CHROME_HEADLESS
+import conf
+from conf import BASE_DIR
+from myUtils import db
 from utils.base_social_media import set_init_script
+from utils import metrics
+from utils.browser_pool import browser_context, shared_browser_pool
+from utils.cookie_probe import probe_cookie
 from utils.log import tencent_logger, kuaishou_logger, douyin_logger
+from utils.network import RetryPolicy
 from pathlib import Path
+from uploader.douyin_uploader.main import wait_for_login_state
 from uploader.xhs_uploader.main import sign_local
 
+# cookie 校验结果的有效期（秒），可在 conf.py 中通过 COOKIE_CHECK_TTL 配置
+DEFAULT_CHECK_TTL = 600
+# 过期后仍可先返回旧结果（同时后台重新校验）的最长时间（秒），可通过 COOKIE_CHECK_STALE 配置
+DEFAULT_CHECK_STALE = 24 * 3600
+
+# 后台重新校验：同一账号同时只有一个校验在跑
+_revalidating = set()
+_revalidate_lock = threading.Lock()
+_revalidate_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="cookie-revalidate")
+# 浏览器校验时打开页面失败（网络抖动）再试一次，浏览器已关闭等错误不重试
+BROWSER_CHECK_RETRY = RetryPolicy('cookie_browser', max_attempts=2, base_delay=1, max_delay=2,
+                                  retry_on=(PlaywrightError,))
+
 
 async def cookie_auth_douyin(account_file):
-    async with async_playwright() as playwright:
-        browser = await playwright.chromium.launch(headless=LOCAL_CHROME_HEADLESS)
-        context = await browser.new_context(storage_state=account_file)
-        context = await set_init_script(context)
+    async with browser_context(storage_state=account_file) as context:
+        context = await set_init_script(context, 'douyin', lean=True)
         # 创建一个新的页面
         page = await context.new_page()
         # 访问指定的 URL
@@ -24,27 +45,21 @@ async def cookie_auth_douyin(account_file):
         try:
             await page.wait_for_url("https://creator.douyin.com/creator-micro/content/upload", timeout=5000)
             # 2024.06.17 抖音创作者中心改版
-            # 判断
-            # 等待“扫码登录”元素出现，超时 5 秒（如果 5 秒没出现，说明 cookie 有效）
-            try:
-                await page.get_by_text("扫码登录").wait_for(timeout=5000)
-                douyin_logger.error("[+] cookie 失效，需要扫码登录")
+            # 等待登录页特征（登录文字、手机号输入框、二维码、登录地址）出现，超时 5 秒（如果 5 秒没出现，说明 cookie 有效）
+            verdict = await wait_for_login_state(page, True, timeout=5)
+            if verdict:
+                douyin_logger.error(f"[+] cookie 失效，需要扫码登录 {verdict['signals']}")
                 return False
-            except:
-                douyin_logger.success("[+]  cookie 有效")
-                return True
+            douyin_logger.success("[+]  cookie 有效")
+            return True
         except:
             douyin_logger.error("[+] 等待5秒 cookie 失效")
-            await context.close()
-            await browser.close()
             return False
 
 
 async def cookie_auth_tencent(account_file):
-    async with async_playwright() as playwright:
-        browser = await playwright.chromium.launch(headless=LOCAL_CHROME_HEADLESS)
-        context = await browser.new_context(storage_state=account_file)
-        context = await set_init_script(context)
+    async with browser_context(storage_state=account_file) as context:
+        context = await set_init_script(context, 'tencent', lean=True)
         # 创建一个新的页面
         page = await context.new_page()
         # 访问指定的 URL
@@ -59,10 +74,8 @@ async def cookie_auth_tencent(account_file):
 
 
 async def cookie_auth_ks(account_file):
-    async with async_playwright() as playwright:
-        browser = await playwright.chromium.launch(headless=LOCAL_CHROME_HEADLESS)
-        context = await browser.new_context(storage_state=account_file)
-        context = await set_init_script(context)
+    async with browser_context(storage_state=account_file) as context:
+        context = await set_init_script(context, 'kuaishou', lean=True)
         # 创建一个新的页面
         page = await context.new_page()
         # 访问指定的 URL
@@ -78,10 +91,8 @@ async def cookie_auth_ks(account_file):
 
 
 async def cookie_auth_xhs(account_file):
-    async with async_playwright() as playwright:
-        browser = await playwright.chromium.launch(headless=LOCAL_CHROME_HEADLESS)
-        context = await browser.new_context(storage_state=account_file)
-        context = await set_init_script(context)
+    async with browser_context(storage_state=account_file) as context:
+        context = await set_init_script(context, 'xiaohongshu', lean=True)
         # 创建一个新的页面
         page = await context.new_page()
         # 访问指定的 URL
@@ -90,8 +101,6 @@ async def cookie_auth_xhs(account_file):
             await page.wait_for_url("https://creator.xiaohongshu.com/creator-micro/content/upload", timeout=5000)
         except:
             print("[+] 等待5秒 cookie 失效")
-            await context.close()
-            await browser.close()
             return False
         # 2024.06.17 抖音创作者中心改版
         if await page.get_by_text('手机号登录').count() or await page.get_by_text('扫码登录').count():
@@ -102,7 +111,7 @@ async def cookie_auth_xhs(account_file):
             return True
 
 
-async def check_cookie(type, file_path):
+async def _check_cookie_in_browser(type, file_path):
     match type:
         # 小红书
         case 1:
@@ -119,5 +128,113 @@ async def check_cookie(type, file_path):
         case _:
             return False
 
+async def check_cookie(type, file_path, max_age=None):
+    """
+    校验账号 cookie 是否有效，结果缓存在 user_info 的 last_checked / last_result 中：
+    - 距上次校验不超过 max_age 秒（默认 conf.py 中 COOKIE_CHECK_TTL）直接返回上次的结果；
+    - 已过期但不超过 COOKIE_CHECK_STALE 秒时先返回上次的结果，同时在后台重新校验；
+    - 从未校验过或过期太久才用浏览器同步校验。max_age=0 表示强制重新校验。
+    """
+    ttl = getattr(conf, 'COOKIE_CHECK_TTL', DEFAULT_CHECK_TTL) if max_age is None else max_age
+    cached = _cached_result(type, file_path) if ttl > 0 else None
+    if cached is not None:
+        valid, age = cached
+        if age <= ttl:
+            metrics.COOKIE_CHECKS.inc(platform=metrics.platform_name(type), source='cache', result=int(valid))
+            return valid
+        if age <= getattr(conf, 'COOKIE_CHECK_STALE', DEFAULT_CHECK_STALE):
+            metrics.COOKIE_CHECKS.inc(platform=metrics.platform_name(type), source='cache', result=int(valid))
+            _schedule_revalidate(type, file_path)
+            return valid
+    valid = await _check_cookie_now(type, file_path)
+    _record_result(type, file_path, valid)
+    return valid
+
+
+async def _check_cookie_now(type, file_path):
+    # 先用接口快速探测，无法判断时再打开浏览器校验
+    platform = metrics.platform_name(type)
+    with metrics.timer(metrics.COOKIE_CHECK, platform=platform, source='probe'):
+        valid = await probe_cookie(type, Path(BASE_DIR / "cookiesFile" / file_path))
+    source = 'probe'
+    if valid is None:
+        source = 'browser'
+        with metrics.timer(metrics.COOKIE_CHECK, platform=platform, source=source):
+            valid = await BROWSER_CHECK_RETRY.run(_check_cookie_in_browser, type, file_path)
+    metrics.COOKIE_CHECKS.inc(platform=platform, source=source, result=int(bool(valid)))
+    return bool(valid)
+
+
+def _cached_result(type, file_path):
+    """返回 (上次结果, 距今秒数)，没有校验记录时返回 None"""
+    try:
+        return db.users.get_check(type, str(file_path))
+    except sqlite3.Error as e:
+        print(f"[+] 读取 cookie 校验缓存失败: {e}")
+        return None
+
+
+def _record_result(type, file_path, valid):
+    try:
+        db.users.record_check(type, str(file_path), valid)
+    except sqlite3.Error as e:
+        print(f"[+] 写入 cookie 校验缓存失败: {e}")
+
+
+def _schedule_revalidate(type, file_path):
+    key = (type, str(file_path))
+    with _revalidate_lock:
+        if key in _revalidating:
+            return
+        _revalidating.add(key)
+
+    def revalidate():
+        try:
+            valid = asyncio.run(_check_cookie_now(type, file_path))
+            _record_result(type, file_path, valid)
+        except Exception as e:
+            print(f"[+] 后台重新校验 cookie 失败 {file_path}: {e}")
+        finally:
+            with _revalidate_lock:
+                _revalidating.discard(key)
+
+    _revalidate_executor.submit(revalidate)
+
+# 批量校验时同时打开的账号页面数，可在 conf.py 中通过 COOKIE_CHECK_CONCURRENCY 配置
+DEFAULT_CHECK_CONCURRENCY = 5
+
+
+async def iter_check_cookies(accounts, concurrency=None, max_age=None):
+    """
+    并发校验一批账号，accounts 为 (id, type, filePath) 列表，按完成顺序产出 (id, 是否有效)。
+    所有校验共用一个浏览器，每个账号一个独立的 context。
+    """
+    concurrency = concurrency or getattr(conf, 'COOKIE_CHECK_CONCURRENCY', DEFAULT_CHECK_CONCURRENCY)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def check_one(id, type, file_path):
+        async with semaphore:
+            try:
+                return id, bool(await check_cookie(type, file_path, max_age))
+            except Exception as e:
+                print(f"[+] 校验账号 {id} 出错: {e}")
+                return id, False
+
+    async with shared_browser_pool():
+        tasks = [asyncio.ensure_future(check_one(*account)) for account in accounts]
+        try:
+            for future in asyncio.as_completed(tasks):
+                yield await future
+        finally:
+            # 调用方提前退出或被取消时，取消还没完成的校验，再关闭浏览器
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def check_cookies(accounts, concurrency=None, max_age=None):
+    """并发校验一批账号，返回 {id: 是否有效}"""
+    return {id: valid async for id, valid in iter_check_cookies(accounts, concurrency, max_age)}
+
 # a = asyncio.run(check_cookie(1,"3a6cfdc0-3d51-11f0-8507-44e51723d63c.json"))
 # print(a)
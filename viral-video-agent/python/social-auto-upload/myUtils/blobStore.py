@@ -0,0 +1,144 @@
+import hashlib
+import os
+import re
+import threading
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+from conf import BASE_DIR
+from myUtils import db
+
+VIDEO_DIR = Path(BASE_DIR / "videoFile")
+# 按内容哈希存放的视频：videoFile/blobs/<哈希前两位>/<sha256><扩展名>
+BLOB_DIR = VIDEO_DIR / "blobs"
+TMP_DIR = BLOB_DIR / "tmp"
+BUFFER_SIZE = 1024 * 1024
+BLOB_NAME_RE = re.compile(r'^([0-9a-f]{64})(\.[0-9A-Za-z]+)?$')
+
+
+def blob_relpath(sha256, ext=''):
+    """blob 相对 videoFile 的路径，写入 file_records.file_path"""
+    return f"blobs/{sha256[:2]}/{sha256}{ext.lower()}"
+
+
+def find_blob(name):
+    """按文件名（<sha256>.<扩展名>）找到 blob 的相对路径，前端只取了路径最后一段时使用"""
+    match = BLOB_NAME_RE.match(name or '')
+    if not match:
+        return None
+    relpath = blob_relpath(match.group(1), match.group(2) or '')
+    return relpath if (VIDEO_DIR / relpath).exists() else None
+
+
+def blob_hash(relpath):
+    """blob 路径中的内容哈希（用作强 ETag），不是 blob 时返回 None"""
+    if not relpath or not relpath.startswith('blobs/'):
+        return None
+    match = BLOB_NAME_RE.match(relpath.rsplit('/', 1)[-1])
+    return match.group(1) if match else None
+
+
+class BlobStore(object):
+    """
+    内容寻址的视频存储：相同内容（SHA-256 相同）只在磁盘上保存一份，
+    file_records 通过 content_hash 指向 blob，blobs.ref_count 记录被多少条素材引用，
+    引用数归零时删除文件。
+    """
+
+    def __init__(self):
+        # 引用计数的增减和文件的落盘 / 删除必须串行，避免刚删除的 blob 又被引用
+        self._lock = threading.Lock()
+
+    def lookup(self, sha256):
+        with db.connection() as conn:
+            row = conn.execute("SELECT * FROM blobs WHERE hash = ?", (sha256,)).fetchone()
+        if row and (VIDEO_DIR / row['path']).exists():
+            return dict(row)
+        return None
+
+    def _acquire_existing(self, conn, sha256, size=None):
+        row = conn.execute("SELECT path, size FROM blobs WHERE hash = ?", (sha256,)).fetchone()
+        if row is None:
+            return None
+        if size is not None and row['size'] is not None and row['size'] != size:
+            # 声明的大小与已存内容不一致，不能凭哈希认定是同一个文件
+            return None
+        if not (VIDEO_DIR / row['path']).exists():
+            # 文件被手动删除过，丢弃这条 blob 记录，按新文件处理
+            conn.execute("DELETE FROM blobs WHERE hash = ?", (sha256,))
+            return None
+        conn.execute("UPDATE blobs SET ref_count = ref_count + 1 WHERE hash = ?", (sha256,))
+        return row['path']
+
+    def acquire(self, sha256, size=None):
+        """
+        已存在的 blob 增加一次引用，返回相对路径；不存在时返回 None（秒传）。
+        传入 size 时还要求与已存内容的字节数一致
+        """
+        with self._lock, db.connection() as conn:
+            return self._acquire_existing(conn, sha256, size)
+
+    @contextmanager
+    def add(self, src_path, sha256, ext=''):
+        """
+        把已计算好哈希的文件放入存储并增加一次引用，with 块产出相对路径，调用方在块内写素材记录。
+        引用和素材记录在同一个短事务中提交，提交后才把 src_path 移入存储（内容已存在时删除 src_path）；
+        块内出错时事务回滚，src_path 原样保留，由调用方处理。调用时不能已处于外层事务中
+        """
+        with self._lock:
+            with db.connection() as conn:
+                relpath = self._acquire_existing(conn, sha256)
+                exists = relpath is not None
+                if not exists:
+                    relpath = blob_relpath(sha256, ext)
+                    conn.execute('''
+                    INSERT OR REPLACE INTO blobs (hash, path, size, ref_count)
+                    VALUES (?, ?, ?, 1)
+                    ''', (sha256, relpath, os.path.getsize(src_path)))
+                yield relpath
+            if exists:
+                os.remove(src_path)
+            else:
+                target = VIDEO_DIR / relpath
+                target.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(src_path, target)
+
+    def spool(self, stream):
+        """边写临时文件边计算 SHA-256，返回 (临时文件路径, sha256, 字节数)，不访问数据库"""
+        TMP_DIR.mkdir(parents=True, exist_ok=True)
+        tmp_path = TMP_DIR / f"{uuid.uuid4().hex}.tmp"
+        sha256 = hashlib.sha256()
+        size = 0
+        try:
+            with open(tmp_path, 'wb') as f:
+                while True:
+                    block = stream.read(BUFFER_SIZE)
+                    if not block:
+                        break
+                    f.write(block)
+                    sha256.update(block)
+                    size += len(block)
+        except BaseException:
+            if tmp_path.exists():
+                tmp_path.unlink()
+            raise
+        return tmp_path, sha256.hexdigest(), size
+
+    def release(self, sha256):
+        """减少一次引用，引用数归零时删除文件"""
+        with self._lock, db.connection() as conn:
+            row = conn.execute("SELECT path, ref_count FROM blobs WHERE hash = ?", (sha256,)).fetchone()
+            if row is None:
+                return
+            if row['ref_count'] > 1:
+                conn.execute("UPDATE blobs SET ref_count = ref_count - 1 WHERE hash = ?", (sha256,))
+                return
+            conn.execute("DELETE FROM blobs WHERE hash = ?", (sha256,))
+            path = VIDEO_DIR / row['path']
+            if path.exists():
+                path.unlink()
+                print(f"✅ 实际文件已删除: {path}")
+
+
+blob_store = BlobStore()
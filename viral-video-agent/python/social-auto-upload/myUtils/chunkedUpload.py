@@ -0,0 +1,247 @@
+import hashlib
+import os
+import threading
+import uuid
+from pathlib import Path
+
+import conf
+from conf import BASE_DIR
+from myUtils import db
+from myUtils.blobStore import blob_store
+from myUtils.mediaInfo import media_info
+
+VIDEO_DIR = Path(BASE_DIR / "videoFile")
+# 单个文件的大小上限（字节），可在 conf.py 中通过 UPLOAD_MAX_SIZE 配置
+DEFAULT_MAX_SIZE = 8 * 1024 * 1024 * 1024
+# 建议的分片大小（字节），单个分片仍受 MAX_CONTENT_LENGTH 限制
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+# 超过这个时间（秒）没有新分片的会话在创建新会话时清理
+DEFAULT_SESSION_TTL = 24 * 3600
+# 读取请求体 / 重新计算哈希时的缓冲区大小
+BUFFER_SIZE = 1024 * 1024
+
+
+class UploadError(Exception):
+    """分片上传的业务错误，status 为返回给前端的 HTTP 状态码"""
+
+    def __init__(self, msg, status=400, data=None):
+        super().__init__(msg)
+        self.status = status
+        self.data = data
+
+
+class _HashState(object):
+    """会话的增量 SHA-256：hashed 为已计入哈希的字节数"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sha256 = hashlib.sha256()
+        self.hashed = 0
+
+
+class ChunkedUploadStore(object):
+    """
+    可断点续传的分片上传：
+    create 创建会话 -> write 按偏移量追加分片（直接写入 videoFile/ 下的 .part 文件，同时增量计算 SHA-256）
+    -> complete 校验大小 / 哈希后重命名为正式文件。
+    已写入的字节数以磁盘上 .part 文件大小为准，服务重启后客户端查询 offset 即可续传。
+    """
+
+    def __init__(self):
+        self._states = {}
+        self._states_lock = threading.Lock()
+
+    @property
+    def max_size(self):
+        return getattr(conf, 'UPLOAD_MAX_SIZE', DEFAULT_MAX_SIZE)
+
+    @property
+    def chunk_size(self):
+        return getattr(conf, 'UPLOAD_CHUNK_SIZE', DEFAULT_CHUNK_SIZE)
+
+    def _state(self, upload_id):
+        with self._states_lock:
+            if upload_id not in self._states:
+                self._states[upload_id] = _HashState()
+            return self._states[upload_id]
+
+    @staticmethod
+    def _part_path(session):
+        return VIDEO_DIR / f"{session['final_name']}.part"
+
+    def _get(self, upload_id):
+        with db.connection() as conn:
+            session = conn.execute("SELECT * FROM upload_sessions WHERE id = ?", (upload_id,)).fetchone()
+        if not session:
+            raise UploadError("upload session not found", 404)
+        return dict(session)
+
+    def create(self, filename, size, save=True, sha256=None):
+        """
+        创建上传会话。传入 sha256 且素材库中已有相同内容时直接完成（秒传），
+        返回的数据中 completed 为 true，不需要再上传分片
+        """
+        if not filename or '/' in filename or '\\' in filename or '..' in filename:
+            raise UploadError("invalid filename")
+        if not isinstance(size, int) or size <= 0:
+            raise UploadError("size must be a positive integer")
+        if size > self.max_size:
+            raise UploadError(f"file too large, max {self.max_size} bytes", 413)
+        self.prune()
+        upload_id = str(uuid.uuid1())
+        if save and sha256:
+            # blob 引用和素材记录在同一个事务中提交，写素材记录失败时引用一起回滚
+            with db.connection():
+                relpath = blob_store.acquire(sha256.lower(), size)
+                if relpath is not None:
+                    db.files.add(filename, round(float(size) / (1024 * 1024), 2), relpath, upload_id,
+                                 sha256.lower())
+            if relpath is not None:
+                media_info.schedule(relpath)
+                return {"uploadId": upload_id, "completed": True, "filename": filename, "filepath": relpath,
+                        "sha256": sha256.lower(), "size": size}
+        final_name = f"{upload_id}_{filename}"
+        VIDEO_DIR.mkdir(exist_ok=True)
+        self._part_path({"final_name": final_name}).touch()
+        with db.connection() as conn:
+            conn.execute('''
+            INSERT INTO upload_sessions (id, filename, final_name, size, save)
+            VALUES (?, ?, ?, ?, ?)
+            ''', (upload_id, filename, final_name, size, 1 if save else 0))
+        return self.status(upload_id)
+
+    def status(self, upload_id):
+        session = self._get(upload_id)
+        part = self._part_path(session)
+        offset = part.stat().st_size if part.exists() else 0
+        return {
+            "uploadId": upload_id,
+            "completed": False,
+            "filename": session['filename'],
+            "size": session['size'],
+            "offset": offset,
+            "chunkSize": self.chunk_size,
+        }
+
+    def _catch_up_hash(self, state, part, offset):
+        """内存中的哈希落后于磁盘（服务重启或并发重传）时，从磁盘补算"""
+        if state.hashed > offset:
+            state.sha256, state.hashed = hashlib.sha256(), 0
+        if state.hashed == offset:
+            return
+        with open(part, 'rb') as f:
+            f.seek(state.hashed)
+            remaining = offset - state.hashed
+            while remaining > 0:
+                block = f.read(min(BUFFER_SIZE, remaining))
+                if not block:
+                    break
+                state.sha256.update(block)
+                remaining -= len(block)
+        state.hashed = offset
+
+    def write(self, upload_id, offset, stream):
+        """
+        在 offset 处写入一个分片。offset 必须等于已写入的字节数；
+        小于时视为重传，跳过已写入的部分；大于时返回 409 和当前 offset，由客户端从该位置续传
+        """
+        session = self._get(upload_id)
+        part = self._part_path(session)
+        if not part.exists():
+            raise UploadError("upload session has been completed or aborted", 410)
+        state = self._state(upload_id)
+        with state.lock:
+            current = part.stat().st_size
+            if offset > current:
+                raise UploadError("offset mismatch", 409, {"offset": current})
+            self._catch_up_hash(state, part, current)
+            skip = current - offset
+            written = 0
+            try:
+                with open(part, 'ab') as f:
+                    while True:
+                        block = stream.read(BUFFER_SIZE)
+                        if not block:
+                            break
+                        if skip:
+                            # 重传中已落盘的部分直接丢弃
+                            dropped = min(skip, len(block))
+                            block = block[dropped:]
+                            skip -= dropped
+                            if not block:
+                                continue
+                        if current + written + len(block) > session['size']:
+                            raise UploadError("chunk exceeds declared file size", 400,
+                                              {"offset": current + written})
+                        f.write(block)
+                        state.sha256.update(block)
+                        written += len(block)
+            finally:
+                # 传输中断时已写入的部分保留，客户端从新的 offset 续传
+                state.hashed = current + written
+        with db.connection() as conn:
+            conn.execute("UPDATE upload_sessions SET updated_at = CURRENT_TIMESTAMP WHERE id = ?", (upload_id,))
+        return {"uploadId": upload_id, "offset": current + written, "size": session['size']}
+
+    def complete(self, upload_id, sha256=None):
+        """校验文件完整性并转为正式文件，返回与 /uploadSave 相同的 filename / filepath"""
+        session = self._get(upload_id)
+        part = self._part_path(session)
+        if not part.exists():
+            raise UploadError("upload session has been completed or aborted", 410)
+        state = self._state(upload_id)
+        with state.lock:
+            current = part.stat().st_size
+            if current != session['size']:
+                raise UploadError("upload incomplete", 409, {"offset": current})
+            self._catch_up_hash(state, part, current)
+            digest = state.sha256.hexdigest()
+            if sha256 and sha256.lower() != digest:
+                raise UploadError("sha256 mismatch", 422, {"sha256": digest})
+            if session['save']:
+                # 存入按内容寻址的存储，内容重复时不额外占用磁盘
+                # 写素材记录失败时 .part 文件保留，可以重新调用 complete
+                with blob_store.add(part, digest, os.path.splitext(session['filename'])[1]) as filepath:
+                    db.files.add(session['filename'], round(float(session['size']) / (1024 * 1024), 2),
+                                 filepath, upload_id, digest)
+                media_info.schedule(filepath)
+            else:
+                filepath = session['final_name']
+                os.replace(part, VIDEO_DIR / filepath)
+        self._forget(upload_id)
+        return {
+            "filename": session['filename'],
+            "filepath": filepath,
+            "sha256": digest,
+            "size": session['size'],
+        }
+
+    def abort(self, upload_id):
+        session = self._get(upload_id)
+        part = self._part_path(session)
+        if part.exists():
+            part.unlink()
+        self._forget(upload_id)
+
+    def _forget(self, upload_id):
+        with db.connection() as conn:
+            conn.execute("DELETE FROM upload_sessions WHERE id = ?", (upload_id,))
+        with self._states_lock:
+            self._states.pop(upload_id, None)
+
+    def prune(self):
+        """清理长时间没有新分片的会话和它们的 .part 文件"""
+        ttl = getattr(conf, 'UPLOAD_SESSION_TTL', DEFAULT_SESSION_TTL)
+        with db.connection() as conn:
+            expired = conn.execute('''
+            SELECT id, final_name FROM upload_sessions
+            WHERE updated_at < datetime('now', ?)
+            ''', (f"-{int(ttl)} seconds",)).fetchall()
+        for row in expired:
+            part = self._part_path(row)
+            if part.exists():
+                part.unlink()
+            self._forget(row['id'])
+
+
+upload_store = ChunkedUploadStore()
@@ -0,0 +1,464 @@
+import base64
+import json
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from queue import Queue, Empty, Full
+
+import conf
+from conf import BASE_DIR
+from utils import metrics
+from utils.progress import current_platform
+
+DB_PATH = Path(BASE_DIR / "db" / "database.db")
+# 空闲连接池大小，可在 conf.py 中通过 DB_POOL_SIZE 配置
+DEFAULT_POOL_SIZE = 8
+# 数据库被其他连接锁住时的最长等待时间（毫秒），可通过 DB_BUSY_TIMEOUT 配置
+DEFAULT_BUSY_TIMEOUT = 30000
+
+
+class ConnectionPool(object):
+    """
+    SQLite 连接池：连接开启 WAL（读写互不阻塞）和 busy_timeout，
+    每个线程同一时间独占一个连接，同一线程内嵌套使用时复用同一个连接，用完放回池中。
+    连接会缓存编译过的 SQL（cached_statements），固定的 SQL 语句相当于预编译语句。
+    """
+
+    def __init__(self, path=DB_PATH, size=None, busy_timeout=None):
+        self.path = path
+        self.size = size or getattr(conf, 'DB_POOL_SIZE', DEFAULT_POOL_SIZE)
+        self.busy_timeout = busy_timeout or getattr(conf, 'DB_BUSY_TIMEOUT', DEFAULT_BUSY_TIMEOUT)
+        self._idle = Queue(maxsize=self.size)
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    def _open(self):
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout / 1000, check_same_thread=False,
+                               cached_statements=256)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout)}")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _ensure_schema(self):
+        if self._initialized:
+            return
+        with self._init_lock:
+            if self._initialized:
+                return
+            conn = self._open()
+            try:
+                migrate(conn)
+            finally:
+                conn.close()
+            self._initialized = True
+
+    @contextmanager
+    def connection(self):
+        """取出一个连接；with 块正常结束时提交，出现异常时回滚"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            # 同一线程嵌套调用，直接复用外层连接，由外层负责提交
+            yield conn
+            return
+        self._ensure_schema()
+        try:
+            conn = self._idle.get_nowait()
+        except Empty:
+            conn = self._open()
+        self._local.conn = conn
+        start = time.perf_counter()
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            metrics.DB_QUERY.observe(time.perf_counter() - start, platform=current_platform())
+            self._local.conn = None
+            if conn.in_transaction:
+                conn.rollback()
+            try:
+                self._idle.put_nowait(conn)
+            except Full:
+                conn.close()
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except Empty:
+                return
+
+
+# file_records 中由 myUtils/mediaInfo.py 在上传后填写的视频元数据字段
+MEDIA_COLUMNS = {
+    'duration': 'REAL',
+    'width': 'INTEGER',
+    'height': 'INTEGER',
+    'codec': 'TEXT',
+    'bitrate': 'INTEGER',
+    'rotation': 'INTEGER',
+    'thumbnail': 'TEXT',
+    'media_status': 'TEXT',
+}
+
+
+# 所有表的建表语句，db/createTable.py 建库和 migrate() 升级旧库都用这一份
+SCHEMA = [
+    # 账号记录表
+    '''
+    CREATE TABLE IF NOT EXISTS user_info (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        type INTEGER NOT NULL,
+        filePath TEXT NOT NULL,  -- 存储文件路径
+        userName TEXT NOT NULL,
+        status INTEGER DEFAULT 0,
+        last_checked DATETIME,   -- 上次校验 cookie 的时间
+        last_result INTEGER      -- 上次校验结果 1 有效 0 无效
+    )
+    ''',
+    # 文件记录表
+    '''
+    CREATE TABLE IF NOT EXISTS file_records (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, -- 唯一标识每条记录
+        filename TEXT NOT NULL,               -- 文件名
+        filesize REAL,                     -- 文件大小（单位：MB）
+        upload_time DATETIME DEFAULT CURRENT_TIMESTAMP, -- 上传时间，默认当前时间
+        file_path TEXT,                       -- 文件路径
+        uuid TEXT,                            -- 文件唯一标识（file_path 中下划线前的部分）
+        content_hash TEXT,                    -- 文件内容 SHA-256，指向 blobs 表
+        duration REAL,                        -- 时长（秒）
+        width INTEGER,                        -- 视频宽（像素，未按 rotation 旋转）
+        height INTEGER,                       -- 视频高
+        codec TEXT,                           -- 视频编码，如 h264
+        bitrate INTEGER,                      -- 码率（bit/s）
+        rotation INTEGER,                     -- 旋转角度（手机竖拍常见 90 / -90）
+        thumbnail TEXT,                       -- 封面图，相对 videoFile 的路径 thumbnails/xxx.jpg
+        media_status TEXT                     -- 元数据提取状态：NULL 未处理 / done / failed / unavailable
+    )
+    ''',
+    # 内容寻址的视频存储表（相同内容只存一份，按引用数删除）
+    '''
+    CREATE TABLE IF NOT EXISTS blobs (
+        hash TEXT PRIMARY KEY,                -- 文件内容 SHA-256
+        path TEXT NOT NULL,                   -- 相对 videoFile 的路径 blobs/ab/<hash>.mp4
+        size INTEGER,                         -- 文件大小（字节）
+        ref_count INTEGER NOT NULL DEFAULT 0, -- 引用该文件的素材数
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    # 分片上传会话表（/uploads 断点续传）
+    '''
+    CREATE TABLE IF NOT EXISTS upload_sessions (
+        id TEXT PRIMARY KEY,                  -- 上传会话ID
+        filename TEXT NOT NULL,               -- 原始文件名
+        final_name TEXT NOT NULL,             -- videoFile 下的最终文件名（uuid_文件名）
+        size INTEGER NOT NULL,                -- 文件总大小（字节）
+        save INTEGER DEFAULT 1,               -- 完成后是否写入 file_records（同 /uploadSave）
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    # 发布任务表（/postVideo 写入，后台工作线程消费）
+    '''
+    CREATE TABLE IF NOT EXISTS publish_jobs (
+        id TEXT PRIMARY KEY,                 -- 任务ID（uuid）
+        type INTEGER NOT NULL,               -- 平台标识 1 小红书 2 视频号 3 抖音 4 快手
+        payload TEXT NOT NULL,               -- 发布参数（JSON）
+        status TEXT NOT NULL DEFAULT 'pending',
+        batch_id TEXT,                       -- 所属批量任务（/postVideoBatch），单个发布为空
+        batch_index INTEGER,                 -- 在批量请求数组中的序号
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    # 发布子任务表（每个 文件 × 账号 一条）
+    '''
+    CREATE TABLE IF NOT EXISTS publish_tasks (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        job_id TEXT NOT NULL,                -- 所属任务
+        type INTEGER NOT NULL,               -- 平台标识
+        file_path TEXT NOT NULL,             -- videoFile 下的文件名
+        account_file TEXT NOT NULL,          -- cookiesFile 下的账号文件名
+        publish_date TEXT,                   -- 定时发布时间（ISO 格式），为空表示立即发布
+        status TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER DEFAULT 0,
+        error TEXT,
+        started_at DATETIME,
+        finished_at DATETIME
+    )
+    ''',
+    # 发布台账表（每个 视频内容 × 账号 × 平台 一条，已发布的组合不再重复发布）
+    '''
+    CREATE TABLE IF NOT EXISTS publish_ledger (
+        content_hash TEXT NOT NULL,           -- 视频内容 SHA-256
+        account TEXT NOT NULL,                -- 账号 cookie 文件名（user_info.filePath）
+        platform INTEGER NOT NULL,            -- 平台标识 1 小红书 2 视频号 3 抖音 4 快手
+        state TEXT NOT NULL DEFAULT 'pending',
+        job_id TEXT,                          -- 最近一次发布所属的任务
+        attempts INTEGER DEFAULT 0,
+        error TEXT,
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        published_at DATETIME,
+        PRIMARY KEY (content_hash, account, platform)
+    )
+    ''',
+]
+
+# 建表之后新增的字段：旧数据库的表里没有时用 ALTER TABLE 补上
+ADDED_COLUMNS = {
+    'user_info': {'last_checked': 'DATETIME', 'last_result': 'INTEGER'},
+    'file_records': {'uuid': 'TEXT', 'content_hash': 'TEXT', **MEDIA_COLUMNS},
+    'publish_jobs': {'batch_id': 'TEXT', 'batch_index': 'INTEGER'},
+}
+
+# 列表分页、筛选、排序用到的索引（依赖补上的字段，放在 ALTER 之后执行）
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_user_info_type ON user_info (type, id)",
+    "CREATE INDEX IF NOT EXISTS idx_user_info_status ON user_info (status, id)",
+    "CREATE INDEX IF NOT EXISTS idx_user_info_file ON user_info (filePath)",
+    "CREATE INDEX IF NOT EXISTS idx_file_records_upload_time ON file_records (upload_time, id)",
+    "CREATE INDEX IF NOT EXISTS idx_file_records_uuid ON file_records (uuid)",
+    "CREATE INDEX IF NOT EXISTS idx_file_records_content_hash ON file_records (content_hash)",
+    "CREATE INDEX IF NOT EXISTS idx_file_records_file_path ON file_records (file_path)",
+    "CREATE INDEX IF NOT EXISTS idx_publish_tasks_status ON publish_tasks (status, id)",
+    "CREATE INDEX IF NOT EXISTS idx_publish_tasks_job ON publish_tasks (job_id)",
+    "CREATE INDEX IF NOT EXISTS idx_publish_jobs_batch ON publish_jobs (batch_id, batch_index)",
+]
+
+
+def _columns(conn, table):
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def migrate(conn):
+    """按 SCHEMA 建表并补齐旧数据库缺少的字段和索引，只执行 IF NOT EXISTS / ALTER，可重复执行"""
+    for statement in SCHEMA:
+        conn.execute(statement)
+    for table, columns in ADDED_COLUMNS.items():
+        existing = _columns(conn, table)
+        for column, column_type in columns.items():
+            if column not in existing:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+    # 旧记录的 uuid 从 file_path 中拆出来补上
+    conn.execute('''
+    UPDATE file_records
+    SET uuid = CASE WHEN instr(file_path, '_') > 0 THEN substr(file_path, 1, instr(file_path, '_') - 1) ELSE '' END
+    WHERE uuid IS NULL AND file_path IS NOT NULL
+    ''')
+    for statement in INDEXES:
+        conn.execute(statement)
+    conn.commit()
+
+
+def encode_cursor(values):
+    """把分页位置（排序字段值, id）编码成不透明的字符串"""
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        raise ValueError("invalid cursor")
+    if not isinstance(values, list) or len(values) != 2:
+        raise ValueError("invalid cursor")
+    return values
+
+
+def _page_query(table, where, params, sort, order, limit, after):
+    """
+    按 (sort, id) 做 keyset 分页：after 为上一页返回的 next_cursor，
+    返回 (行列表, 下一页 cursor)，没有下一页时 cursor 为 None
+    """
+    where = list(where)
+    params = list(params)
+    op = '<' if order == 'desc' else '>'
+    if after:
+        value, last_id = decode_cursor(after)
+        if sort == 'id':
+            where.append(f"id {op} ?")
+            params.append(last_id)
+        else:
+            where.append(f"({sort}, id) {op} (?, ?)")
+            params.extend([value, last_id])
+    sql = f"SELECT * FROM {table}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    direction = 'DESC' if order == 'desc' else 'ASC'
+    sql += f" ORDER BY {sort} {direction}, id {direction}" if sort != 'id' else f" ORDER BY id {direction}"
+    if limit:
+        sql += " LIMIT ?"
+        params.append(limit + 1)
+    with connection() as conn:
+        rows = conn.execute(sql, params).fetchall()
+    next_cursor = None
+    if limit and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([rows[-1][sort], rows[-1]['id']])
+    return rows, next_cursor
+
+
+pool = ConnectionPool()
+
+
+def connection():
+    return pool.connection()
+
+
+class UserInfoRepository(object):
+    """账号表 user_info"""
+
+    def list(self):
+        with connection() as conn:
+            return conn.execute("SELECT * FROM user_info").fetchall()
+
+    def page(self, type=None, status=None, limit=None, after=None, order='asc'):
+        """按平台、状态筛选账号，按 id 分页"""
+        where, params = [], []
+        if type is not None:
+            where.append("type = ?")
+            params.append(type)
+        if status is not None:
+            where.append("status = ?")
+            params.append(status)
+        return _page_query('user_info', where, params, 'id', order, limit, after)
+
+    def get(self, id):
+        with connection() as conn:
+            return conn.execute("SELECT * FROM user_info WHERE id = ?", (id,)).fetchone()
+
+    def add(self, type, file_path, user_name, status=1):
+        """登录成功后记录账号，同时记为刚校验通过"""
+        with connection() as conn:
+            cursor = conn.execute('''
+            INSERT INTO user_info (type, filePath, userName, status, last_checked, last_result)
+            VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP, ?)
+            ''', (type, file_path, user_name, status, status))
+            return cursor.lastrowid
+
+    def update(self, id, type, user_name):
+        with connection() as conn:
+            conn.execute('''
+            UPDATE user_info
+            SET type     = ?,
+                userName = ?
+            WHERE id = ?
+            ''', (type, user_name, id))
+
+    def delete(self, id):
+        with connection() as conn:
+            conn.execute("DELETE FROM user_info WHERE id = ?", (id,))
+
+    def set_status_many(self, results):
+        """批量写入校验结果，results 为 {id: 是否有效}"""
+        with connection() as conn:
+            conn.executemany('''
+            UPDATE user_info
+            SET status = ?
+            WHERE id = ?
+            ''', [(1 if valid else 0, id) for id, valid in results.items()])
+
+    def get_check(self, type, file_path):
+        """返回 (上次结果, 距今秒数)，没有校验记录时返回 None"""
+        with connection() as conn:
+            row = conn.execute('''
+            SELECT last_result, (julianday('now') - julianday(last_checked)) * 86400
+            FROM user_info
+            WHERE type = ? AND filePath = ? AND last_checked IS NOT NULL
+            ''', (type, file_path)).fetchone()
+        if row is None or row[0] is None:
+            return None
+        return bool(row[0]), row[1]
+
+    def record_check(self, type, file_path, valid):
+        """只记录校验缓存，status 由 set_status_many 批量写入"""
+        with connection() as conn:
+            conn.execute('''
+            UPDATE user_info
+            SET last_checked = CURRENT_TIMESTAMP, last_result = ?
+            WHERE type = ? AND filePath = ?
+            ''', (int(valid), type, file_path))
+
+
+class FileRecordRepository(object):
+    """上传文件表 file_records"""
+
+    SORT_FIELDS = ('id', 'upload_time')
+
+    def list(self):
+        with connection() as conn:
+            return conn.execute("SELECT * FROM file_records").fetchall()
+
+    def page(self, limit=None, after=None, sort='id', order='asc', uploaded_from=None, uploaded_to=None):
+        """按上传时间筛选文件，按 id 或 upload_time 排序分页"""
+        if sort not in self.SORT_FIELDS:
+            raise ValueError(f"unsupported sort field: {sort}")
+        where, params = [], []
+        if uploaded_from:
+            where.append("upload_time >= ?")
+            params.append(uploaded_from)
+        if uploaded_to:
+            where.append("upload_time <= ?")
+            params.append(uploaded_to)
+        return _page_query('file_records', where, params, sort, order, limit, after)
+
+    def get(self, id):
+        with connection() as conn:
+            return conn.execute("SELECT * FROM file_records WHERE id = ?", (id,)).fetchone()
+
+    def add(self, filename, filesize, file_path, uuid='', content_hash=None):
+        with connection() as conn:
+            cursor = conn.execute('''
+            INSERT INTO file_records (filename, filesize, file_path, uuid, content_hash)
+            VALUES (?, ?, ?, ?, ?)
+            ''', (filename, filesize, file_path, uuid, content_hash))
+            return cursor.lastrowid
+
+    def delete(self, id):
+        with connection() as conn:
+            conn.execute("DELETE FROM file_records WHERE id = ?", (id,))
+
+    def exists_path(self, file_path):
+        with connection() as conn:
+            return conn.execute("SELECT 1 FROM file_records WHERE file_path = ? LIMIT 1",
+                                (file_path,)).fetchone() is not None
+
+    def media_pending(self):
+        """还没有提取过元数据（或上次本机没有 ffprobe）的文件路径，相同文件只返回一次"""
+        with connection() as conn:
+            rows = conn.execute('''
+            SELECT DISTINCT file_path FROM file_records
+            WHERE (media_status IS NULL OR media_status = 'unavailable') AND file_path IS NOT NULL
+            ''').fetchall()
+        return [row['file_path'] for row in rows]
+
+    def media_done(self, file_path):
+        """同一文件已提取好的元数据（秒传 / 重复上传的记录直接复用），没有时返回 None"""
+        with connection() as conn:
+            row = conn.execute(f'''
+            SELECT {', '.join(MEDIA_COLUMNS)} FROM file_records
+            WHERE file_path = ? AND media_status = 'done'
+            LIMIT 1
+            ''', (file_path,)).fetchone()
+        return dict(row) if row else None
+
+    def set_media(self, file_path, info):
+        """写入元数据，info 的键为 MEDIA_COLUMNS 中的字段，引用同一文件的记录一起更新"""
+        columns = [column for column in MEDIA_COLUMNS if column in info]
+        with connection() as conn:
+            conn.execute(f'''
+            UPDATE file_records
+            SET {', '.join(f"{column} = ?" for column in columns)}
+            WHERE file_path = ?
+            ''', [info[column] for column in columns] + [file_path])
+
+
+users = UserInfoRepository()
+files = FileRecordRepository()
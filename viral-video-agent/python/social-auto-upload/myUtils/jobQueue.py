@@ -0,0 +1,410 @@
+import asyncio
+import json
+import threading
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+import conf
+from conf import BASE_DIR
+from myUtils import db
+from myUtils.postVideo import publish_one, build_publish_dates
+from myUtils.publishLedger import publish_ledger
+from utils import metrics, progress
+from utils.browser_pool import install_browser_pool
+from utils.publish_limits import max_concurrency, platform_concurrency
+
+# 任务状态
+PENDING = 'pending'
+RUNNING = 'running'
+SUCCESS = 'success'
+FAILED = 'failed'
+# 发布台账中该 视频×账号×平台 已发布过，未重复发布
+SKIPPED = 'skipped'
+# 取消任务时未执行的子任务记为 failed，error 为这条信息
+CANCELLED_MESSAGE = '任务已取消'
+
+# 平台标识 1 小红书 2 视频号 3 抖音 4 快手
+PLATFORM_TYPES = (1, 2, 3, 4)
+
+
+class PublishValidationError(ValueError):
+    """发布参数校验失败，errors 为 [{"index": 批量中的序号, "msg": 错误信息}]"""
+
+    def __init__(self, errors):
+        super().__init__("; ".join(f"#{e['index']}: {e['msg']}" if e['index'] is not None else e['msg']
+                                   for e in errors))
+        self.errors = errors
+
+
+class PublishQueue(object):
+    """
+    持久化的发布队列：/postVideo 只负责把 (文件, 账号, 平台) 拆成任务写入 database.db，
+    由后台工作线程并发执行。进程重启后，未完成的任务会被重新拾取。
+    """
+
+    def __init__(self, num_workers=None):
+        self.num_workers = num_workers or getattr(conf, 'PUBLISH_WORKERS', None) or max_concurrency()
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._claim_lock = threading.Lock()
+        self._threads = []
+        self._started = False
+        # 正在执行的子任务：taskId -> (jobId, 上传器)，取消任务时调用上传器的 cancel()
+        self._running = {}
+        # 已取消但还有子任务在执行的任务，领取后尚未登记的上传器在登记时取消
+        self._cancelled_jobs = set()
+        # 任务状态变更计数，wait() 据此判断读库之后是否错过了通知
+        self._changes = 0
+        # 所有工作线程共用的事件循环（在 publish-loop 线程中运行，持有唯一的浏览器池）
+        self._loop = None
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        # 上次进程退出时仍处于 running 的任务视为中断，重新排队
+        with db.connection() as conn:
+            conn.execute("UPDATE publish_tasks SET status = ? WHERE status = ?", (PENDING, RUNNING))
+            conn.commit()
+        self._loop = asyncio.new_event_loop()
+        loop_thread = threading.Thread(target=self._run_loop, name="publish-loop", daemon=True)
+        loop_thread.start()
+        self._threads.append(loop_thread)
+        for i in range(self.num_workers):
+            thread = threading.Thread(target=self._worker, name=f"publish-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        print(f"✅ 发布队列已启动，工作线程数: {self.num_workers}")
+
+    @staticmethod
+    def _prepare(type, file_list, account_list, title, tags, category=None, enableTimer=False,
+                 videos_per_day=1, daily_times=None, start_days=0, **options):
+        """校验发布参数并拆成 (payload, [(文件, 账号, 发布时间)])，参数有误时抛出 ValueError"""
+        if type not in PLATFORM_TYPES:
+            raise ValueError(f"unsupported type: {type}")
+        if not file_list or not account_list:
+            raise ValueError("fileList 和 accountList 不能为空")
+        missing = [file for file in file_list if not Path(BASE_DIR / "videoFile" / file).exists()]
+        if missing:
+            raise ValueError(f"视频文件不存在: {', '.join(map(str, missing))}")
+        missing = [account for account in account_list if not Path(BASE_DIR / "cookiesFile" / account).exists()]
+        if missing:
+            raise ValueError(f"账号文件不存在: {', '.join(map(str, missing))}")
+        try:
+            publish_dates = build_publish_dates(len(file_list), enableTimer, videos_per_day, daily_times,
+                                                start_days)
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"定时发布参数错误: {e}")
+        payload = {
+            "title": title,
+            "tags": tags or [],
+            "category": category,
+            **options,
+        }
+        tasks = [(file, account, publish_dates[index])
+                 for index, file in enumerate(file_list) for account in account_list]
+        return payload, tasks
+
+    @staticmethod
+    def _ledger_keys(type, tasks):
+        """
+        各任务在发布台账中的键。非 blob 文件需要计算整个文件的 SHA-256，
+        必须在开启写事务之前调用，避免长时间持有数据库写锁
+        """
+        return [publish_ledger.key(file, account, type) for file, account, _ in tasks]
+
+    @classmethod
+    def _insert_job(cls, cursor, type, payload, tasks, keys, batch_id=None, batch_index=None):
+        job_id = str(uuid.uuid4())
+        cursor.execute('''
+        INSERT INTO publish_jobs (id, type, payload, status, batch_id, batch_index)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ''', (job_id, type, json.dumps(payload, ensure_ascii=False), PENDING, batch_id, batch_index))
+        # 对照发布台账：已发布过的 视频×账号 直接记为 skipped，其余登记为 pending
+        skipped = [not payload.get('force') and publish_ledger.is_published(key) for key in keys]
+        publish_ledger.mark_pending([key for key, skip in zip(keys, skipped) if not skip], job_id)
+        cursor.executemany('''
+        INSERT INTO publish_tasks (job_id, type, file_path, account_file, publish_date, status)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ''', [(job_id, type, file, account, publish_date.isoformat() if publish_date else None,
+               SKIPPED if skip else PENDING)
+              for (file, account, publish_date), skip in zip(tasks, skipped)])
+        if all(skipped):
+            # 全部已发布过，任务直接结束
+            cls._refresh_job_status(cursor.connection, job_id)
+        return job_id
+
+    def _notify(self):
+        with self._cond:
+            self._changes += 1
+            self._cond.notify_all()
+
+    def enqueue(self, type, file_list, account_list, title, tags, category=None, enableTimer=False,
+                videos_per_day=1, daily_times=None, start_days=0, **options):
+        """写入一个发布任务并立即返回任务ID"""
+        payload, tasks = self._prepare(type, file_list, account_list, title, tags, category, enableTimer,
+                                       videos_per_day, daily_times, start_days, **options)
+        keys = self._ledger_keys(type, tasks)
+        self.start()
+        with db.connection() as conn:
+            job_id = self._insert_job(conn.cursor(), type, payload, tasks, keys)
+            conn.commit()
+        self._notify()
+        return job_id
+
+    def enqueue_batch(self, entries):
+        """
+        写入一个批量发布任务：entries 为 enqueue 的关键字参数列表，每项生成一个 job。
+        所有项先全部校验，有任何一项不合法时整批不入队并抛出 PublishValidationError。
+        入队后各平台的任务由工作线程按 PUBLISH_PLATFORM_CONCURRENCY 并行执行。
+        返回 (批量ID, [每项的 jobId])
+        """
+        if not entries:
+            raise PublishValidationError([{"index": None, "msg": "批量发布列表不能为空"}])
+        prepared, errors = [], []
+        for index, entry in enumerate(entries):
+            try:
+                prepared.append((entry.get('type'), *self._prepare(**entry)))
+            except (TypeError, ValueError) as e:
+                errors.append({"index": index, "msg": str(e)})
+        if errors:
+            raise PublishValidationError(errors)
+        keys = [self._ledger_keys(type, tasks) for type, _, tasks in prepared]
+        self.start()
+        batch_id = str(uuid.uuid4())
+        with db.connection() as conn:
+            cursor = conn.cursor()
+            job_ids = [self._insert_job(cursor, type, payload, tasks, job_keys, batch_id, index)
+                       for index, ((type, payload, tasks), job_keys) in enumerate(zip(prepared, keys))]
+            conn.commit()
+        self._notify()
+        return batch_id, job_ids
+
+    def get_job(self, job_id):
+        with db.connection() as conn:
+            job = conn.execute("SELECT * FROM publish_jobs WHERE id = ?", (job_id,)).fetchone()
+            if not job:
+                return None
+            tasks = conn.execute('''
+            SELECT id, file_path, account_file, publish_date, status, attempts, error, started_at, finished_at
+            FROM publish_tasks WHERE job_id = ? ORDER BY id
+            ''', (job_id,)).fetchall()
+        job = dict(job)
+        job['payload'] = json.loads(job['payload'])
+        job['tasks'] = [dict(task) for task in tasks]
+        return job
+
+    def get_batch(self, batch_id):
+        """批量任务整体状态和每一项（一个 job）的状态，不存在时返回 None"""
+        with db.connection() as conn:
+            jobs = conn.execute('''
+            SELECT id, type, status, batch_index, created_at, updated_at FROM publish_jobs
+            WHERE batch_id = ? ORDER BY batch_index
+            ''', (batch_id,)).fetchall()
+            if not jobs:
+                return None
+            counts = {}
+            for row in conn.execute('''
+            SELECT t.job_id, t.status, COUNT(*) AS n FROM publish_tasks t
+            JOIN publish_jobs j ON j.id = t.job_id
+            WHERE j.batch_id = ? GROUP BY t.job_id, t.status
+            ''', (batch_id,)):
+                counts.setdefault(row['job_id'], {})[row['status']] = row['n']
+        items = [{
+            "index": job['batch_index'],
+            "jobId": job['id'],
+            "type": job['type'],
+            "status": job['status'],
+            "tasks": counts.get(job['id'], {}),
+            "updatedAt": job['updated_at'],
+        } for job in jobs]
+        statuses = {item['status'] for item in items}
+        if statuses & {PENDING, RUNNING}:
+            status = RUNNING if statuses - {PENDING} else PENDING
+        elif FAILED in statuses:
+            status = FAILED
+        else:
+            status = SUCCESS
+        return {"id": batch_id, "status": status, "createdAt": jobs[0]['created_at'], "items": items}
+
+    def wait(self, job_id, timeout=None):
+        """阻塞直到任务结束或超时，返回任务当前的状态（兼容需要同步结果的旧调用方）"""
+        deadline = None if timeout is None else datetime.now().timestamp() + timeout
+        while True:
+            with self._cond:
+                seen = self._changes
+            # 查库时不持有条件锁，避免阻塞工作线程登记、结束子任务
+            job = self.get_job(job_id)
+            if job is None or job['status'] in (SUCCESS, FAILED):
+                return job
+            remaining = None if deadline is None else deadline - datetime.now().timestamp()
+            if remaining is not None and remaining <= 0:
+                return job
+            with self._cond:
+                if self._changes == seen:
+                    self._cond.wait(timeout=5 if remaining is None else min(5, remaining))
+
+    def cancel(self, job_id):
+        """
+        取消任务：未开始的子任务直接记为 failed（任务已取消），正在上传的子任务中断后记为 failed。
+        返回取消后的任务，任务不存在时返回 None
+        """
+        with db.connection() as conn:
+            if not conn.execute("SELECT 1 FROM publish_jobs WHERE id = ?", (job_id,)).fetchone():
+                return None
+            conn.execute('''
+            UPDATE publish_tasks SET status = ?, error = ?, finished_at = CURRENT_TIMESTAMP
+            WHERE job_id = ? AND status = ?
+            ''', (FAILED, CANCELLED_MESSAGE, job_id, PENDING))
+            status = self._refresh_job_status(conn, job_id)
+            conn.commit()
+        with self._cond:
+            if status not in (SUCCESS, FAILED):
+                self._cancelled_jobs.add(job_id)
+            apps = [app for running_job, app in self._running.values() if running_job == job_id]
+            self._changes += 1
+            self._cond.notify_all()
+        for app in apps:
+            app.cancel()
+        if status in (SUCCESS, FAILED):
+            progress.progress_bus.close(job_id, status=status)
+        return self.get_job(job_id)
+
+    def _register(self, task, app):
+        """上传器开始执行前登记；所属任务已被取消时立即取消"""
+        with self._lock:
+            self._running[task['id']] = (task['job_id'], app)
+            cancelled = task['job_id'] in self._cancelled_jobs
+        if cancelled:
+            app.cancel()
+
+    def _claim(self):
+        """
+        原子地领取一个待执行任务：跳过已达到并发上限的平台，
+        以及正在上传中的账号（同一账号同时只跑一个任务）
+        """
+        with self._claim_lock, db.connection() as conn:
+            running = conn.execute(
+                "SELECT type, account_file FROM publish_tasks WHERE status = ?", (RUNNING,)
+            ).fetchall()
+            if len(running) >= max_concurrency():
+                return None
+            per_type = {}
+            for row in running:
+                per_type[row['type']] = per_type.get(row['type'], 0) + 1
+            busy_types = [t for t, n in per_type.items() if n >= platform_concurrency(t)]
+            busy_accounts = [(row['type'], row['account_file']) for row in running]
+            rows = conn.execute(
+                f"SELECT * FROM publish_tasks WHERE status = ? "
+                f"AND type NOT IN ({','.join('?' * len(busy_types))}) ORDER BY id LIMIT 50",
+                (PENDING, *busy_types)
+            ).fetchall()
+            for row in rows:
+                if (row['type'], row['account_file']) in busy_accounts:
+                    continue
+                cursor = conn.execute('''
+                UPDATE publish_tasks
+                SET status = ?, attempts = attempts + 1, started_at = CURRENT_TIMESTAMP
+                WHERE id = ? AND status = ?
+                ''', (RUNNING, row['id'], PENDING))
+                conn.commit()
+                if cursor.rowcount == 1:
+                    return dict(row)
+            return None
+
+    def _finish(self, task, error=None, status=None):
+        with db.connection() as conn:
+            conn.execute('''
+            UPDATE publish_tasks
+            SET status = ?, error = ?, finished_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+            ''', (status or (FAILED if error else SUCCESS), error, task['id']))
+            status = self._refresh_job_status(conn, task['job_id'])
+            conn.commit()
+        if status in (SUCCESS, FAILED):
+            progress.progress_bus.close(task['job_id'], status=status)
+        with self._cond:
+            self._running.pop(task['id'], None)
+            if status in (SUCCESS, FAILED):
+                self._cancelled_jobs.discard(task['job_id'])
+            self._changes += 1
+            self._cond.notify_all()
+
+    @staticmethod
+    def _refresh_job_status(conn, job_id):
+        counts = {row['status']: row['n'] for row in conn.execute(
+            "SELECT status, COUNT(*) AS n FROM publish_tasks WHERE job_id = ? GROUP BY status", (job_id,))}
+        if counts.get(PENDING) or counts.get(RUNNING):
+            status = RUNNING
+        elif counts.get(FAILED):
+            status = FAILED
+        else:
+            status = SUCCESS
+        conn.execute("UPDATE publish_jobs SET status = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                     (status, job_id))
+        return status
+
+    def _run_loop(self):
+        # 常驻事件循环和浏览器池：所有工作线程的上传在这里并发执行，复用同一组已启动的浏览器
+        asyncio.set_event_loop(self._loop)
+        install_browser_pool(self._loop)
+        self._loop.run_forever()
+
+    async def _publish(self, task, publish_date, options):
+        # 在共用事件循环中执行，上传器 emit 的进度事件归属到这个子任务
+        with progress.progress_scope(task['job_id'], task['id'], task['type'], task['account_file'],
+                                     task['file_path']):
+            return await publish_one(
+                task['type'], task['file_path'], task['account_file'], publish_date,
+                job_id=task['job_id'], on_app=lambda app: self._register(task, app), **options)
+
+    def _worker(self):
+        while True:
+            task = self._claim()
+            if task is None:
+                with self._cond:
+                    self._cond.wait(timeout=5)
+                continue
+            self._run_task(task)
+
+    def _run_task(self, task):
+        """执行一个已领取的子任务，记录结果并推送结束阶段"""
+        with db.connection() as conn:
+            job = conn.execute("SELECT payload FROM publish_jobs WHERE id = ?", (task['job_id'],)).fetchone()
+            self._refresh_job_status(conn, task['job_id'])
+            conn.commit()
+        options = json.loads(job['payload']) if job else {}
+        publish_date = datetime.fromisoformat(task['publish_date']) if task['publish_date'] else 0
+        print(f"▶️ 开始发布任务 {task['id']}: {task['file_path']} -> {task['account_file']}")
+        # 工作线程中 emit 的进度事件归属到这个子任务，/jobEvents 按任务推送
+        with progress.progress_scope(task['job_id'], task['id'], task['type'], task['account_file'],
+                                     task['file_path']):
+            progress.emit(progress.STARTED, attempt=task['attempts'] + 1)
+            try:
+                # 提交到共用事件循环，工作线程只负责领取任务并等待结果
+                published = asyncio.run_coroutine_threadsafe(
+                    self._publish(task, publish_date, options), self._loop).result()
+            except Exception as e:
+                # 超时、取消等异常的 str() 可能为空，失败状态显式传入
+                error = (str(e) or repr(e))[:2000]
+                progress.emit(progress.FAILED, message=error)
+                self._finish(task, error, status=FAILED)
+                print(f"❌ 发布任务失败 {task['id']}: {e}")
+            else:
+                if published:
+                    progress.emit(progress.PUBLISHED)
+                    self._finish(task)
+                    print(f"✅ 发布任务完成 {task['id']}")
+                else:
+                    # 入队之后其他任务已发布了同一组合
+                    progress.emit(progress.SKIPPED)
+                    self._finish(task, status=SKIPPED)
+                    print(f"⏭️ 已发布过，跳过任务 {task['id']}")
+            finally:
+                # 崩溃或被取消时不会到达结束阶段，阶段计时在这里清理
+                metrics.forget_task(task['job_id'], task['id'])
+
+
+publish_queue = PublishQueue()
@@ -0,0 +1,180 @@
+import json
+import shutil
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import conf
+from conf import BASE_DIR
+from myUtils import db
+
+VIDEO_DIR = Path(BASE_DIR / "videoFile")
+# 视频封面缓存目录：videoFile/thumbnails/<文件标识>.jpg
+THUMBNAIL_DIR = VIDEO_DIR / "thumbnails"
+# 同时提取元数据的文件数，可在 conf.py 中通过 MEDIA_INFO_WORKERS 配置
+DEFAULT_WORKERS = 2
+# ffprobe / ffmpeg 单次执行的超时时间（秒）
+DEFAULT_TIMEOUT = 60
+# 封面宽度（像素），高度按比例缩放
+THUMBNAIL_WIDTH = 640
+
+DONE = 'done'
+FAILED = 'failed'
+# 本机没有 ffprobe，服务重启后（装好 ffmpeg）会重新处理
+UNAVAILABLE = 'unavailable'
+
+
+def _binary(name):
+    """ffprobe / ffmpeg 可执行文件路径，conf.py 中 FFPROBE_PATH / FFMPEG_PATH 为空时从 PATH 查找"""
+    return getattr(conf, f'{name.upper()}_PATH', '') or shutil.which(name)
+
+
+def _int(value):
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def _rotation(stream):
+    # 旧版本 ffprobe 写在 tags.rotate，新版本写在 side_data_list 的 Display Matrix 中
+    rotate = _int((stream.get('tags') or {}).get('rotate'))
+    if rotate is not None:
+        return rotate
+    for side_data in stream.get('side_data_list') or []:
+        if 'rotation' in side_data:
+            return _int(side_data['rotation'])
+    return 0
+
+
+def probe(path):
+    """用 ffprobe 读取时长、分辨率、编码、码率和旋转角度"""
+    timeout = getattr(conf, 'MEDIA_INFO_TIMEOUT', DEFAULT_TIMEOUT)
+    output = subprocess.run(
+        [_binary('ffprobe'), '-v', 'error', '-print_format', 'json', '-show_format', '-show_streams',
+         '-select_streams', 'v:0', str(path)],
+        capture_output=True, check=True, timeout=timeout,
+    ).stdout
+    data = json.loads(output or b'{}')
+    streams = data.get('streams') or []
+    if not streams:
+        raise ValueError("no video stream")
+    stream, fmt = streams[0], data.get('format') or {}
+    duration = stream.get('duration') or fmt.get('duration')
+    return {
+        'duration': round(float(duration), 3) if duration else None,
+        'width': _int(stream.get('width')),
+        'height': _int(stream.get('height')),
+        'codec': stream.get('codec_name'),
+        'bitrate': _int(stream.get('bit_rate')) or _int(fmt.get('bit_rate')),
+        'rotation': _rotation(stream),
+    }
+
+
+def extract_thumbnail(path, target, duration=None):
+    """截取一帧作为 JPEG 封面（ffmpeg 默认按 rotation 自动旋转）"""
+    timeout = getattr(conf, 'MEDIA_INFO_TIMEOUT', DEFAULT_TIMEOUT)
+    # 跳过开头可能的黑屏，短视频取中间
+    offset = min(1.0, duration / 2) if duration else 0
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = target.with_suffix('.tmp.jpg')
+    subprocess.run(
+        [_binary('ffmpeg'), '-v', 'error', '-y', '-ss', f'{offset:.3f}', '-i', str(path), '-frames:v', '1',
+         '-vf', f'scale={THUMBNAIL_WIDTH}:-2', '-q:v', '3', str(tmp)],
+        capture_output=True, check=True, timeout=timeout,
+    )
+    tmp.replace(target)
+
+
+def thumbnail_relpath(file_path):
+    # blob 以内容哈希命名，其他文件以 uuid_文件名 命名，都不会与其他文件冲突
+    return f"thumbnails/{Path(file_path).stem}.jpg"
+
+
+class MediaInfoExtractor(object):
+    """
+    上传完成后在后台线程提取视频元数据和封面，结果写入 file_records，
+    /getFiles 直接返回，不再重新打开视频。相同文件（同一 file_path）只处理一次。
+    """
+
+    def __init__(self):
+        self._executor = None
+        self._running = set()
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=getattr(conf, 'MEDIA_INFO_WORKERS', DEFAULT_WORKERS),
+                    thread_name_prefix="media-info")
+            return self._executor
+
+    def schedule(self, file_path):
+        """提交一个文件的元数据提取，已在处理中的文件直接忽略"""
+        if not file_path:
+            return
+        with self._lock:
+            if file_path in self._running:
+                return
+            self._running.add(file_path)
+        self._get_executor().submit(self._run, file_path)
+
+    def schedule_pending(self):
+        """服务启动时补处理还没有元数据的文件"""
+        try:
+            pending = db.files.media_pending()
+        except Exception as e:
+            print(f"⚠️ 读取待提取元数据的文件失败: {e}")
+            return
+        for file_path in pending:
+            self.schedule(file_path)
+
+    def _run(self, file_path):
+        try:
+            db.files.set_media(file_path, self.extract(file_path))
+        except Exception as e:
+            print(f"⚠️ 提取视频元数据失败 {file_path}: {e}")
+        finally:
+            with self._lock:
+                self._running.discard(file_path)
+
+    def extract(self, file_path):
+        """返回要写入 file_records 的元数据字段"""
+        # 秒传 / 重复上传的文件复用已有结果
+        done = db.files.media_done(file_path)
+        if done:
+            return done
+        path = VIDEO_DIR / file_path
+        if not path.exists():
+            return {'media_status': FAILED}
+        if not _binary('ffprobe'):
+            return {'media_status': UNAVAILABLE}
+        try:
+            info = probe(path)
+        except (subprocess.SubprocessError, OSError, ValueError) as e:
+            print(f"⚠️ ffprobe 无法解析 {file_path}: {e}")
+            return {'media_status': FAILED}
+        info['media_status'] = DONE
+        if _binary('ffmpeg'):
+            relpath = thumbnail_relpath(file_path)
+            try:
+                extract_thumbnail(path, VIDEO_DIR / relpath, info['duration'])
+                info['thumbnail'] = relpath
+            except (subprocess.SubprocessError, OSError) as e:
+                # 封面失败不影响其他元数据
+                print(f"⚠️ 生成封面失败 {file_path}: {e}")
+        print(f"✅ 视频元数据已提取: {file_path} {info}")
+        return info
+
+    def discard(self, file_path):
+        """文件已被删除且没有其他记录引用时，删除缓存的封面"""
+        if not file_path or (VIDEO_DIR / file_path).exists() or db.files.exists_path(file_path):
+            return
+        thumbnail = VIDEO_DIR / thumbnail_relpath(file_path)
+        if thumbnail.exists():
+            thumbnail.unlink()
+
+
+media_info = MediaInfoExtractor()
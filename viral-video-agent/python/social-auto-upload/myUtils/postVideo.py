@@ -2,15 +2,26 @@ import asyncio
 from pathlib import Path
 
 from conf import BASE_DIR
+from myUtils.publishLedger import publish_ledger
 from uploader.douyin_uploader.main import DouYinVideo
 from uploader.ks_uploader.main import KSVideo
 from uploader.tencent_uploader.main import TencentVideo
 from uploader.xiaohongshu_uploader.main import XiaoHongShuVideo
 from utils.constant import TencentZoneTypes
+from utils.browser_pool import shared_browser_pool
 from utils.files_times import generate_schedule_time_next_day
+from utils.publish_limits import fan_out
 
 
-def post_video_tencent(title,files,tags,account_file,category=TencentZoneTypes.LIFESTYLE.value,enableTimer=False,videos_per_day = 1, daily_times=None,start_days = 0, is_draft=False):
+async def run_uploads(apps, type, concurrency=None):
+    # 同一批次的所有 文件×账号 共用一个浏览器池，避免每次都冷启动 Chromium；
+    # 不同账号并发上传，并发数受 conf.py 中的 PUBLISH_MAX_CONCURRENCY / PUBLISH_PLATFORM_CONCURRENCY 限制
+    # 每个上传都经发布台账执行，已发布过的 视频×账号 自动跳过
+    async with shared_browser_pool():
+        await fan_out(apps, type, concurrency, run=lambda app: publish_ledger.run(app, type))
+
+
+def post_video_tencent(title,files,tags,account_file,category=TencentZoneTypes.LIFESTYLE.value,enableTimer=False,videos_per_day = 1, daily_times=None,start_days = 0, is_draft=False, concurrency=None):
     # 生成文件的完整路径
     account_file = [Path(BASE_DIR / "cookiesFile" / file) for file in account_file]
     files = [Path(BASE_DIR / "videoFile" / file) for file in files]
@@ -18,6 +29,7 @@ def post_video_tencent(title,files,tags,account_file,category=TencentZoneTypes.L
         publish_datetimes = generate_schedule_time_next_day(len(files), videos_per_day, daily_times,start_days)
     else:
         publish_datetimes = [0 for i in range(len(files))]
+    apps = []
     for index, file in enumerate(files):
         for cookie in account_file:
             print(f"文件路径{str(file)}")
@@ -25,13 +37,13 @@ def post_video_tencent(title,files,tags,account_file,category=TencentZoneTypes.L
             print(f"视频文件名：{file}")
             print(f"标题：{title}")
             print(f"Hashtag：{tags}")
-            app = TencentVideo(title, str(file), tags, publish_datetimes[index], cookie, category, is_draft)
-            asyncio.run(app.main(), debug=False)
+            apps.append(TencentVideo(title, str(file), tags, publish_datetimes[index], cookie, category, is_draft))
+    asyncio.run(run_uploads(apps, 2, concurrency), debug=False)
 
 
 def post_video_DouYin(title,files,tags,account_file,category=TencentZoneTypes.LIFESTYLE.value,enableTimer=False,videos_per_day = 1, daily_times=None,start_days = 0,
                       thumbnail_path = '',
-                      productLink = '', productTitle = ''):
+                      productLink = '', productTitle = '', concurrency=None):
     # 生成文件的完整路径
     account_file = [Path(BASE_DIR / "cookiesFile" / file) for file in account_file]
     files = [Path(BASE_DIR / "videoFile" / file) for file in files]
@@ -39,6 +51,7 @@ def post_video_DouYin(title,files,tags,account_file,category=TencentZoneTypes.LI
         publish_datetimes = generate_schedule_time_next_day(len(files), videos_per_day, daily_times,start_days)
     else:
         publish_datetimes = [0 for i in range(len(files))]
+    apps = []
     for index, file in enumerate(files):
         for cookie in account_file:
             print(f"文件路径{str(file)}")
@@ -46,11 +59,11 @@ def post_video_DouYin(title,files,tags,account_file,category=TencentZoneTypes.LI
             print(f"视频文件名：{file}")
             print(f"标题：{title}")
             print(f"Hashtag：{tags}")
-            app = DouYinVideo(title, str(file), tags, publish_datetimes[index], cookie, thumbnail_path, productLink, productTitle)
-            asyncio.run(app.main(), debug=False)
+            apps.append(DouYinVideo(title, str(file), tags, publish_datetimes[index], cookie, thumbnail_path, productLink, productTitle))
+    asyncio.run(run_uploads(apps, 3, concurrency), debug=False)
 
 
-def post_video_ks(title,files,tags,account_file,category=TencentZoneTypes.LIFESTYLE.value,enableTimer=False,videos_per_day = 1, daily_times=None,start_days = 0):
+def post_video_ks(title,files,tags,account_file,category=TencentZoneTypes.LIFESTYLE.value,enableTimer=False,videos_per_day = 1, daily_times=None,start_days = 0, concurrency=None):
     # 生成文件的完整路径
     account_file = [Path(BASE_DIR / "cookiesFile" / file) for file in account_file]
     files = [Path(BASE_DIR / "videoFile" / file) for file in files]
@@ -58,6 +71,7 @@ def post_video_ks(title,files,tags,account_file,category=TencentZoneTypes.LIFEST
         publish_datetimes = generate_schedule_time_next_day(len(files), videos_per_day, daily_times,start_days)
     else:
         publish_datetimes = [0 for i in range(len(files))]
+    apps = []
     for index, file in enumerate(files):
         for cookie in account_file:
             print(f"文件路径{str(file)}")
@@ -65,10 +79,10 @@ def post_video_ks(title,files,tags,account_file,category=TencentZoneTypes.LIFEST
             print(f"视频文件名：{file}")
             print(f"标题：{title}")
             print(f"Hashtag：{tags}")
-            app = KSVideo(title, str(file), tags, publish_datetimes[index], cookie)
-            asyncio.run(app.main(), debug=False)
+            apps.append(KSVideo(title, str(file), tags, publish_datetimes[index], cookie))
+    asyncio.run(run_uploads(apps, 4, concurrency), debug=False)
 
-def post_video_xhs(title,files,tags,account_file,category=TencentZoneTypes.LIFESTYLE.value,enableTimer=False,videos_per_day = 1, daily_times=None,start_days = 0):
+def post_video_xhs(title,files,tags,account_file,category=TencentZoneTypes.LIFESTYLE.value,enableTimer=False,videos_per_day = 1, daily_times=None,start_days = 0, concurrency=None):
     # 生成文件的完整路径
     account_file = [Path(BASE_DIR / "cookiesFile" / file) for file in account_file]
     files = [Path(BASE_DIR / "videoFile" / file) for file in files]
@@ -77,15 +91,59 @@ def post_video_xhs(title,files,tags,account_file,category=TencentZoneTypes.LIFES
         publish_datetimes = generate_schedule_time_next_day(file_num, videos_per_day, daily_times,start_days)
     else:
         publish_datetimes = 0
+    apps = []
     for index, file in enumerate(files):
         for cookie in account_file:
             # 打印视频文件名、标题和 hashtag
             print(f"视频文件名：{file}")
             print(f"标题：{title}")
             print(f"Hashtag：{tags}")
-            app = XiaoHongShuVideo(title, file, tags, publish_datetimes, cookie)
-            asyncio.run(app.main(), debug=False)
+            apps.append(XiaoHongShuVideo(title, file, tags, publish_datetimes, cookie))
+    asyncio.run(run_uploads(apps, 1, concurrency), debug=False)
+
+
+def _parse_daily_times(daily_times):
+    # 前端传入的是 "10:00" 形式的字符串，generate_schedule_time_next_day 需要整点小时
+    if not daily_times:
+        return None
+    return [int(str(t).split(':')[0]) for t in daily_times]
+
+
+def build_publish_dates(file_num, enableTimer=False, videos_per_day=1, daily_times=None, start_days=0):
+    """为每个文件计算发布时间，未开启定时的文件返回 0（立即发布）"""
+    if enableTimer:
+        return generate_schedule_time_next_day(file_num, videos_per_day or 1, _parse_daily_times(daily_times),
+                                               start_days=start_days or 0)
+    return [0 for i in range(file_num)]
+
 
+async def publish_one(type, file, account, publish_date=0, title='', tags=None, category=None, is_draft=False,
+                      thumbnail='', productLink='', productTitle='', job_id=None, force=False, on_app=None):
+    """
+    发布单个 (文件, 账号) 组合，供后台发布队列调用。
+    返回 True 表示已发布；发布台账中该组合已发布过时不重复发布，返回 False（force 为 True 时仍重新发布）
+    on_app(app) 在开始上传前调用，发布队列用它登记正在运行的上传器（取消任务时调用 app.cancel()）
+    """
+    file = Path(BASE_DIR / "videoFile" / file)
+    account_file = Path(BASE_DIR / "cookiesFile" / account)
+    tags = tags or []
+    print(f"视频文件名：{file}")
+    print(f"标题：{title}")
+    print(f"Hashtag：{tags}")
+    match type:
+        case 1:
+            app = XiaoHongShuVideo(title, file, tags, publish_date, account_file)
+        case 2:
+            app = TencentVideo(title, str(file), tags, publish_date, account_file, category, is_draft)
+        case 3:
+            app = DouYinVideo(title, str(file), tags, publish_date, account_file, thumbnail, productLink, productTitle)
+        case 4:
+            app = KSVideo(title, str(file), tags, publish_date, account_file)
+        case _:
+            raise ValueError(f"unsupported type: {type}")
+    if on_app is not None:
+        on_app(app)
+    return await publish_ledger.run(app, type, job_id, force)
 
 
 # post_video("333",["demo.mp4"],"d","d")
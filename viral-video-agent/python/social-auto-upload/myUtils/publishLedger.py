@@ -0,0 +1,141 @@
+import asyncio
+import hashlib
+import os
+import threading
+from pathlib import Path
+
+from conf import BASE_DIR
+from myUtils import db
+from myUtils.blobStore import BLOB_DIR, BLOB_NAME_RE
+from utils.log import logger
+
+# 发布台账状态
+PENDING = 'pending'
+IN_PROGRESS = 'in_progress'
+PUBLISHED = 'published'
+FAILED = 'failed'
+
+BUFFER_SIZE = 1024 * 1024
+
+
+class PublishLedger(object):
+    """
+    发布台账：按 (视频内容哈希, 账号, 平台) 记录每个组合的发布状态。
+    所有上传器的 main() 都经 run() 执行，已发布过的组合直接跳过，
+    进程中途退出后重新提交同一批任务时不会重复发布。
+    中断时处于 in_progress 的组合无法确认是否已发出，会重新发布。
+    """
+
+    def __init__(self):
+        # 非 blob 文件的哈希缓存：路径 -> (修改时间, 大小, 哈希)
+        self._hash_cache = {}
+        self._lock = threading.Lock()
+
+    def content_hash(self, file_path):
+        """视频内容哈希：blob 直接取文件名，其他文件计算 SHA-256（按修改时间缓存）"""
+        path = Path(file_path)
+        if not path.is_absolute():
+            path = Path(BASE_DIR / "videoFile" / path)
+        match = BLOB_NAME_RE.match(path.name)
+        if match and BLOB_DIR in path.parents:
+            return match.group(1)
+        stat = path.stat()
+        with self._lock:
+            cached = self._hash_cache.get(str(path))
+        if cached and cached[:2] == (stat.st_mtime, stat.st_size):
+            return cached[2]
+        sha256 = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(BUFFER_SIZE), b''):
+                sha256.update(block)
+        digest = sha256.hexdigest()
+        with self._lock:
+            self._hash_cache[str(path)] = (stat.st_mtime, stat.st_size, digest)
+        return digest
+
+    def key(self, file_path, account_file, platform):
+        return self.content_hash(file_path), os.path.basename(str(account_file)), int(platform)
+
+    def state(self, key):
+        with db.connection() as conn:
+            row = conn.execute('''
+            SELECT state FROM publish_ledger WHERE content_hash = ? AND account = ? AND platform = ?
+            ''', key).fetchone()
+        return row['state'] if row else None
+
+    def is_published(self, key):
+        return self.state(key) == PUBLISHED
+
+    def mark_pending(self, keys, job_id=None):
+        """入队时登记：未发布过的组合记为 pending，已发布的不变"""
+        with db.connection() as conn:
+            conn.executemany('''
+            INSERT INTO publish_ledger (content_hash, account, platform, state, job_id)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (content_hash, account, platform) DO UPDATE
+            SET state = excluded.state, job_id = excluded.job_id, updated_at = CURRENT_TIMESTAMP
+            WHERE publish_ledger.state != ?
+            ''', [(*key, PENDING, job_id, PUBLISHED) for key in keys])
+
+    def begin(self, key, job_id=None, force=False):
+        """开始发布一个组合，已发布过（且不是 force）时返回 False"""
+        with db.connection() as conn:
+            row = conn.execute('''
+            SELECT state FROM publish_ledger WHERE content_hash = ? AND account = ? AND platform = ?
+            ''', key).fetchone()
+            if row and row['state'] == PUBLISHED and not force:
+                return False
+            conn.execute('''
+            INSERT INTO publish_ledger (content_hash, account, platform, state, job_id, attempts)
+            VALUES (?, ?, ?, ?, ?, 1)
+            ON CONFLICT (content_hash, account, platform) DO UPDATE
+            SET state = excluded.state, job_id = COALESCE(excluded.job_id, publish_ledger.job_id),
+                attempts = publish_ledger.attempts + 1, error = NULL, updated_at = CURRENT_TIMESTAMP
+            ''', (*key, IN_PROGRESS, job_id))
+        return True
+
+    def finish(self, key, error=None, failed=None):
+        """记录发布结果：failed 为 True（或传了 error）时记为失败，否则记为已发布"""
+        failed = bool(error) if failed is None else failed
+        with db.connection() as conn:
+            conn.execute('''
+            UPDATE publish_ledger
+            SET state = ?, error = ?, updated_at = CURRENT_TIMESTAMP,
+                published_at = CASE WHEN ? THEN published_at ELSE CURRENT_TIMESTAMP END
+            WHERE content_hash = ? AND account = ? AND platform = ?
+            ''', (FAILED if failed else PUBLISHED, error, int(failed), *key))
+
+    async def run(self, app, platform, job_id=None, force=False):
+        """
+        执行 app.main() 并记录结果，返回 True；该组合已发布过时不执行，返回 False。
+        force 为 True 时忽略已发布记录，重新发布。
+        """
+        # 非 blob 文件可能要计算大文件的哈希，放到线程池中，不阻塞共用的事件循环
+        key = await asyncio.to_thread(self.key, app.file_path, app.account_file, platform)
+        if not self.begin(key, job_id, force):
+            logger.info(f"[ledger] 已发布过，跳过 {app.file_path} -> {app.account_file}")
+            return False
+        try:
+            await app.main()
+        except BaseException as e:
+            # 取消、超时等异常的 str() 可能为空，失败状态显式传入，不按错误信息是否为空判断
+            self.finish(key, (str(e) or repr(e))[:2000], failed=True)
+            raise
+        self.finish(key)
+        return True
+
+    def list(self, content_hash=None, account=None, platform=None, state=None):
+        where, params = [], []
+        for column, value in (('content_hash', content_hash), ('account', account),
+                              ('platform', platform), ('state', state)):
+            if value is not None:
+                where.append(f"{column} = ?")
+                params.append(value)
+        sql = "SELECT * FROM publish_ledger"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        with db.connection() as conn:
+            return [dict(row) for row in conn.execute(sql + " ORDER BY updated_at DESC", params)]
+
+
+publish_ledger = PublishLedger()
@@ -1,17 +1,23 @@
 import asyncio
+import json
 import os
-import sqlite3
 import threading
-import time
 import uuid
 from pathlib import Path
-from queue import Queue
+from queue import Queue, Empty
 from flask_cors import CORS
-from myUtils.auth import check_cookie
+from myUtils.auth import check_cookies, iter_check_cookies
 from flask import Flask, request, jsonify, Response, render_template, send_from_directory
+import conf
 from conf import BASE_DIR
 from myUtils.login import get_tencent_cookie, douyin_cookie_gen, get_ks_cookie, xiaohongshu_cookie_gen
-from myUtils.postVideo import post_video_tencent, post_video_DouYin, post_video_ks, post_video_xhs
+from myUtils import db
+from myUtils.blobStore import blob_store, find_blob, blob_hash
+from myUtils.chunkedUpload import upload_store, UploadError
+from myUtils.jobQueue import publish_queue, PublishValidationError
+from myUtils.publishLedger import publish_ledger
+from myUtils.mediaInfo import media_info
+from utils import metrics, progress
 
 active_queues = {}
 app = Flask(__name__)
@@ -19,7 +25,7 @@ app = Flask(__name__)
 #允许所有来源跨域访问
 CORS(app)
 
-# 限制上传文件大小为160MB
+# 限制单个请求大小为160MB，更大的文件使用 /uploads 分片上传
 app.config['MAX_CONTENT_LENGTH'] = 160 * 1024 * 1024
 
 # 获取当前目录（假设 index.html 和 assets 在这里）
@@ -69,6 +75,71 @@ def upload_file():
     except Exception as e:
         return jsonify({"code":200,"msg": str(e),"data":None}), 500
 
+def upload_error_response(e):
+    return jsonify({"code": e.status, "msg": str(e), "data": e.data}), e.status
+
+
+# 分片上传：创建会话，json 参数 filename、size（字节），save 完成后是否写入素材库（默认 true，同 /uploadSave）
+@app.route('/uploads', methods=['POST'])
+def create_upload():
+    data = request.get_json(silent=True) or {}
+    try:
+        session = upload_store.create(data.get('filename'), data.get('size'), data.get('save', True),
+                                      data.get('sha256'))
+    except UploadError as e:
+        return upload_error_response(e)
+    return jsonify({"code": 200, "msg": None, "data": session}), 200
+
+
+# 分片上传：查询已写入的字节数，断线后从 data.offset 继续上传
+@app.route('/uploads/<upload_id>', methods=['GET'])
+def get_upload(upload_id):
+    try:
+        return jsonify({"code": 200, "msg": None, "data": upload_store.status(upload_id)}), 200
+    except UploadError as e:
+        return upload_error_response(e)
+
+
+# 分片上传：请求体为原始字节，offset 参数（或 Upload-Offset 请求头）为该分片在文件中的起始位置
+@app.route('/uploads/<upload_id>', methods=['PUT'])
+def put_upload_chunk(upload_id):
+    offset = request.args.get('offset', type=int)
+    if offset is None:
+        offset = request.headers.get('Upload-Offset', type=int)
+    if offset is None or offset < 0:
+        return jsonify({"code": 400, "msg": "offset is required", "data": None}), 400
+    try:
+        result = upload_store.write(upload_id, offset, request.stream)
+    except UploadError as e:
+        return upload_error_response(e)
+    return jsonify({"code": 200, "msg": None, "data": result}), 200
+
+
+# 分片上传：全部分片上传后调用，可选 json 参数 sha256 用于校验完整性
+@app.route('/uploads/<upload_id>/complete', methods=['POST'])
+def complete_upload(upload_id):
+    data = request.get_json(silent=True) or {}
+    try:
+        result = upload_store.complete(upload_id, data.get('sha256'))
+    except UploadError as e:
+        return upload_error_response(e)
+    print(f"✅ 分片上传完成: {result['filepath']}")
+    return jsonify({"code": 200, "msg": "File uploaded and saved successfully", "data": result}), 200
+
+
+@app.route('/uploads/<upload_id>', methods=['DELETE'])
+def abort_upload(upload_id):
+    try:
+        upload_store.abort(upload_id)
+    except UploadError as e:
+        return upload_error_response(e)
+    return jsonify({"code": 200, "msg": "upload aborted", "data": None}), 200
+
+# /getFile 的缓存时间（秒）：按内容哈希存放的文件缓存一年，其他文件缓存一天后重新校验
+FILE_CACHE_MAX_AGE = 365 * 24 * 3600
+FILE_REVALIDATE_MAX_AGE = 24 * 3600
+
+
 @app.route('/getFile', methods=['GET'])
 def get_file():
     # 获取 filename 参数
@@ -83,9 +154,20 @@ def get_file():
 
     # 拼接完整路径
     file_path = str(Path(BASE_DIR / "videoFile"))
-
-    # 返回文件
-    return send_from_directory(file_path,filename)
+    # 前端只取了 blobs/ab/<sha256>.mp4 的最后一段时，按哈希找回完整路径
+    if not os.path.exists(os.path.join(file_path, filename)):
+        filename = find_blob(filename) or filename
+
+    # 返回文件：send_file 处理 Range（206 断点/拖动播放）和 If-None-Match / If-Modified-Since（304）
+    content_hash = blob_hash(filename)
+    if content_hash:
+        # 按内容哈希存放的文件永远不会变化，用哈希做强 ETag，允许浏览器长期缓存
+        response = send_from_directory(file_path, filename, etag=content_hash, max_age=FILE_CACHE_MAX_AGE)
+        response.cache_control.immutable = True
+    else:
+        response = send_from_directory(file_path, filename, max_age=FILE_REVALIDATE_MAX_AGE)
+    response.cache_control.public = True
+    return response
 
 
 @app.route('/uploadSave', methods=['POST'])
@@ -117,28 +199,26 @@ def upload_save():
         uuid_v1 = uuid.uuid1()
         print(f"UUID v1: {uuid_v1}")
 
-        # 构造文件名和路径
-        final_filename = f"{uuid_v1}_{filename}"
-        filepath = Path(BASE_DIR / "videoFile" / f"{uuid_v1}_{filename}")
-
-        # 保存文件
-        file.save(filepath)
-
-        with sqlite3.connect(Path(BASE_DIR / "db" / "database.db")) as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                                INSERT INTO file_records (filename, filesize, file_path)
-            VALUES (?, ?, ?)
-                                ''', (filename, round(float(os.path.getsize(filepath)) / (1024 * 1024),2), final_filename))
-            conn.commit()
-            print("✅ 上传文件已记录")
+        # 按内容哈希保存文件，相同内容只存一份：先写临时文件并计算哈希（不占用数据库连接），
+        # 再在一个短事务中登记 blob 引用和素材记录，提交后才把文件移入存储
+        tmp_path, content_hash, size = blob_store.spool(file.stream)
+        try:
+            with blob_store.add(tmp_path, content_hash, os.path.splitext(filename)[1]) as final_filename:
+                db.files.add(filename, round(float(size) / (1024 * 1024),2), final_filename, str(uuid_v1), content_hash)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+        print("✅ 上传文件已记录")
+        # 后台提取时长、分辨率等元数据和封面，/getFiles 直接返回
+        media_info.schedule(final_filename)
 
         return jsonify({
             "code": 200,
             "msg": "File uploaded and saved successfully",
             "data": {
                 "filename": filename,
-                "filepath": final_filename
+                "filepath": final_filename,
+                "sha256": content_hash
             }
         }), 200
 
@@ -150,68 +230,81 @@ def upload_save():
             "data": None
         }), 500
 
+# 列表接口单页最多返回的条数
+MAX_PAGE_SIZE = 500
+
+
+def page_args():
+    """
+    解析分页参数：limit 每页条数（不传则返回全部，兼容旧前端），after 上一页返回的 nextCursor，
+    order 为 asc / desc
+    """
+    limit = request.args.get('limit', type=int)
+    if limit is not None and limit <= 0:
+        raise ValueError("limit must be positive")
+    order = request.args.get('order', 'asc').lower()
+    if order not in ('asc', 'desc'):
+        raise ValueError("order must be asc or desc")
+    return min(limit, MAX_PAGE_SIZE) if limit else None, request.args.get('after'), order
+
+
+def page_response(items, limit, next_cursor):
+    # 传了 limit 时返回 {items, nextCursor}，否则保持原来的列表格式
+    if limit:
+        return {"items": items, "nextCursor": next_cursor}
+    return items
+
+
 @app.route('/getFiles', methods=['GET'])
 def get_all_files():
     try:
-        # 使用 with 自动管理数据库连接
-        with sqlite3.connect(Path(BASE_DIR / "db" / "database.db")) as conn:
-            conn.row_factory = sqlite3.Row  # 允许通过列名访问结果
-            cursor = conn.cursor()
-
-            # 查询所有记录
-            cursor.execute("SELECT * FROM file_records")
-            rows = cursor.fetchall()
-
-            # 将结果转为字典列表，并提取UUID
-            data = []
-            for row in rows:
-                row_dict = dict(row)
-                # 从 file_path 中提取 UUID (文件名的第一部分，下划线前)
-                if row_dict.get('file_path'):
-                    file_path_parts = row_dict['file_path'].split('_', 1)  # 只分割第一个下划线
-                    if len(file_path_parts) > 0:
-                        row_dict['uuid'] = file_path_parts[0]  # UUID 部分
-                    else:
-                        row_dict['uuid'] = ''
-                else:
-                    row_dict['uuid'] = ''
-                data.append(row_dict)
-
-            return jsonify({
-                "code": 200,
-                "msg": "success",
-                "data": data
-            }), 200
+        limit, after, order = page_args()
+        rows, next_cursor = db.files.page(
+            limit=limit,
+            after=after,
+            sort=request.args.get('sort', 'id'),
+            order=order,
+            uploaded_from=request.args.get('uploadedFrom'),
+            uploaded_to=request.args.get('uploadedTo'),
+        )
+    except ValueError as e:
+        return jsonify({"code": 400, "msg": str(e), "data": None}), 400
     except Exception as e:
+        print(f"获取文件列表时出错: {e}")
         return jsonify({
             "code": 500,
             "msg": str("get file failed!"),
             "data": None
         }), 500
 
+    data = []
+    for row in rows:
+        row_dict = dict(row)
+        # uuid 上传时已存库（file_path 中下划线前的部分）
+        row_dict['uuid'] = row_dict.get('uuid') or ''
+        data.append(row_dict)
+
+    return jsonify({
+        "code": 200,
+        "msg": "success",
+        "data": page_response(data, limit, next_cursor)
+    }), 200
+
 
 @app.route("/getAccounts", methods=['GET'])
 def getAccounts():
-    """快速获取所有账号信息，不进行cookie验证"""
+    """快速获取账号信息，不进行cookie验证；支持 type（平台）、status 筛选和 limit / after 分页"""
     try:
-        with sqlite3.connect(Path(BASE_DIR / "db" / "database.db")) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            cursor.execute('''
-            SELECT * FROM user_info''')
-            rows = cursor.fetchall()
-            rows_list = [list(row) for row in rows]
-
-            print("\n📋 当前数据表内容（快速获取）：")
-            for row in rows:
-                print(row)
-
-            return jsonify(
-                {
-                    "code": 200,
-                    "msg": None,
-                    "data": rows_list
-                }), 200
+        limit, after, order = page_args()
+        rows, next_cursor = db.users.page(
+            type=request.args.get('type', type=int),
+            status=request.args.get('status', type=int),
+            limit=limit,
+            after=after,
+            order=order,
+        )
+    except ValueError as e:
+        return jsonify({"code": 400, "msg": str(e), "data": None}), 400
     except Exception as e:
         print(f"获取账号列表时出错: {str(e)}")
         return jsonify({
@@ -220,37 +313,101 @@ def getAccounts():
             "data": None
         }), 500
 
+    rows_list = [list(row) for row in rows]
+    print(f"📋 获取账号列表（快速获取）：{len(rows_list)} 条")
+    return jsonify(
+        {
+            "code": 200,
+            "msg": None,
+            "data": page_response(rows_list, limit, next_cursor)
+        }), 200
+
 
 @app.route("/getValidAccounts",methods=['GET'])
 async def getValidAccounts():
-    with sqlite3.connect(Path(BASE_DIR / "db" / "database.db")) as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-        SELECT * FROM user_info''')
-        rows = cursor.fetchall()
-        rows_list = [list(row) for row in rows]
-        print("\n📋 当前数据表内容：")
-        for row in rows:
-            print(row)
-        for row in rows_list:
-            flag = await check_cookie(row[1],row[2])
-            if not flag:
-                row[4] = 0
-                cursor.execute('''
-                UPDATE user_info 
-                SET status = ? 
-                WHERE id = ?
-                ''', (0,row[0]))
-                conn.commit()
-                print("✅ 用户状态已更新")
-        for row in rows:
-            print(row)
-        return jsonify(
-                        {
-                            "code": 200,
-                            "msg": None,
-                            "data": rows_list
-                        }),200
+    rows_list = [list(row) for row in db.users.list()]
+    accounts = [(row[0], row[1], row[2]) for row in rows_list]
+    # refresh=1 时忽略缓存，全部重新校验
+    max_age = 0 if request.args.get('refresh') in ('1', 'true') else None
+
+    # stream=1 时以 SSE 逐个推送校验结果，最后推送完整列表
+    if request.args.get('stream') in ('1', 'true'):
+        response = Response(valid_accounts_stream(accounts, rows_list, max_age), mimetype='text/event-stream')
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['X-Accel-Buffering'] = 'no'
+        return response
+
+    results = await check_cookies(accounts, max_age=max_age)
+    save_account_status(results)
+    apply_account_status(rows_list, results)
+    return jsonify(
+                    {
+                        "code": 200,
+                        "msg": None,
+                        "data": rows_list
+                    }),200
+
+
+def save_account_status(results):
+    """把校验结果一次性写回 user_info"""
+    if not results:
+        return
+    db.users.set_status_many(results)
+    print(f"✅ 已更新 {len(results)} 个账号状态")
+
+
+def apply_account_status(rows_list, results):
+    for row in rows_list:
+        if row[0] in results:
+            row[4] = 1 if results[row[0]] else 0
+
+
+def valid_accounts_stream(accounts, rows_list, max_age=None):
+    result_queue = Queue()
+    done = object()
+    # 校验线程的事件循环和任务，客户端断开时用来取消还没完成的校验
+    checks = {"loop": None, "task": None, "closed": False}
+    checks_lock = threading.Lock()
+
+    async def run_checks():
+        with checks_lock:
+            if checks['closed']:
+                return
+            checks['loop'], checks['task'] = asyncio.get_running_loop(), asyncio.current_task()
+        results = {}
+        try:
+            async for id, valid in iter_check_cookies(accounts, max_age=max_age):
+                results[id] = valid
+                result_queue.put({"id": id, "status": 1 if valid else 0})
+        finally:
+            save_account_status(results)
+            apply_account_status(rows_list, results)
+            result_queue.put(done)
+
+    def run():
+        try:
+            asyncio.run(run_checks())
+        except asyncio.CancelledError:
+            print("⚠️ 客户端已断开，已取消剩余的账号校验")
+
+    threading.Thread(target=run, daemon=True).start()
+    try:
+        while True:
+            msg = result_queue.get()
+            if msg is done:
+                break
+            yield f"data: {json.dumps(msg, ensure_ascii=False)}\n\n"
+        yield f"data: {json.dumps({'done': True, 'data': rows_list}, ensure_ascii=False)}\n\n"
+    finally:
+        # SSE 客户端断开时生成器被关闭，取消校验线程里还在跑的浏览器校验；已完成的结果仍会写回
+        with checks_lock:
+            checks['closed'] = True
+            loop, task = checks['loop'], checks['task']
+        if task is not None and not task.done():
+            try:
+                loop.call_soon_threadsafe(task.cancel)
+            except RuntimeError:
+                pass  # 事件循环已经结束
 
 @app.route('/deleteFile', methods=['GET'])
 def delete_file():
@@ -264,39 +421,36 @@ def delete_file():
         }), 400
 
     try:
-        # 获取数据库连接
-        with sqlite3.connect(Path(BASE_DIR / "db" / "database.db")) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-
-            # 查询要删除的记录
-            cursor.execute("SELECT * FROM file_records WHERE id = ?", (file_id,))
-            record = cursor.fetchone()
-
-            if not record:
-                return jsonify({
-                    "code": 404,
-                    "msg": "File not found",
-                    "data": None
-                }), 404
-
-            record = dict(record)
-
-            # 获取文件路径并删除实际文件
-            file_path = Path(BASE_DIR / "videoFile" / record['file_path'])
-            if file_path.exists():
-                try:
-                    file_path.unlink()  # 删除文件
-                    print(f"✅ 实际文件已删除: {file_path}")
-                except Exception as e:
-                    print(f"⚠️ 删除实际文件失败: {e}")
-                    # 即使删除文件失败，也要继续删除数据库记录，避免数据不一致
-            else:
-                print(f"⚠️ 实际文件不存在: {file_path}")
-
-            # 删除数据库记录
-            cursor.execute("DELETE FROM file_records WHERE id = ?", (file_id,))
-            conn.commit()
+        # 查询要删除的记录
+        record = db.files.get(file_id)
+
+        if not record:
+            return jsonify({
+                "code": 404,
+                "msg": "File not found",
+                "data": None
+            }), 404
+
+        record = dict(record)
+
+        # 获取文件路径并删除实际文件
+        file_path = Path(BASE_DIR / "videoFile" / record['file_path'])
+        if record.get('content_hash'):
+            # 按内容存储的文件可能被多条素材引用，引用数归零时才删除
+            blob_store.release(record['content_hash'])
+        elif file_path.exists():
+            try:
+                file_path.unlink()  # 删除文件
+                print(f"✅ 实际文件已删除: {file_path}")
+            except Exception as e:
+                print(f"⚠️ 删除实际文件失败: {e}")
+                # 即使删除文件失败，也要继续删除数据库记录，避免数据不一致
+        else:
+            print(f"⚠️ 实际文件不存在: {file_path}")
+
+        # 删除数据库记录
+        db.files.delete(file_id)
+        media_info.discard(record['file_path'])
 
         return jsonify({
             "code": 200,
@@ -319,27 +473,18 @@ def delete_account():
     account_id = int(request.args.get('id'))
 
     try:
-        # 获取数据库连接
-        with sqlite3.connect(Path(BASE_DIR / "db" / "database.db")) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-
-            # 查询要删除的记录
-            cursor.execute("SELECT * FROM user_info WHERE id = ?", (account_id,))
-            record = cursor.fetchone()
-
-            if not record:
-                return jsonify({
-                    "code": 404,
-                    "msg": "account not found",
-                    "data": None
-                }), 404
+        # 查询要删除的记录
+        record = db.users.get(account_id)
 
-            record = dict(record)
+        if not record:
+            return jsonify({
+                "code": 404,
+                "msg": "account not found",
+                "data": None
+            }), 404
 
-            # 删除数据库记录
-            cursor.execute("DELETE FROM user_info WHERE id = ?", (account_id,))
-            conn.commit()
+        # 删除数据库记录
+        db.users.delete(account_id)
 
         return jsonify({
             "code": 200,
@@ -366,71 +511,107 @@ def login():
     # 模拟一个用于异步通信的队列
     status_queue = Queue()
     active_queues[id] = status_queue
+    login_task = LoginTask()
 
     def on_close():
+        # 流结束（登录完成或客户端断开）时清理队列，并取消仍在进行的登录，关闭浏览器
         print(f"清理队列: {id}")
-        del active_queues[id]
+        if active_queues.get(id) is status_queue:
+            del active_queues[id]
+        login_task.cancel()
     # 启动异步任务线程
-    thread = threading.Thread(target=run_async_function, args=(type,id,status_queue), daemon=True)
+    thread = threading.Thread(target=run_async_function, args=(type,id,status_queue,login_task), daemon=True)
     thread.start()
     response = Response(sse_stream(status_queue,), mimetype='text/event-stream')
+    response.call_on_close(on_close)
     response.headers['Cache-Control'] = 'no-cache'
     response.headers['X-Accel-Buffering'] = 'no'  # 关键：禁用 Nginx 缓冲
     response.headers['Content-Type'] = 'text/event-stream'
     response.headers['Connection'] = 'keep-alive'
     return response
 
+def publish_args(data):
+    """从 /postVideo、/postVideoBatch 的请求 JSON 中取出 publish_queue.enqueue 的参数"""
+    category = data.get('category')
+    if category == 0:
+        category = None
+    return {
+        "type": data.get('type'),
+        "file_list": data.get('fileList', []),
+        "account_list": data.get('accountList', []),
+        "title": data.get('title'),
+        "tags": data.get('tags'),
+        "category": category,
+        "enableTimer": data.get('enableTimer'),
+        "videos_per_day": data.get('videosPerDay'),
+        "daily_times": data.get('dailyTimes'),
+        "start_days": data.get('startDays'),
+        "is_draft": data.get('isDraft', False),  # 是否保存为草稿
+        "thumbnail": data.get('thumbnail', ''),
+        "productLink": data.get('productLink', ''),
+        "productTitle": data.get('productTitle', ''),
+        "force": bool(data.get('force', False)),  # 忽略发布台账，已发布过的 视频×账号 也重新发布
+    }
+
+
 @app.route('/postVideo', methods=['POST'])
 def postVideo():
     # 获取JSON数据
     data = request.get_json()
-
-    # 从JSON数据中提取fileList和accountList
-    file_list = data.get('fileList', [])
-    account_list = data.get('accountList', [])
-    type = data.get('type')
-    title = data.get('title')
-    tags = data.get('tags')
-    category = data.get('category')
-    enableTimer = data.get('enableTimer')
-    if category == 0:
-        category = None
-    productLink = data.get('productLink', '')
-    productTitle = data.get('productTitle', '')
-    thumbnail_path = data.get('thumbnail', '')
-    is_draft = data.get('isDraft', False)  # 新增参数：是否保存为草稿
-
-    videos_per_day = data.get('videosPerDay')
-    daily_times = data.get('dailyTimes')
-    start_days = data.get('startDays')
+    args = publish_args(data)
+    wait = bool(data.get('wait', False))
     # 打印获取到的数据（仅作为示例）
-    print("File List:", file_list)
-    print("Account List:", account_list)
+    print("File List:", args['file_list'])
+    print("Account List:", args['account_list'])
     try:
-        match type:
-            case 1:
-                post_video_xhs(title, file_list, tags, account_list, category, enableTimer, videos_per_day, daily_times,
-                                   start_days)
-            case 2:
-                post_video_tencent(title, file_list, tags, account_list, category, enableTimer, videos_per_day, daily_times,
-                                   start_days, is_draft)
-            case 3:
-                post_video_DouYin(title, file_list, tags, account_list, category, enableTimer, videos_per_day, daily_times,
-                          start_days, thumbnail_path, productLink, productTitle)
-            case 4:
-                post_video_ks(title, file_list, tags, account_list, category, enableTimer, videos_per_day, daily_times,
-                          start_days)
-            case _:
-                return jsonify({"code": 400, "msg": f"unsupported type: {type}", "data": None}), 400
-
-        return jsonify({"code": 200, "msg": None, "data": None}), 200
+        job_id = publish_queue.enqueue(**args)
+    except ValueError as e:
+        return jsonify({"code": 400, "msg": str(e), "data": None}), 400
     except Exception as e:
-        msg = str(e or "")
-        low = msg.lower()
-        # When user closes the browser window during login/upload, playwright raises "Target closed"/"Page closed"...
-        if "target closed" in low or "browser has been closed" in low or "page closed" in low:
-            return jsonify({"code": 499, "msg": "用户关闭了抖音登录/发布窗口，本次发布已取消。", "data": None}), 499
-        return jsonify({"code": 500, "msg": msg[:2000], "data": None}), 500
+        return jsonify({"code": 500, "msg": str(e)[:2000], "data": None}), 500
+
+    if not wait:
+        return jsonify({"code": 200, "msg": "发布任务已加入队列", "data": {"jobId": job_id}}), 200
+
+    # 同步等待有上限，超时返回 202 和 jobId，调用方改用 /getJob 或 /jobEvents 跟踪结果
+    max_wait = getattr(conf, 'POST_VIDEO_WAIT_TIMEOUT', 30)
+    try:
+        wait_timeout = min(float(data.get('waitTimeout') or max_wait), max_wait)
+    except (TypeError, ValueError):
+        wait_timeout = max_wait
+    job = publish_queue.wait(job_id, timeout=wait_timeout)
+    if job['status'] not in ('success', 'failed'):
+        return jsonify({"code": 202, "msg": "发布任务仍在执行", "data": {"jobId": job_id}}), 202
+    if job['status'] == 'success':
+        return jsonify({"code": 200, "msg": None, "data": {"jobId": job_id}}), 200
+    msg = next((task['error'] for task in job['tasks'] if task['error']), "") or ""
+    low = msg.lower()
+    # When user closes the browser window during login/upload, playwright raises "Target closed"/"Page closed"...
+    if "target closed" in low or "browser has been closed" in low or "page closed" in low:
+        return jsonify({"code": 499, "msg": "用户关闭了抖音登录/发布窗口，本次发布已取消。", "data": {"jobId": job_id}}), 499
+    return jsonify({"code": 500, "msg": msg[:2000], "data": {"jobId": job_id}}), 500
+
+
+@app.route('/getJob', methods=['GET'])
+def get_job():
+    job_id = request.args.get('id')
+    if not job_id:
+        return jsonify({"code": 400, "msg": "id is required", "data": None}), 400
+    job = publish_queue.get_job(job_id)
+    if not job:
+        return jsonify({"code": 404, "msg": "job not found", "data": None}), 404
+    return jsonify({"code": 200, "msg": None, "data": job}), 200
+
+
+@app.route('/cancelJob', methods=['POST'])
+def cancel_job():
+    job_id = request.args.get('id') or (request.get_json(silent=True) or {}).get('id')
+    if not job_id:
+        return jsonify({"code": 400, "msg": "id is required", "data": None}), 400
+    job = publish_queue.cancel(job_id)
+    if not job:
+        return jsonify({"code": 404, "msg": "job not found", "data": None}), 404
+    return jsonify({"code": 200, "msg": "任务已取消", "data": job}), 200
 
 
 @app.route('/updateUserinfo', methods=['POST'])
@@ -443,19 +624,8 @@ def updateUserinfo():
     type = data.get('type')
     userName = data.get('userName')
     try:
-        # 获取数据库连接
-        with sqlite3.connect(Path(BASE_DIR / "db" / "database.db")) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-
-            # 更新数据库记录
-            cursor.execute('''
-                           UPDATE user_info
-                           SET type     = ?,
-                               userName = ?
-                           WHERE id = ?;
-                           ''', (type, userName, user_id))
-            conn.commit()
+        # 更新数据库记录
+        db.users.update(user_id, type, userName)
 
         return jsonify({
             "code": 200,
@@ -472,49 +642,102 @@ def updateUserinfo():
 
 @app.route('/postVideoBatch', methods=['POST'])
 def postVideoBatch():
-    data_list = request.get_json()
+    """
+    批量发布：请求体为 /postVideo 参数的数组。所有项先全部校验，任何一项不合法时整批不入队，
+    返回 400 和 data.errors（每项的 index、msg）；否则每项生成一个发布任务，
+    各平台由后台工作线程按并发上限并行发布，返回 data.batchId，用 /getBatch 查询每项的状态
+    """
+    data_list = request.get_json(silent=True)
 
     if not isinstance(data_list, list):
-        return jsonify({"error": "Expected a JSON array"}), 400
-    for data in data_list:
-        # 从JSON数据中提取fileList和accountList
-        file_list = data.get('fileList', [])
-        account_list = data.get('accountList', [])
-        type = data.get('type')
-        title = data.get('title')
-        tags = data.get('tags')
-        category = data.get('category')
-        enableTimer = data.get('enableTimer')
-        if category == 0:
-            category = None
-        productLink = data.get('productLink', '')
-        productTitle = data.get('productTitle', '')
-
-        videos_per_day = data.get('videosPerDay')
-        daily_times = data.get('dailyTimes')
-        start_days = data.get('startDays')
-        # 打印获取到的数据（仅作为示例）
-        print("File List:", file_list)
-        print("Account List:", account_list)
-        match type:
-            case 1:
+        return jsonify({"code": 400, "msg": "Expected a JSON array", "data": None}), 400
+    if not all(isinstance(data, dict) for data in data_list):
+        return jsonify({"code": 400, "msg": "Each item must be a JSON object", "data": None}), 400
+    try:
+        batch_id, job_ids = publish_queue.enqueue_batch([publish_args(data) for data in data_list])
+    except PublishValidationError as e:
+        return jsonify({"code": 400, "msg": str(e)[:2000], "data": {"errors": e.errors}}), 400
+    except Exception as e:
+        return jsonify({"code": 500, "msg": str(e)[:2000], "data": None}), 500
+    print(f"批量发布任务已入队 {batch_id}，共 {len(job_ids)} 项")
+    return jsonify({
+        "code": 200,
+        "msg": "批量发布任务已加入队列",
+        "data": {"batchId": batch_id, "items": publish_queue.get_batch(batch_id)['items']}
+    }), 200
+
+
+@app.route('/jobEvents', methods=['GET'])
+def job_events():
+    """
+    发布任务的实时进度（SSE）：每条 data 为一个阶段事件（stage、taskId、platform、account、file，
+    uploading 阶段带 percent），先补发已有事件，任务结束时推送 stage 为 job_done 的事件后关闭
+    """
+    job_id = request.args.get('id')
+    if not job_id:
+        return jsonify({"code": 400, "msg": "id is required", "data": None}), 400
+    job = publish_queue.get_job(job_id)
+    if not job:
+        return jsonify({"code": 404, "msg": "job not found", "data": None}), 404
+    after = request.headers.get('Last-Event-ID', type=int) or 0
+    response = Response(job_events_stream(job_id, job['status'], after), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def job_events_stream(job_id, status, after=0, heartbeat=None):
+    heartbeat = heartbeat or SSE_HEARTBEAT_INTERVAL
+    history, queue, closed = progress.progress_bus.subscribe(job_id, after,
+                                                             running=status not in ('success', 'failed'))
+    try:
+        for event in history:
+            yield f"id: {event['id']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+        if closed:
+            if not history or history[-1]['stage'] != progress.JOB_DONE:
+                # 进程重启过或事件已过期，只能给出数据库中的最终状态
+                yield f"data: {json.dumps({'jobId': job_id, 'stage': progress.JOB_DONE, 'status': status})}\n\n"
+            return
+        while True:
+            try:
+                event = queue.get(timeout=heartbeat)
+            except Empty:
+                yield ": ping\n\n"
+                continue
+            yield f"id: {event['id']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+            if event['stage'] == progress.JOB_DONE:
                 return
-            case 2:
-                post_video_tencent(title, file_list, tags, account_list, category, enableTimer, videos_per_day, daily_times,
-                                   start_days)
-            case 3:
-                post_video_DouYin(title, file_list, tags, account_list, category, enableTimer, videos_per_day, daily_times,
-                          start_days, productLink, productTitle)
-            case 4:
-                post_video_ks(title, file_list, tags, account_list, category, enableTimer, videos_per_day, daily_times,
-                          start_days)
-    # 返回响应给客户端
-    return jsonify(
-        {
-            "code": 200,
-            "msg": None,
-            "data": None
-        }), 200
+    finally:
+        progress.progress_bus.unsubscribe(job_id, queue)
+
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus 抓取接口：浏览器启动、页面打开、上传、发布等待、cookie 校验、数据库操作的耗时和次数"""
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/getPublishLedger', methods=['GET'])
+def get_publish_ledger():
+    """发布台账：每个 视频内容×账号×平台 的发布状态，可按 hash / account / type / state 筛选"""
+    type = request.args.get('type')
+    try:
+        rows = publish_ledger.list(content_hash=request.args.get('hash'), account=request.args.get('account'),
+                                   platform=int(type) if type else None, state=request.args.get('state'))
+    except ValueError:
+        return jsonify({"code": 400, "msg": "invalid type", "data": None}), 400
+    return jsonify({"code": 200, "msg": None, "data": rows}), 200
+
+
+@app.route('/getBatch', methods=['GET'])
+def get_batch():
+    batch_id = request.args.get('id')
+    if not batch_id:
+        return jsonify({"code": 400, "msg": "id is required", "data": None}), 400
+    batch = publish_queue.get_batch(batch_id)
+    if not batch:
+        return jsonify({"code": 404, "msg": "batch not found", "data": None}), 404
+    return jsonify({"code": 200, "msg": None, "data": batch}), 200
 
 # Cookie文件上传API
 @app.route('/uploadCookie', methods=['POST'])
@@ -554,11 +777,7 @@ def upload_cookie():
             }), 400
 
         # 从数据库获取账号的文件路径
-        with sqlite3.connect(Path(BASE_DIR / "db" / "database.db")) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            cursor.execute('SELECT filePath FROM user_info WHERE id = ?', (account_id,))
-            result = cursor.fetchone()
+        result = db.users.get(account_id)
 
         if not result:
             return jsonify({
@@ -637,39 +856,78 @@ def download_cookie():
         }), 500
 
 
+class LoginTask(object):
+    """登录线程中正在运行的异步任务，供 SSE 连接断开时跨线程取消"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loop = None
+        self._task = None
+        self.cancelled = False
+
+    def bind(self, loop, task):
+        with self._lock:
+            self._loop, self._task = loop, task
+            if self.cancelled:
+                task.cancel()
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            if self._task is not None and not self._task.done():
+                self._loop.call_soon_threadsafe(self._task.cancel)
+
+
 # 包装函数：在线程中运行异步函数
-def run_async_function(type,id,status_queue):
+def run_async_function(type,id,status_queue,login_task=None):
     match type:
         case '1':
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            loop.run_until_complete(xiaohongshu_cookie_gen(id, status_queue))
-            loop.close()
+            coro = xiaohongshu_cookie_gen(id, status_queue)
         case '2':
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            loop.run_until_complete(get_tencent_cookie(id,status_queue))
-            loop.close()
+            coro = get_tencent_cookie(id,status_queue)
         case '3':
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            loop.run_until_complete(douyin_cookie_gen(id,status_queue))
-            loop.close()
+            coro = douyin_cookie_gen(id,status_queue)
         case '4':
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            loop.run_until_complete(get_ks_cookie(id,status_queue))
-            loop.close()
+            coro = get_ks_cookie(id,status_queue)
+        case _:
+            status_queue.put("500")
+            return
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    task = loop.create_task(coro)
+    if login_task is not None:
+        login_task.bind(loop, task)
+    try:
+        loop.run_until_complete(task)
+    except asyncio.CancelledError:
+        # 客户端已断开，async_playwright 退出时会关闭浏览器
+        print(f"登录已取消: {id}")
+    except Exception as e:
+        print(f"登录失败: {id} {e}")
+        status_queue.put("500")
+    finally:
+        loop.close()
+
+# SSE 登录流的心跳间隔（秒）：空闲时发送注释行保持连接，同时尽早发现客户端断开
+SSE_HEARTBEAT_INTERVAL = 10
+# 收到这些状态后推送并结束 SSE 流
+SSE_TERMINAL_MESSAGES = ("200", "500")
 
 # SSE 流生成器函数
-def sse_stream(status_queue):
+def sse_stream(status_queue, heartbeat=SSE_HEARTBEAT_INTERVAL):
+    # 服务端结束流后浏览器 EventSource 会自动重连，调大重连间隔，避免前端关闭连接前又发起一次登录
+    yield "retry: 60000\n\n"
     while True:
-        if not status_queue.empty():
-            msg = status_queue.get()
-            yield f"data: {msg}\n\n"
-        else:
-            # 避免 CPU 占满
-            time.sleep(0.1)
+        try:
+            msg = status_queue.get(timeout=heartbeat)
+        except Empty:
+            yield ": ping\n\n"
+            continue
+        yield f"data: {msg}\n\n"
+        if msg in SSE_TERMINAL_MESSAGES:
+            return
 
 if __name__ == '__main__':
+    publish_queue.start()
+    media_info.schedule_pending()
     app.run(host='0.0.0.0' ,port=5409)
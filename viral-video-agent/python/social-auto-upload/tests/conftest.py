@@ -0,0 +1,29 @@
+import importlib.util
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+# 未复制 conf.py 时（例如 CI）使用 conf.example.py 中的默认配置
+try:
+    import conf  # noqa: F401
+except ImportError:
+    spec = importlib.util.spec_from_file_location('conf', ROOT / 'conf.example.py')
+    conf = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(conf)
+    sys.modules['conf'] = conf
+
+
+import pytest  # noqa: E402
+
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    """使用临时目录中的数据库，测试不读写 db/database.db"""
+    from myUtils import db
+    pool = db.ConnectionPool(path=tmp_path / 'database.db')
+    monkeypatch.setattr(db, 'pool', pool)
+    yield db
+    pool.close()
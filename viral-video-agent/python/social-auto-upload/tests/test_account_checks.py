@@ -0,0 +1,67 @@
+import asyncio
+import json
+import threading
+import time
+from contextlib import asynccontextmanager
+
+import pytest
+
+import sau_backend
+from myUtils import auth
+
+
+@pytest.fixture
+def checks(temp_db, monkeypatch):
+    """账号 1 立即返回，其余账号一直校验到被取消；返回被取消的账号 id"""
+    cancelled = set()
+    finished = threading.Event()
+
+    async def fake_check_cookie(type, file_path, max_age=None):
+        if file_path == '1.json':
+            return True
+        try:
+            await asyncio.sleep(30)
+        except asyncio.CancelledError:
+            cancelled.add(file_path)
+            raise
+        return True
+
+    @asynccontextmanager
+    async def fake_pool():
+        try:
+            yield None
+        finally:
+            finished.set()
+
+    monkeypatch.setattr(auth, 'check_cookie', fake_check_cookie)
+    monkeypatch.setattr(auth, 'shared_browser_pool', fake_pool)
+    monkeypatch.setattr(sau_backend, 'save_account_status', lambda results: None)
+    return cancelled, finished
+
+
+def test_iter_check_cookies_cancels_pending_checks_on_close(checks):
+    cancelled, _ = checks
+    accounts = [(i, 3, f"{i}.json") for i in (1, 2, 3)]
+
+    async def first_only():
+        checks_iter = auth.iter_check_cookies(accounts)
+        first = await checks_iter.__anext__()
+        await checks_iter.aclose()
+        return first
+
+    assert asyncio.run(first_only()) == (1, True)
+    assert cancelled == {'2.json', '3.json'}
+
+
+def test_stream_disconnect_cancels_running_checks(checks):
+    cancelled, finished = checks
+    rows_list = [[i, 3, f"{i}.json", f"user{i}", 0] for i in (1, 2, 3)]
+    accounts = [(row[0], row[1], row[2]) for row in rows_list]
+
+    stream = sau_backend.valid_accounts_stream(accounts, rows_list)
+    assert json.loads(next(stream)[len('data: '):]) == {"id": 1, "status": 1}
+    started = time.monotonic()
+    stream.close()  # 客户端断开
+    assert finished.wait(5)
+    assert time.monotonic() - started < 5
+    assert cancelled == {'2.json', '3.json'}
@@ -0,0 +1,21 @@
+from utils import base_social_media
+from utils.base_social_media import is_tracker, lean_allowed_types
+
+
+def test_images_allowed_for_every_platform_by_default(monkeypatch):
+    monkeypatch.setattr(base_social_media.conf, 'LEAN_ALLOWED_RESOURCES', {}, raising=False)
+    for platform in (None, 'douyin', 'tencent', 'kuaishou', 'xiaohongshu'):
+        assert 'image' in lean_allowed_types(platform)
+        assert 'font' not in lean_allowed_types(platform)
+
+
+def test_lean_allowed_resources_only_narrows(monkeypatch):
+    monkeypatch.setattr(base_social_media.conf, 'LEAN_ALLOWED_RESOURCES',
+                        {'tencent': ['document', 'script', 'xhr', 'font']}, raising=False)
+    assert lean_allowed_types('tencent') == {'document', 'script', 'xhr'}
+    assert 'image' in lean_allowed_types('douyin')
+
+
+def test_is_tracker_matches_subdomains():
+    assert is_tracker('https://s.hm.baidu.com/hm.js', ('hm.baidu.com',))
+    assert not is_tracker('https://baidu.com/', ('hm.baidu.com',))
@@ -0,0 +1,113 @@
+import asyncio
+import threading
+from contextlib import asynccontextmanager
+
+import pytest
+
+from uploader import base_uploader
+from uploader.base_uploader import BaseUploader, UploadCancelled
+
+
+class FakeContext(object):
+    def __init__(self):
+        self.saved = []
+
+    async def new_page(self):
+        return 'page'
+
+    async def storage_state(self, path):
+        self.saved.append(path)
+
+
+class RecordingUploader(BaseUploader):
+    platform = 'test'
+    stealth = False
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.calls = []
+
+    async def prepare_page(self, page):
+        self.calls.append('prepare_page')
+
+    async def open(self, page):
+        self.calls.append('open')
+
+    async def attach(self, page):
+        self.calls.append('attach')
+
+    async def metadata(self, page):
+        self.calls.append('metadata')
+
+    async def set_schedule_time(self, page, publish_date):
+        self.calls.append('set_schedule_time')
+
+    async def click_publish(self, page):
+        self.calls.append('click_publish')
+
+    async def on_error(self, error):
+        self.calls.append(('on_error', type(error).__name__))
+
+    async def on_finish(self):
+        self.calls.append('on_finish')
+
+
+@pytest.fixture
+def fake_browser(monkeypatch):
+    context = FakeContext()
+
+    @asynccontextmanager
+    async def browser_context(**options):
+        yield context
+
+    monkeypatch.setattr(base_uploader, 'browser_context', browser_context)
+    return context
+
+
+def test_missing_hooks_fail_at_construction():
+    class Incomplete(BaseUploader):
+        async def attach(self, page):
+            pass
+
+    with pytest.raises(TypeError):
+        Incomplete('title', 'a.mp4', [], 0, 'account.json')
+
+
+def test_stages_run_in_order(fake_browser):
+    uploader = RecordingUploader('title', 'a.mp4', [], 0, 'account.json')
+    asyncio.run(uploader.main())
+    assert uploader.calls == ['prepare_page', 'open', 'attach', 'metadata', 'click_publish', 'on_finish']
+    assert fake_browser.saved == ['account.json']
+
+
+def test_failed_stage_calls_on_error(fake_browser):
+    class Failing(RecordingUploader):
+        async def metadata(self, page):
+            raise ValueError('boom')
+
+    uploader = Failing('title', 'a.mp4', [], 0, 'account.json')
+    with pytest.raises(ValueError):
+        asyncio.run(uploader.main())
+    assert uploader.calls[-2:] == [('on_error', 'ValueError'), 'on_finish']
+    assert fake_browser.saved == []
+
+
+def test_cancel_from_another_thread(fake_browser):
+    class Slow(RecordingUploader):
+        async def attach(self, page):
+            await asyncio.sleep(10)
+
+    uploader = Slow('title', 'a.mp4', [], 0, 'account.json')
+    timer = threading.Timer(0.1, uploader.cancel)
+    timer.start()
+    with pytest.raises(UploadCancelled):
+        asyncio.new_event_loop().run_until_complete(uploader.main())
+    assert uploader.calls[-2:] == [('on_error', 'CancelledError'), 'on_finish']
+
+
+def test_cancel_before_start(fake_browser):
+    uploader = RecordingUploader('title', 'a.mp4', [], 0, 'account.json')
+    uploader.cancel()
+    with pytest.raises(UploadCancelled):
+        asyncio.run(uploader.main())
+    assert uploader.calls == []
@@ -0,0 +1,157 @@
+import hashlib
+import io
+
+import pytest
+
+from myUtils import blobStore, chunkedUpload
+from myUtils.chunkedUpload import ChunkedUploadStore, UploadError
+
+CONTENT = b'0123456789' * 100
+DIGEST = hashlib.sha256(CONTENT).hexdigest()
+
+
+@pytest.fixture
+def store(temp_db, tmp_path, monkeypatch):
+    """videoFile 指向临时目录，不提取元数据"""
+    video_dir = tmp_path / 'videoFile'
+    video_dir.mkdir()
+    monkeypatch.setattr(blobStore, 'VIDEO_DIR', video_dir)
+    monkeypatch.setattr(blobStore, 'BLOB_DIR', video_dir / 'blobs')
+    monkeypatch.setattr(blobStore, 'TMP_DIR', video_dir / 'blobs' / 'tmp')
+    monkeypatch.setattr(chunkedUpload, 'VIDEO_DIR', video_dir)
+    monkeypatch.setattr(chunkedUpload.media_info, 'schedule', lambda file_path: None)
+    return ChunkedUploadStore()
+
+
+def ref_count(db, sha256):
+    with db.connection() as conn:
+        row = conn.execute("SELECT ref_count FROM blobs WHERE hash = ?", (sha256,)).fetchone()
+    return row['ref_count'] if row else 0
+
+
+def file_count(db):
+    with db.connection() as conn:
+        return conn.execute("SELECT COUNT(*) FROM file_records").fetchone()[0]
+
+
+def upload(store, content=CONTENT, filename='a.mp4'):
+    session = store.create(filename, len(content))
+    store.write(session['uploadId'], 0, io.BytesIO(content))
+    return store.complete(session['uploadId'])
+
+
+def test_instant_create_acquires_existing_blob(store, temp_db):
+    upload(store)
+    result = store.create('b.mp4', len(CONTENT), sha256=DIGEST)
+    assert result['completed']
+    assert ref_count(temp_db, DIGEST) == 2
+    assert file_count(temp_db) == 2
+
+
+def test_instant_create_rejects_mismatched_size(store, temp_db):
+    upload(store)
+    result = store.create('b.mp4', len(CONTENT) + 1, sha256=DIGEST)
+    # 声明的大小与已存内容不符时按普通上传处理
+    assert not result['completed']
+    assert ref_count(temp_db, DIGEST) == 1
+    assert file_count(temp_db) == 1
+
+
+def test_failed_file_record_rolls_back_blob_ref(store, temp_db, monkeypatch):
+    upload(store)
+
+    def broken_add(*args, **kwargs):
+        raise RuntimeError('disk full')
+
+    monkeypatch.setattr(temp_db.files, 'add', broken_add)
+    with pytest.raises(RuntimeError):
+        store.create('b.mp4', len(CONTENT), sha256=DIGEST)
+    with pytest.raises(RuntimeError):
+        upload(store, filename='c.mp4')
+    assert ref_count(temp_db, DIGEST) == 1
+
+
+def test_complete_rejects_hash_mismatch(store):
+    session = store.create('a.mp4', len(CONTENT))
+    store.write(session['uploadId'], 0, io.BytesIO(CONTENT))
+    with pytest.raises(UploadError) as exc:
+        store.complete(session['uploadId'], sha256='0' * 64)
+    assert exc.value.status == 422
+    assert exc.value.data == {"sha256": DIGEST}
+
+
+def test_resume_after_interrupted_chunk(store, temp_db):
+    session = store.create('a.mp4', len(CONTENT))
+    upload_id = session['uploadId']
+    assert store.write(upload_id, 0, io.BytesIO(CONTENT[:300]))['offset'] == 300
+
+    # 跳到后面的偏移量时返回 409 和当前 offset
+    with pytest.raises(UploadError) as exc:
+        store.write(upload_id, 500, io.BytesIO(CONTENT[500:]))
+    assert (exc.value.status, exc.value.data) == (409, {"offset": 300})
+
+    # 重传与已写入部分重叠时跳过重叠部分
+    assert store.write(upload_id, 200, io.BytesIO(CONTENT[200:600]))['offset'] == 600
+    assert store.status(upload_id)['offset'] == 600
+
+    # 服务重启后内存中的增量哈希丢失，从磁盘补算
+    store._states.clear()
+    store.write(upload_id, 600, io.BytesIO(CONTENT[600:]))
+    result = store.complete(upload_id, sha256=DIGEST)
+    assert result['sha256'] == DIGEST
+    assert result['filepath'] == blobStore.blob_relpath(DIGEST, '.mp4')
+    assert (blobStore.VIDEO_DIR / result['filepath']).read_bytes() == CONTENT
+    assert file_count(temp_db) == 1
+
+
+def test_complete_rejects_incomplete_upload(store):
+    session = store.create('a.mp4', len(CONTENT))
+    store.write(session['uploadId'], 0, io.BytesIO(CONTENT[:10]))
+    with pytest.raises(UploadError) as exc:
+        store.complete(session['uploadId'])
+    assert (exc.value.status, exc.value.data) == (409, {"offset": 10})
+
+
+def test_chunk_beyond_declared_size_is_rejected(store):
+    session = store.create('a.mp4', 10)
+    with pytest.raises(UploadError) as exc:
+        store.write(session['uploadId'], 0, io.BytesIO(CONTENT[:20]))
+    assert exc.value.status == 400
+
+
+def test_completed_session_is_gone(store):
+    session = store.create('a.mp4', len(CONTENT))
+    store.write(session['uploadId'], 0, io.BytesIO(CONTENT))
+    store.complete(session['uploadId'])
+    with pytest.raises(UploadError) as exc:
+        store.status(session['uploadId'])
+    assert exc.value.status == 404
+
+
+def test_failed_file_record_leaves_no_orphan_blob(store, temp_db, monkeypatch):
+    add = temp_db.files.add
+
+    def broken_add(*args, **kwargs):
+        raise RuntimeError('disk full')
+
+    monkeypatch.setattr(temp_db.files, 'add', broken_add)
+    session = store.create('a.mp4', len(CONTENT))
+    store.write(session['uploadId'], 0, io.BytesIO(CONTENT))
+    with pytest.raises(RuntimeError):
+        store.complete(session['uploadId'])
+    # blob 记录回滚、文件没有移入存储，.part 保留，修复后可以重新 complete
+    assert ref_count(temp_db, DIGEST) == 0
+    assert not (blobStore.VIDEO_DIR / blobStore.blob_relpath(DIGEST, '.mp4')).exists()
+    monkeypatch.setattr(temp_db.files, 'add', add)
+    assert store.complete(session['uploadId'])['sha256'] == DIGEST
+    assert ref_count(temp_db, DIGEST) == 1
+
+
+def test_spool_does_not_touch_the_database(store, temp_db, monkeypatch):
+    def no_db():
+        raise AssertionError('spool must not check out a connection')
+
+    monkeypatch.setattr(temp_db, 'connection', no_db)
+    tmp_path, digest, size = blobStore.blob_store.spool(io.BytesIO(CONTENT))
+    assert (digest, size) == (DIGEST, len(CONTENT))
+    assert tmp_path.read_bytes() == CONTENT
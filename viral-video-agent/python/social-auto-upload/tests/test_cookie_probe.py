@@ -0,0 +1,123 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+from utils import cookie_probe
+
+# 每条路径对应的应答：(状态码, 响应体, 延迟秒数)
+DOUYIN_PATH = '/web/api/media/user/info/'
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    routes = {}
+    hits = {}
+
+    def do_GET(self):
+        path = self.path.split('?')[0]
+        StubHandler.hits[path] = StubHandler.hits.get(path, 0) + 1
+        responses = StubHandler.routes[path]
+        status, body, delay = responses[min(StubHandler.hits[path], len(responses)) - 1]
+        if delay:
+            time.sleep(delay)
+        payload = body.encode('utf-8') if isinstance(body, str) else json.dumps(body).encode('utf-8')
+        try:
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+        except OSError:
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope='module')
+def stub_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def probe(stub_server, tmp_path, monkeypatch):
+    """返回 probe(应答列表) -> (结果, 请求次数)，应答按请求顺序使用，最后一个重复使用"""
+    account_file = tmp_path / 'account.json'
+    account_file.write_text(json.dumps({"cookies": [
+        {"name": "sessionid", "value": "abc", "domain": ".douyin.com", "path": "/", "expires": -1},
+    ]}), encoding='utf-8')
+    monkeypatch.setattr(cookie_probe, '_client', httpx.Client(timeout=0.3))
+    monkeypatch.setattr(cookie_probe.PROBE_RETRY, 'base_delay', 0.01)
+    monkeypatch.setattr(cookie_probe.PROBE_RETRY, 'max_delay', 0.01)
+
+    def run(responses):
+        StubHandler.routes = {DOUYIN_PATH: responses}
+        StubHandler.hits = {}
+        result = cookie_probe.probe_cookie_sync('douyin', account_file, base_url=stub_server)
+        return result, StubHandler.hits.get(DOUYIN_PATH, 0)
+
+    yield run
+    cookie_probe._client.close()
+
+
+def test_valid_cookie(probe):
+    assert probe([(200, {"status_code": 0, "user": {"uid": 1}}, 0)]) == (True, 1)
+
+
+def test_expired_cookie(probe):
+    assert probe([(200, {"status_code": 8}, 0)]) == (False, 1)
+
+
+def test_unauthorized_is_invalid(probe):
+    assert probe([(401, {}, 0)]) == (False, 1)
+
+
+def test_403_challenge_falls_back_to_browser(probe):
+    # WAF / 风控拦截页：不能判定为失效
+    assert probe([(403, '<html>verify</html>', 0)]) == (None, 1)
+    assert probe([(403, {"status_code": 0, "user": {"uid": 1}}, 0)]) == (None, 1)
+
+
+def test_403_with_auth_failure_body_is_invalid(probe):
+    assert probe([(403, {"status_code": 8}, 0)]) == (False, 1)
+
+
+@pytest.mark.parametrize('status', [429, 500, 502, 503, 504])
+def test_retryable_status_then_success(probe, status):
+    assert probe([(status, {}, 0), (200, {"status_code": 0, "user": {"uid": 1}}, 0)]) == (True, 2)
+
+
+def test_retryable_status_exhausted(probe):
+    assert probe([(503, {}, 0)]) == (None, cookie_probe.PROBE_RETRY.max_attempts)
+
+
+def test_timeout_falls_back_to_browser(probe):
+    result, hits = probe([(200, {"status_code": 0, "user": {"uid": 1}}, 1)])
+    assert result is None
+    assert hits == cookie_probe.PROBE_RETRY.max_attempts
+
+
+def test_unknown_response_is_undecided(probe):
+    assert probe([(200, {"status_code": 2154}, 0)]) == (None, 1)
+    assert probe([(200, 'not json', 0)]) == (None, 1)
+
+
+@pytest.mark.parametrize('body', [[], [{"status_code": 8}], '"expired"', 0, None])
+def test_non_object_json_is_undecided(probe, body):
+    assert probe([(200, body, 0)]) == (None, 1)
+    assert probe([(403, body, 0)]) == (None, 1)
+
+
+def test_no_cookie_for_platform(tmp_path):
+    account_file = tmp_path / 'account.json'
+    account_file.write_text(json.dumps({"cookies": []}), encoding='utf-8')
+    assert cookie_probe.probe_cookie_sync('douyin', account_file, base_url='http://127.0.0.1:9') is False
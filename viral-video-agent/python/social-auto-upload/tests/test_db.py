@@ -0,0 +1,88 @@
+import sqlite3
+
+import pytest
+
+from myUtils import db
+
+
+def add_files(temp_db, times):
+    with temp_db.connection() as conn:
+        conn.executemany("INSERT INTO file_records (filename, file_path, upload_time) VALUES (?, ?, ?)",
+                         [(f"{i}.mp4", f"{i}.mp4", time) for i, time in enumerate(times)])
+
+
+def collect(page, **kwargs):
+    ids, after = [], None
+    while True:
+        rows, after = page(after=after, **kwargs)
+        ids.extend(row['id'] for row in rows)
+        if after is None:
+            return ids
+
+
+def test_keyset_pagination_by_id(temp_db):
+    add_files(temp_db, ['2025-01-01 00:00:00'] * 5)
+    rows, after = temp_db.files.page(limit=2)
+    assert [row['id'] for row in rows] == [1, 2]
+    assert after is not None
+    assert collect(temp_db.files.page, limit=2) == [1, 2, 3, 4, 5]
+    assert collect(temp_db.files.page, limit=2, order='desc') == [5, 4, 3, 2, 1]
+
+
+def test_keyset_pagination_breaks_ties_by_id(temp_db):
+    # 相同的 upload_time 跨页时按 id 继续，不重复也不遗漏
+    add_files(temp_db, ['2025-01-02 00:00:00', '2025-01-01 00:00:00', '2025-01-01 00:00:00',
+                        '2025-01-01 00:00:00', '2025-01-03 00:00:00'])
+    assert collect(temp_db.files.page, limit=2, sort='upload_time') == [2, 3, 4, 1, 5]
+    assert collect(temp_db.files.page, limit=2, sort='upload_time', order='desc') == [5, 1, 4, 3, 2]
+
+
+def test_pagination_filters_and_last_page(temp_db):
+    add_files(temp_db, ['2025-01-01 00:00:00', '2025-02-01 00:00:00', '2025-03-01 00:00:00'])
+    rows, after = temp_db.files.page(limit=5, uploaded_from='2025-01-15 00:00:00')
+    assert [row['id'] for row in rows] == [2, 3]
+    assert after is None
+
+
+def test_invalid_cursor_and_sort(temp_db):
+    with pytest.raises(ValueError):
+        temp_db.files.page(limit=2, after='not-a-cursor')
+    with pytest.raises(ValueError):
+        temp_db.files.page(limit=2, sort='filename')
+    assert db.decode_cursor(db.encode_cursor(['2025-01-01 00:00:00', 3])) == ['2025-01-01 00:00:00', 3]
+
+
+def test_record_check_leaves_status_to_batch_write(temp_db):
+    user_id = temp_db.users.add(3, 'a.json', 'a', 1)
+    temp_db.users.record_check(3, 'a.json', False)
+    assert temp_db.users.get_check(3, 'a.json')[0] is False
+    assert temp_db.users.get(user_id)['status'] == 1
+    temp_db.users.set_status_many({user_id: False})
+    assert temp_db.users.get(user_id)['status'] == 0
+
+
+def test_migrate_upgrades_old_schema(tmp_path):
+    conn = sqlite3.connect(tmp_path / 'old.db')
+    conn.execute("CREATE TABLE user_info (id INTEGER PRIMARY KEY AUTOINCREMENT, type INTEGER NOT NULL, "
+                 "filePath TEXT NOT NULL, userName TEXT NOT NULL, status INTEGER DEFAULT 0)")
+    conn.execute("CREATE TABLE file_records (id INTEGER PRIMARY KEY AUTOINCREMENT, filename TEXT NOT NULL, "
+                 "filesize REAL, upload_time DATETIME DEFAULT CURRENT_TIMESTAMP, file_path TEXT)")
+    conn.execute("CREATE TABLE publish_jobs (id TEXT PRIMARY KEY, type INTEGER NOT NULL, payload TEXT NOT NULL, "
+                 "status TEXT NOT NULL DEFAULT 'pending')")
+    conn.execute("INSERT INTO file_records (filename, file_path) VALUES ('a.mp4', 'abc_a.mp4')")
+    conn.commit()
+
+    db.migrate(conn)
+    db.migrate(conn)  # 重复执行不报错
+
+    assert {'last_checked', 'last_result'} <= db._columns(conn, 'user_info')
+    assert {'uuid', 'content_hash', *db.MEDIA_COLUMNS} <= db._columns(conn, 'file_records')
+    assert conn.execute("SELECT uuid FROM file_records").fetchone()[0] == 'abc'
+    assert {'batch_id', 'batch_index'} <= db._columns(conn, 'publish_jobs')
+    for table, columns in db.ADDED_COLUMNS.items():
+        assert set(columns) <= db._columns(conn, table)
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert {'user_info', 'file_records', 'blobs', 'upload_sessions', 'publish_jobs', 'publish_tasks',
+            'publish_ledger'} <= tables
+    assert conn.execute("SELECT name FROM sqlite_master WHERE name = 'idx_publish_jobs_batch'").fetchone()
+    conn.close()
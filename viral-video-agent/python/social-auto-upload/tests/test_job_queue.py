@@ -0,0 +1,145 @@
+import asyncio
+import threading
+
+import pytest
+
+from myUtils import jobQueue
+from myUtils.jobQueue import PublishQueue, PENDING, RUNNING, FAILED, SKIPPED
+from utils import progress
+
+
+@pytest.fixture
+def queue(temp_db):
+    return PublishQueue(num_workers=1)
+
+
+def insert_job(queue, tasks, keys=None, payload=None):
+    keys = keys or [(f"hash{i}", account, 3) for i, (_, account, _) in enumerate(tasks)]
+    with jobQueue.db.connection() as conn:
+        job_id = queue._insert_job(conn.cursor(), 3, payload or {"title": "t"}, tasks, keys)
+        conn.commit()
+    return job_id
+
+
+def set_status(task_id, status):
+    with jobQueue.db.connection() as conn:
+        conn.execute("UPDATE publish_tasks SET status = ? WHERE id = ?", (status, task_id))
+        conn.commit()
+
+
+class FakeUploader(object):
+    def __init__(self):
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+def test_insert_job_skips_published_combinations(queue):
+    from myUtils.publishLedger import publish_ledger
+    key = ('hash0', 'a.json', 3)
+    publish_ledger.begin(key)
+    publish_ledger.finish(key)
+    job_id = insert_job(queue, [('a.mp4', 'a.json', None), ('b.mp4', 'a.json', None)],
+                        keys=[key, ('hash1', 'a.json', 3)])
+    statuses = [task['status'] for task in queue.get_job(job_id)['tasks']]
+    assert statuses == [SKIPPED, PENDING]
+    assert publish_ledger.state(('hash1', 'a.json', 3)) == 'pending'
+
+
+def test_cancel_pending_job(queue):
+    job_id = insert_job(queue, [('a.mp4', 'a.json', None), ('a.mp4', 'b.json', None)])
+    job = queue.cancel(job_id)
+    assert job['status'] == FAILED
+    assert {task['status'] for task in job['tasks']} == {FAILED}
+    assert {task['error'] for task in job['tasks']} == {jobQueue.CANCELLED_MESSAGE}
+
+
+def test_cancel_interrupts_running_uploader(queue):
+    job_id = insert_job(queue, [('a.mp4', 'a.json', None), ('a.mp4', 'b.json', None),
+                                ('a.mp4', 'c.json', None)])
+    first, second, pending = queue.get_job(job_id)['tasks']
+    set_status(first['id'], RUNNING)
+    set_status(second['id'], RUNNING)
+    first = {"id": first['id'], "job_id": job_id}
+    second = {"id": second['id'], "job_id": job_id}
+    uploader = FakeUploader()
+    queue._register(first, uploader)
+
+    job = queue.cancel(job_id)
+    assert uploader.cancelled
+    assert job['status'] == RUNNING
+    assert job['tasks'][2]['status'] == FAILED
+
+    # 取消前已领取、取消后才登记的上传器在登记时取消
+    late = FakeUploader()
+    queue._register(second, late)
+    assert late.cancelled
+
+    queue._finish(first, 'douyin 上传已取消')
+    queue._finish(second, 'douyin 上传已取消')
+    assert queue.get_job(job_id)['status'] == FAILED
+    assert job_id not in queue._cancelled_jobs
+    assert not queue._running
+
+
+def test_cancel_unknown_job(queue):
+    assert queue.cancel('missing') is None
+
+
+def test_wait_returns_unfinished_job_after_timeout(queue):
+    job_id = insert_job(queue, [('a.mp4', 'a.json', None)])
+    job = queue.wait(job_id, timeout=0.05)
+    assert job['status'] == PENDING
+
+
+def test_wait_wakes_up_when_task_finishes(queue):
+    job_id = insert_job(queue, [('a.mp4', 'a.json', None)])
+    task = queue.get_job(job_id)['tasks'][0]
+    set_status(task['id'], RUNNING)
+    timer = threading.Timer(0.1, queue._finish, args=({"id": task['id'], "job_id": job_id}, None))
+    timer.start()
+    try:
+        assert queue.wait(job_id, timeout=3)['status'] == 'success'
+    finally:
+        timer.join()
+
+
+@pytest.fixture
+def shared_loop(queue):
+    """在后台线程中运行发布队列共用的事件循环"""
+    queue._loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=queue._run_loop, daemon=True)
+    thread.start()
+    yield queue._loop
+    queue._loop.call_soon_threadsafe(queue._loop.stop)
+    thread.join(timeout=5)
+    queue._loop.close()
+
+
+def test_publish_runs_on_shared_loop_with_task_scope(queue, shared_loop, monkeypatch):
+    async def fake_publish_one(type, file, account, publish_date, job_id=None, on_app=None, **options):
+        return asyncio.get_running_loop(), progress.current_scope()
+
+    monkeypatch.setattr(jobQueue, 'publish_one', fake_publish_one)
+    tasks = [{"id": i, "job_id": "job", "type": 3, "account_file": f"{i}.json", "file_path": "a.mp4"}
+             for i in (1, 2)]
+    results = [asyncio.run_coroutine_threadsafe(queue._publish(task, 0, {}), shared_loop).result(timeout=5)
+               for task in tasks]
+    assert {loop for loop, _ in results} == {queue._loop}
+    assert [scope['taskId'] for _, scope in results] == [1, 2]
+
+
+@pytest.mark.parametrize('error', [TimeoutError(), asyncio.TimeoutError(), Exception()])
+def test_task_failing_with_empty_message_is_failed(queue, shared_loop, monkeypatch, error):
+    async def fake_publish_one(*args, **kwargs):
+        raise error
+
+    monkeypatch.setattr(jobQueue, 'publish_one', fake_publish_one)
+    job_id = insert_job(queue, [('a.mp4', 'a.json', None)])
+    task = queue._claim()
+    queue._run_task(task)
+    job = queue.get_job(job_id)
+    assert job['status'] == FAILED
+    assert job['tasks'][0]['status'] == FAILED
+    assert job['tasks'][0]['error'] == repr(error)
@@ -0,0 +1,16 @@
+from utils import metrics
+
+
+def test_final_stage_clears_task_stages():
+    scope = {"jobId": "job", "taskId": 1, "platform": 3}
+    metrics.observe_stage(scope, 'started', now=100.0)
+    metrics.observe_stage(scope, 'published', now=160.0)
+    assert ('job', 1) not in metrics._task_stages
+
+
+def test_forget_task_clears_crashed_task():
+    scope = {"jobId": "job", "taskId": 2, "platform": 3}
+    metrics.observe_stage(scope, 'started', now=100.0)
+    metrics.observe_stage(scope, 'file_attached', now=110.0)
+    metrics.forget_task('job', 2)
+    assert ('job', 2) not in metrics._task_stages
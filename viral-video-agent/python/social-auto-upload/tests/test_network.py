@@ -0,0 +1,98 @@
+import asyncio
+
+import pytest
+
+from utils.network import PermanentError, RetryError, RetryPolicy, RetryTimeout, async_retry, is_transient
+
+
+async def failing_coroutine():
+    raise ConnectionError('down')
+
+
+@pytest.mark.parametrize('error', [
+    PermanentError('x'), FileNotFoundError('x'), PermissionError('x'), TypeError('x'),
+    NotImplementedError('x'), AttributeError('x'), KeyError('x'), ValueError('x'),
+    RuntimeError('Target page, context or browser has been closed'),
+])
+def test_permanent_errors(error):
+    assert not is_transient(error)
+
+
+@pytest.mark.parametrize('error', [TimeoutError('x'), ConnectionError('x'), RuntimeError('net::ERR_ABORTED')])
+def test_transient_errors(error):
+    assert is_transient(error)
+
+
+def test_programming_error_is_not_retried():
+    calls = []
+
+    def lookup():
+        calls.append(1)
+        return {}['missing']
+
+    with pytest.raises(KeyError):
+        RetryPolicy('lookup', max_attempts=3, base_delay=0).call(lookup)
+    assert len(calls) == 1
+
+
+def test_delay_grows_exponentially_up_to_max():
+    policy = RetryPolicy('backoff', base_delay=0.5, max_delay=3, multiplier=2, jitter=False)
+    assert [policy.delay(attempt) for attempt in range(1, 6)] == [0.5, 1, 2, 3, 3]
+
+
+def test_jitter_stays_between_half_and_full_delay():
+    policy = RetryPolicy('jitter', base_delay=1, max_delay=10)
+    for attempt in range(1, 5):
+        full = min(10, 2 ** (attempt - 1))
+        assert all(full / 2 <= policy.delay(attempt) <= full for _ in range(20))
+
+
+def test_retries_transient_errors_until_success():
+    calls = []
+
+    @RetryPolicy('flaky', max_attempts=3, base_delay=0, jitter=False)
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise ConnectionError('reset')
+        return 'ok'
+
+    assert flaky() == 'ok'
+    assert len(calls) == 3
+
+
+def test_exhausted_attempts_raise_retry_error():
+    policy = RetryPolicy('down', max_attempts=2, base_delay=0, jitter=False)
+    with pytest.raises(RetryError) as exc:
+        asyncio.run(policy.run(failing_coroutine))
+    assert exc.value.attempts == 2
+    assert isinstance(exc.value.last_error, ConnectionError)
+
+
+def test_budget_raises_retry_timeout_before_sleeping_past_it():
+    policy = RetryPolicy('slow', budget=0.05, base_delay=1, jitter=False)
+    with pytest.raises(RetryTimeout) as exc:
+        asyncio.run(policy.run(failing_coroutine))
+    assert exc.value.attempts == 1
+    assert isinstance(exc.value, TimeoutError)
+
+
+def test_retry_on_and_give_up_on_limit_retries():
+    policy = RetryPolicy('narrow', max_attempts=3, base_delay=0, retry_on=(ConnectionError,),
+                         give_up_on=(ConnectionRefusedError,))
+    assert policy.retryable(ConnectionResetError('x'))
+    assert not policy.retryable(ConnectionRefusedError('x'))
+    assert not policy.retryable(TimeoutError('x'))
+
+
+def test_async_retry_decorator():
+    calls = []
+
+    @async_retry(timeout=5, max_retries=2)
+    async def always_fails():
+        calls.append(1)
+        raise ConnectionError('x')
+
+    with pytest.raises(RetryError):
+        asyncio.run(always_fails())
+    assert len(calls) == 2
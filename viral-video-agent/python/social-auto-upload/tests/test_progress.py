@@ -0,0 +1,30 @@
+from utils.progress import ProgressBus, JOB_DONE
+
+
+def test_subscribe_unknown_job_does_not_create_stream():
+    bus = ProgressBus()
+    history, queue, closed = bus.subscribe('finished-or-pruned')
+    assert (history, closed) == ([], True)
+    assert 'finished-or-pruned' not in bus._jobs
+    bus.unsubscribe('finished-or-pruned', queue)
+    assert not bus._jobs
+
+
+def test_subscribe_running_job_waits_for_events():
+    bus = ProgressBus()
+    history, queue, closed = bus.subscribe('job', running=True)
+    assert (history, closed) == ([], False)
+    bus.publish('job', {"stage": "started"})
+    bus.close('job', status='success')
+    assert queue.get_nowait()['stage'] == 'started'
+    assert queue.get_nowait()['stage'] == JOB_DONE
+    bus.unsubscribe('job', queue)
+
+
+def test_subscribe_replays_history_after_last_event_id():
+    bus = ProgressBus()
+    first = bus.publish('job', {"stage": "started"})
+    bus.close('job', status='failed')
+    history, _, closed = bus.subscribe('job', after=first['id'])
+    assert closed
+    assert [event['stage'] for event in history] == [JOB_DONE]
@@ -0,0 +1,103 @@
+import asyncio
+import hashlib
+import os
+
+import pytest
+
+from myUtils.publishLedger import (PublishLedger, BLOB_DIR, PENDING, IN_PROGRESS, PUBLISHED, FAILED)
+
+DIGEST = 'ab' * 32
+
+
+@pytest.fixture
+def ledger(temp_db):
+    return PublishLedger()
+
+
+class FakeApp(object):
+    def __init__(self, file_path, account_file='cookies/a.json', error=None):
+        self.file_path = file_path
+        self.account_file = account_file
+        self.error = error
+        self.runs = 0
+
+    async def main(self):
+        self.runs += 1
+        if self.error:
+            raise self.error
+
+
+def test_key_uses_blob_name_and_account_basename(ledger):
+    blob = BLOB_DIR / DIGEST[:2] / f"{DIGEST}.mp4"
+    assert ledger.key(blob, '/abs/cookies/a.json', '3') == (DIGEST, 'a.json', 3)
+
+
+def test_content_hash_is_cached_until_file_changes(ledger, tmp_path, monkeypatch):
+    video = tmp_path / 'a.mp4'
+    video.write_bytes(b'first')
+    assert ledger.content_hash(video) == hashlib.sha256(b'first').hexdigest()
+
+    reads = []
+    original_open = open
+
+    def counting_open(path, *args, **kwargs):
+        reads.append(path)
+        return original_open(path, *args, **kwargs)
+
+    monkeypatch.setattr('builtins.open', counting_open)
+    ledger.content_hash(video)
+    assert reads == []
+
+    video.write_bytes(b'second!')
+    os.utime(video, (1, 1))
+    assert ledger.content_hash(video) == hashlib.sha256(b'second!').hexdigest()
+    assert len(reads) == 1
+
+
+def test_begin_finish_and_mark_pending_dedupe(ledger):
+    key = (DIGEST, 'a.json', 3)
+    ledger.mark_pending([key], job_id='job1')
+    assert ledger.state(key) == PENDING
+    assert ledger.begin(key, 'job1')
+    assert ledger.state(key) == IN_PROGRESS
+    ledger.finish(key)
+    assert ledger.is_published(key)
+
+    # 已发布的组合不会被新任务改回 pending，也不会再次开始，除非 force
+    ledger.mark_pending([key], job_id='job2')
+    assert ledger.state(key) == PUBLISHED
+    assert not ledger.begin(key, 'job2')
+    assert ledger.begin(key, 'job2', force=True)
+
+
+def test_run_skips_published_and_records_failures(ledger):
+    blob = BLOB_DIR / DIGEST[:2] / f"{DIGEST}.mp4"
+    app = FakeApp(blob)
+    assert asyncio.run(ledger.run(app, 3, 'job1'))
+    assert not asyncio.run(ledger.run(app, 3, 'job2'))
+    assert app.runs == 1
+
+    failing = FakeApp(blob, 'cookies/b.json', RuntimeError('boom'))
+    with pytest.raises(RuntimeError):
+        asyncio.run(ledger.run(failing, 3, 'job3'))
+    rows = {row['account']: row for row in ledger.list(content_hash=DIGEST)}
+    assert rows['a.json']['state'] == PUBLISHED
+    assert rows['b.json']['state'] == FAILED
+    assert rows['b.json']['error'] == 'boom'
+
+
+@pytest.mark.parametrize('error', [asyncio.CancelledError(), TimeoutError(), Exception()])
+def test_run_records_empty_message_errors_as_failed(ledger, error):
+    blob = BLOB_DIR / DIGEST[:2] / f"{DIGEST}.mp4"
+    app = FakeApp(blob, error=error)
+    with pytest.raises(type(error)):
+        asyncio.run(ledger.run(app, 3, 'job1'))
+    key = ledger.key(blob, app.account_file, 3)
+    assert ledger.state(key) == FAILED
+    row = ledger.list(content_hash=DIGEST)[0]
+    assert row['error'] == repr(error)
+    assert row['published_at'] is None
+    # 失败的组合再次提交时会重新发布
+    app.error = None
+    assert asyncio.run(ledger.run(app, 3, 'job2'))
+    assert app.runs == 2
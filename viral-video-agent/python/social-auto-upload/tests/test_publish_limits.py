@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+
+from utils import publish_limits
+from utils.publish_limits import fan_out
+
+
+class FakeApp(object):
+    def __init__(self, account_file, file_path, error=None):
+        self.account_file = account_file
+        self.file_path = file_path
+        self.error = error
+
+
+def run_fan_out(apps, concurrency=None):
+    """执行 fan_out，记录每个账号同时在跑的上传数和全局最大并发"""
+    state = {"running": 0, "peak": 0, "per_account": {}, "order": []}
+
+    async def run(app):
+        account = app.account_file
+        state['running'] += 1
+        state['per_account'][account] = state['per_account'].get(account, 0) + 1
+        state['peak'] = max(state['peak'], state['running'])
+        assert state['per_account'][account] == 1, "同一账号的上传必须逐个执行"
+        state['order'].append(app.file_path)
+        await asyncio.sleep(0.01)
+        state['per_account'][account] -= 1
+        state['running'] -= 1
+        if app.error:
+            raise app.error
+
+    asyncio.run(fan_out(apps, 3, concurrency=concurrency, run=run))
+    return state
+
+
+@pytest.fixture(autouse=True)
+def limits(monkeypatch):
+    monkeypatch.setattr(publish_limits.conf, 'PUBLISH_MAX_CONCURRENCY', 4, raising=False)
+    monkeypatch.setattr(publish_limits.conf, 'PUBLISH_PLATFORM_CONCURRENCY', {3: 3}, raising=False)
+
+
+def test_same_account_runs_in_order_and_accounts_run_in_parallel():
+    apps = [FakeApp(account, f"{account}-{i}") for account in ('a', 'b') for i in range(3)]
+    state = run_fan_out(apps)
+    assert [name for name in state['order'] if name.startswith('a')] == ['a-0', 'a-1', 'a-2']
+    assert state['peak'] == 2
+
+
+def test_concurrency_capped_by_platform_and_argument():
+    apps = [FakeApp(f"acc{i}", f"v{i}") for i in range(6)]
+    assert run_fan_out(apps)['peak'] == 3
+    assert run_fan_out(apps, concurrency=1)['peak'] == 1
+
+
+def test_failure_does_not_stop_other_uploads():
+    apps = [FakeApp('a', 'a-0', RuntimeError('boom')), FakeApp('a', 'a-1'), FakeApp('b', 'b-0')]
+    done = []
+
+    async def run(app):
+        done.append(app.file_path)
+        if app.error:
+            raise app.error
+
+    with pytest.raises(RuntimeError, match='boom'):
+        asyncio.run(fan_out(apps, 3, run=run))
+    assert sorted(done) == ['a-0', 'a-1', 'b-0']
@@ -0,0 +1,57 @@
+import asyncio
+
+import pytest
+from playwright.async_api import Error as PlaywrightError
+
+from utils import waits
+
+
+class FakePage(object):
+    """evaluate 依次抛出 / 返回 results 中的值"""
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.evaluations = 0
+        self.load_waits = 0
+
+    async def evaluate(self, script, arg):
+        self.evaluations += 1
+        result = self.results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    async def wait_for_load_state(self, state, timeout=None):
+        self.load_waits += 1
+
+
+def test_returns_condition_value():
+    page = FakePage('done')
+    assert asyncio.run(waits.wait_for_condition(page, '() => 1')) == 'done'
+
+
+def test_continues_after_navigation():
+    page = FakePage(PlaywrightError('Execution context was destroyed, most likely because of a navigation'),
+                    'done')
+    assert asyncio.run(waits.wait_for_condition(page, '() => 1')) == 'done'
+    assert page.evaluations == 2
+    assert page.load_waits == 1
+
+
+def test_script_error_is_raised_without_retrying():
+    page = FakePage(PlaywrightError("SyntaxError: Unexpected token ')'"), 'done')
+    with pytest.raises(PlaywrightError):
+        asyncio.run(waits.wait_for_condition(page, '() => ('))
+    assert page.evaluations == 1
+
+
+def test_closed_page_is_raised():
+    page = FakePage(PlaywrightError('Target page, context or browser has been closed'))
+    with pytest.raises(PlaywrightError):
+        asyncio.run(waits.wait_for_condition(page, '() => 1'))
+
+
+def test_wait_for_upload_timeout():
+    page = FakePage(None)
+    with pytest.raises(waits.WaitTimeout):
+        asyncio.run(waits.wait_for_upload(page, '() => false', timeout=0.05))
@@ -7,24 +7,32 @@ import os
 import time
 import asyncio
 
-from conf import LOCAL_CHROME_PATH, LOCAL_CHROME_HEADLESS
+from conf import LOCAL_CHROME_HEADLESS
+from uploader.base_uploader import BaseUploader, OPEN, ATTACH, METADATA, WAIT_UPLOAD, PUBLISH, PERSIST_COOKIES
+from utils import date_picker
+from utils import progress
 from utils.base_social_media import set_init_script
+from utils.browser_pool import browser_context
 from utils.log import baijiahao_logger
-from utils.network import async_retry
+from utils.network import async_retry, NAVIGATION_RETRY
+from utils import waits
+
+# 封面区域的上传状态：上传失败 / 上传中 / 完成
+UPLOAD_STATE_JS = """(arg, dom) => {
+  if (dom.hasText('div .cover-overlay', '上传失败')) return 'failed';
+  return dom.hasText('div .cover-overlay', '上传中') ? null : 'done';
+}"""
 
 
 async def baijiahao_cookie_gen(account_file):
-    async with async_playwright() as playwright:
-        options = {
-            'args': [
-                '--lang en-GB'
-            ],
-            'headless': LOCAL_CHROME_HEADLESS,  # Set headless option here
-        }
-        # Make sure to run headed.
-        browser = await playwright.chromium.launch(**options)
-        # Setup context however you like.
-        context = await browser.new_context()  # Pass any options
+    options = {
+        'args': [
+            '--lang en-GB'
+        ],
+        'headless': LOCAL_CHROME_HEADLESS,  # Set headless option here
+    }
+    # Make sure to run headed.
+    async with browser_context(**options) as context:
         context = await set_init_script(context)
         # Pause the page, and start recording manually.
         page = await context.new_page()
@@ -36,9 +44,8 @@ async def baijiahao_cookie_gen(account_file):
 
 
 async def cookie_auth(account_file):
-    async with async_playwright() as playwright:
-        browser = await playwright.chromium.launch(headless=LOCAL_CHROME_HEADLESS)
-        context = await browser.new_context(storage_state=account_file)
+    # 从浏览器池分配上下文（没有常驻浏览器池时临时启动，用完关闭）
+    async with browser_context(headless=LOCAL_CHROME_HEADLESS, storage_state=account_file) as context:
         context = await set_init_script(context)
         # 创建一个新的页面
         page = await context.new_page()
@@ -62,54 +69,48 @@ async def baijiahao_setup(account_file, handle=False):
         await baijiahao_cookie_gen(account_file)
     return True
 
-class BaiJiaHaoVideo(object):
+class BaiJiaHaoVideo(BaseUploader):
+    platform = 'baijiahao'
+    upload_url = "https://baijiahao.baidu.com/builder/rc/edit?type=videoV2"
+    logger = baijiahao_logger
+    stealth = False
+    # 定时发布在 publish 阶段中完成（publish_video 整体重试）
+    STAGES = (OPEN, ATTACH, METADATA, WAIT_UPLOAD, PUBLISH, PERSIST_COOKIES)
+
     def __init__(self, title, file_path, tags, publish_date: datetime, account_file, proxy_setting=None):
-        self.title = title  # 视频标题
-        self.file_path = file_path
-        self.tags = tags
-        self.publish_date = publish_date
-        self.account_file = account_file
+        super().__init__(title, file_path, tags, publish_date, account_file)
         self.date_format = '%Y年%m月%d日 %H:%M'
-        self.local_executable_path = LOCAL_CHROME_PATH
-        self.headless = LOCAL_CHROME_HEADLESS
         self.proxy_setting = proxy_setting
 
+    def browser_options(self):
+        return {**super().browser_options(), "proxy": self.proxy_setting,
+                "user_agent": 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/127.0.4324.150 Safari/537.36'}
+
     async def set_schedule_time(self, page, publish_date):
         """
-        todo 时间选择，日后在处理 百家号的时间选择不准确，目前是随机
+        在页面内一次选择日期和小时：下拉列表是虚拟列表，找不到时滚动查找。
+        百家号的小时选项文字不固定，找不到目标小时时和原来一样随机选一个
         """
         publish_date_day = f"{publish_date.month}月{publish_date.day}日" if publish_date.day >9  else f"{publish_date.month}月0{publish_date.day}日"
         publish_date_hour = f"{publish_date.hour}点"
-        publish_date_min = f"{publish_date.minute}分"
         await page.wait_for_selector('div.select-wrap', timeout=5000)
-        for _ in range(3):
-            try:
-                await page.locator('div.select-wrap').nth(0).click()
-                await page.wait_for_selector('div.rc-virtual-list  div.cheetah-select-item', timeout=5000)
-                break
-            except:
-                await page.locator('div.select-wrap').nth(0).click()
-        # page.locator(f'div.rc-virtual-list-holder-inner >> text={publish_date_day}').click()
-        await page.wait_for_timeout(2000)
-        await page.locator(f'div.rc-virtual-list  div.cheetah-select-item >> text={publish_date_day}').click()
-        await page.wait_for_timeout(2000)
-
-        # 改为随机点击一个 hour
-        for _ in range(3):
-            try:
-                await page.locator('div.select-wrap').nth(1).click()
-                await page.wait_for_selector('div.rc-virtual-list div.rc-virtual-list-holder-inner:visible', timeout=5000)
-                break
-            except:
-                await page.locator('div.select-wrap').nth(1).click()
-        await page.wait_for_timeout(2000)
-        current_choice_hour = await page.locator('div.rc-virtual-list:visible div.cheetah-select-item-option').count()
-        await page.wait_for_timeout(2000)
-        await page.locator('div.rc-virtual-list:visible div.cheetah-select-item-option').nth(
-            random.randint(1, current_choice_hour-3)).click()
-        # 2024.08.05 current_choice_hour的获取可能有问题，页面有7，这里获取了10，暂时硬编码至6
+        try:
+            await date_picker.pick(page, [
+                date_picker.step('div.select-wrap', index=0),
+                date_picker.step('div.rc-virtual-list div.cheetah-select-item', contains=publish_date_day,
+                                 scroll='div.rc-virtual-list-holder'),
+                date_picker.step('div.select-wrap', index=1),
+                date_picker.step('div.rc-virtual-list div.cheetah-select-item-option', text=publish_date_hour,
+                                 scroll='div.rc-virtual-list-holder'),
+            ], name='百家号定时发布')
+        except date_picker.DatePickerError as e:
+            if e.step != 3:
+                raise
+            baijiahao_logger.warning(f"{e}，随机选择小时")
+            current_choice_hour = await page.locator('div.rc-virtual-list:visible div.cheetah-select-item-option').count()
+            await page.locator('div.rc-virtual-list:visible div.cheetah-select-item-option').nth(
+                random.randint(1, max(1, current_choice_hour-3))).click()
 
-        await page.wait_for_timeout(2000)
         await page.locator("button >> text=定时发布").click()
 
 
@@ -118,26 +119,24 @@ class BaiJiaHaoVideo(object):
         return
         print("视频出错了，重新上传中")
 
-    async def upload(self, playwright: Playwright) -> None:
-        # 使用 Chromium 浏览器启动一个浏览器实例
-        browser = await playwright.chromium.launch(headless=self.headless, executable_path=self.local_executable_path, proxy=self.proxy_setting)
-        # 创建一个浏览器上下文，使用指定的 cookie 文件
-        context = await browser.new_context(storage_state=f"{self.account_file}", user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/127.0.4324.150 Safari/537.36')
-        # context = await set_init_script(context)
-        await context.grant_permissions(['geolocation'])
+    async def prepare_page(self, page):
+        await self.context.grant_permissions(['geolocation'])
+        await super().prepare_page(page)
 
-        # 创建一个新的页面
-        page = await context.new_page()
+    async def open(self, page):
+        progress.emit(progress.OPEN_PAGE, url=self.upload_url)
         # 访问指定的 URL
-        await page.goto("https://baijiahao.baidu.com/builder/rc/edit?type=videoV2", timeout=60000)
+        await NAVIGATION_RETRY.run(page.goto, self.upload_url, timeout=60000)
         baijiahao_logger.info(f"正在上传-------{self.title}.mp4")
         # 等待页面跳转到指定的 URL，没进入，则自动等待到超时
         baijiahao_logger.info('正在打开主页...')
-        await page.wait_for_url("https://baijiahao.baidu.com/builder/rc/edit?type=videoV2", timeout=60000)
+        await page.wait_for_url(self.upload_url, timeout=60000)
 
+    async def attach(self, page):
         # 点击 "上传视频" 按钮
         await page.locator("div[class^='video-main-container'] input").set_input_files(self.file_path)
 
+    async def metadata(self, page):
         # 等待页面跳转到指定的 URL
         while True:
             # 判断是是否进入视频发布页面，没进入，则自动等待到超时
@@ -154,11 +153,13 @@ class BaiJiaHaoVideo(object):
         baijiahao_logger.info("正在填充标题和话题...")
         await self.add_title_tags(page)
 
+    async def wait_upload(self, page):
         upload_status = await self.uploading_video(page)
         if not upload_status:
             baijiahao_logger.error(f"发现上传出错了... 文件:{self.file_path}")
-            raise
+            raise Exception(f"百家号视频上传失败: {self.file_path}")
 
+    async def publish(self, page):
         # 判断视频封面图是否生成成功
         while True:
             baijiahao_logger.info("正在确认封面完成, 准备去点击定时/发布...")
@@ -169,7 +170,13 @@ class BaiJiaHaoVideo(object):
                 baijiahao_logger.info("等待封面生成...")
                 await asyncio.sleep(3)
 
+        # 点击定时 / 发布由 publish_video 自己重试，这里不再套用 PUBLISH_RETRY
+        await self.click_publish(page)
+
+    async def click_publish(self, page):
         await self.publish_video(page, self.publish_date)
+        if self.publish_date:
+            progress.emit(progress.SCHEDULE_SET, publishDate=self.publish_date.isoformat())
         await page.wait_for_timeout(2000)
         if await page.locator('div.passMod_dialog-container >> text=百度安全验证:visible').count():
             baijiahao_logger.error("出现验证，退出")
@@ -177,33 +184,15 @@ class BaiJiaHaoVideo(object):
         await page.wait_for_url("https://baijiahao.baidu.com/builder/rc/clue**", timeout=5000)
         baijiahao_logger.success("视频发布成功")
 
-        await context.storage_state(path=self.account_file)  # 保存cookie
-        baijiahao_logger.info('cookie更新完毕！')
-        await asyncio.sleep(2)  # 这里延迟是为了方便眼睛直观的观看
-        # 关闭浏览器上下文和浏览器实例
-        await context.close()
-        await browser.close()
-
-
-    @async_retry(timeout=300)  # 例如，最多重试3次，超时时间为180秒
     async def uploading_video(self, page):
-        while True:
-            upload_failed = await page.locator('div .cover-overlay:has-text("上传失败")').count()
-            if upload_failed:
-                baijiahao_logger.error("发现上传出错了...")
-                # await self.handle_upload_error(page)  # 假设这是处理上传错误的函数
-                return False
-
-            uploading = await page.locator('div .cover-overlay:has-text("上传中")').count()
-            if uploading:
-                baijiahao_logger.info("正在上传视频中...")
-                await asyncio.sleep(2)  # 等待2秒再次检查
-                continue
-
-            # 检查上传是否成功
-            if not uploading and not upload_failed:
-                baijiahao_logger.success("视频上传完毕")
-                return True
+        baijiahao_logger.info("正在上传视频中...")
+        state = await waits.wait_for_condition(page, UPLOAD_STATE_JS, timeout=waits.upload_timeout())
+        if state != 'done':
+            baijiahao_logger.error("发现上传出错了..." if state else "等待上传超时")
+            # await self.handle_upload_error(page)  # 假设这是处理上传错误的函数
+            return False
+        baijiahao_logger.success("视频上传完毕")
+        return True
 
     async def set_schedule_publish(self, page, publish_date):
         while True:
@@ -212,7 +201,6 @@ class BaiJiaHaoVideo(object):
             try:
                 await schedule_element.click()
                 await page.wait_for_selector('div.select-wrap:visible', timeout=3000)
-                await page.wait_for_timeout(timeout=2000)
                 baijiahao_logger.info("开始点击发布定时...")
                 await self.set_schedule_time(page, publish_date)
                 break
@@ -244,12 +232,6 @@ class BaiJiaHaoVideo(object):
             self.title += " 你不知道的"
         await title_container.fill(self.title[:30])
 
-    async def main(self):
-        async with async_playwright() as playwright:
-            await self.upload(playwright)
-
-
-
     # 使用 AI成片 功能
     async def ai2video(self, playwright: Playwright) -> None:
         # 使用 Chromium 浏览器启动一个浏览器实例
@@ -0,0 +1,184 @@
+import asyncio
+from abc import ABC, abstractmethod
+from contextlib import nullcontext
+from datetime import datetime
+
+from conf import LOCAL_CHROME_PATH, LOCAL_CHROME_HEADLESS
+from utils import metrics
+from utils import progress
+from utils.base_social_media import set_init_script
+from utils.browser_pool import browser_context
+from utils.log import logger
+from utils.network import NAVIGATION_RETRY, PUBLISH_RETRY
+
+# 上传阶段，方法名与阶段名相同
+OPEN = 'open'
+ATTACH = 'attach'
+METADATA = 'metadata'
+WAIT_UPLOAD = 'wait_upload'
+SCHEDULE = 'schedule'
+PUBLISH = 'publish'
+PERSIST_COOKIES = 'persist_cookies'
+
+
+class UploadCancelled(Exception):
+    """上传被 cancel() 取消，按普通失败处理"""
+
+
+class BaseUploader(ABC):
+    """
+    上传器基类，统一每个平台的生命周期：
+    - main() 从浏览器池分配带账号 cookie 的 context，注入 stealth 脚本（可选精简模式），结束后关闭；
+    - upload() 按 STAGES 依次执行各阶段（方法名即阶段名，参数为 page），每个阶段计入
+      sau_uploader_stage_seconds，完成后上报对应的进度事件，阶段之间检查是否已取消；
+    - 打开页面和点击发布统一使用 NAVIGATION_RETRY / PUBLISH_RETRY。
+    子类声明 platform / upload_url / logger，必须实现 attach、metadata、set_schedule_time、click_publish
+    （抽象方法，缺少时无法实例化），可以调整 STAGES 的顺序或加入自己的阶段。
+    """
+    platform = None
+    # 上传页地址，默认的 open 阶段打开并等待跳转到这个地址
+    upload_url = None
+    logger = logger
+    # 是否注入 stealth 脚本、是否使用精简模式（拦截图片、字体等，见 utils.base_social_media）
+    stealth = True
+    lean = True
+    STAGES = (OPEN, ATTACH, METADATA, WAIT_UPLOAD, SCHEDULE, PUBLISH, PERSIST_COOKIES)
+    # 阶段完成后上报的进度事件（阶段方法返回 False 时不上报）
+    STAGE_EVENTS = {
+        ATTACH: (progress.FILE_ATTACHED, {}),
+        METADATA: (progress.METADATA_FILLED, {}),
+        WAIT_UPLOAD: (progress.UPLOADED, {"percent": 100}),
+    }
+    # 同时计入的各平台通用指标
+    STAGE_METRICS = {
+        OPEN: metrics.PAGE_NAVIGATION,
+        WAIT_UPLOAD: metrics.UPLOAD_WAIT,
+        PUBLISH: metrics.PUBLISH_WAIT,
+    }
+
+    def __init__(self, title, file_path, tags, publish_date: datetime, account_file):
+        self.title = title  # 视频标题
+        self.file_path = file_path
+        self.tags = tags
+        self.publish_date = publish_date
+        self.account_file = account_file
+        self.local_executable_path = LOCAL_CHROME_PATH
+        self.headless = LOCAL_CHROME_HEADLESS
+        self.context = None
+        self.page = None
+        self.cancelled = False
+        self._loop = None
+        self._task = None
+
+    def browser_options(self):
+        """传给 browser_context 的浏览器类型、启动参数和 context 参数（storage_state 除外），子类可覆盖"""
+        return {"headless": self.headless, "executable_path": self.local_executable_path}
+
+    async def main(self):
+        self._loop, self._task = asyncio.get_running_loop(), asyncio.current_task()
+        self._check_cancelled()
+        try:
+            # 从浏览器池分配一个使用该账号 cookie 的独立上下文
+            async with browser_context(storage_state=f"{self.account_file}", **self.browser_options()) as context:
+                await self.upload(context)
+        except asyncio.CancelledError:
+            if self.cancelled:
+                # 取消请求来自 cancel()，按普通失败结束，不再向外传播取消
+                self._task.uncancel()
+                raise UploadCancelled(f"{self.platform} 上传已取消")
+            raise
+
+    def cancel(self):
+        """
+        取消上传（可在其他线程调用，发布队列的 cancel(job_id) 经此中断正在执行的子任务）：
+        正在执行的阶段被中断，浏览器上下文照常关闭，main() 抛出 UploadCancelled
+        """
+        self.cancelled = True
+        if self._task is not None and not self._task.done():
+            self._loop.call_soon_threadsafe(self._task.cancel)
+
+    def _check_cancelled(self):
+        if self.cancelled:
+            raise UploadCancelled(f"{self.platform} 上传已取消")
+
+    async def upload(self, context) -> None:
+        if self.stealth:
+            context = await set_init_script(context, self.platform, lean=self.lean)
+        self.context = context
+        self.page = await context.new_page()
+        await self.prepare_page(self.page)
+        try:
+            for stage in self.STAGES:
+                await self.run_stage(stage)
+        except BaseException as e:
+            await self.on_error(e)
+            raise
+        finally:
+            await self.on_finish()
+
+    async def run_stage(self, stage):
+        self._check_cancelled()
+        histogram = self.STAGE_METRICS.get(stage)
+        with metrics.timer(metrics.UPLOADER_STAGE, platform=self.platform, stage=stage), \
+                (metrics.timer(histogram, platform=self.platform) if histogram else nullcontext()):
+            result = await getattr(self, stage)(self.page)
+        event = self.STAGE_EVENTS.get(stage)
+        if event is not None and result is not False:
+            progress.emit(event[0], **event[1])
+        return result
+
+    async def prepare_page(self, page):
+        """页面创建后、打开上传页前调用，默认按浏览器实际发出的上传请求上报进度"""
+        await progress.track_upload_progress(page, self.file_path)
+
+    async def on_error(self, error):
+        """某个阶段失败或被取消时调用（context 仍可用），例如保存诊断信息"""
+
+    async def on_finish(self):
+        """上传结束（无论成功与否）时调用"""
+
+    async def open(self, page):
+        progress.emit(progress.OPEN_PAGE, url=self.upload_url)
+        await NAVIGATION_RETRY.run(page.goto, self.upload_url)
+        self.logger.info(f'[+]正在上传-------{self.title}.mp4')
+        # 等待页面跳转到指定的 URL，没进入，则自动等待到超时
+        await page.wait_for_url(self.upload_url)
+
+    @abstractmethod
+    async def attach(self, page):
+        """选择视频文件"""
+
+    @abstractmethod
+    async def metadata(self, page):
+        """填写标题、话题等信息"""
+
+    async def wait_upload(self, page):
+        """等待视频上传完成；平台没有单独的等待时返回 False（不上报 uploaded）"""
+        return False
+
+    async def schedule(self, page):
+        """设置定时发布，publish_date 为 0 时跳过"""
+        if not self.publish_date:
+            return False
+        await self.set_schedule_time(page, self.publish_date)
+        progress.emit(progress.SCHEDULE_SET, publishDate=self.publish_date.isoformat())
+
+    @abstractmethod
+    async def set_schedule_time(self, page, publish_date):
+        """在页面上选择定时发布时间"""
+
+    async def publish(self, page):
+        # 点击发布并确认成功，失败时按 PUBLISH_RETRY 退避重试
+        await PUBLISH_RETRY.run(self.click_publish, page)
+
+    @abstractmethod
+    async def click_publish(self, page):
+        """点击一次发布并确认发布成功，未成功时抛出异常"""
+
+    async def persist_cookies(self, page):
+        try:
+            await self.context.storage_state(path=f"{self.account_file}")  # 保存cookie
+            self.logger.success('  [-]cookie更新完毕！')
+        except Exception as e:
+            # 视频已经发布，cookie 保存失败（例如窗口被手动关闭）不影响发布结果
+            self.logger.warning(f"  [!] 视频已发布，但 cookie 更新失败: {e}")
@@ -1,67 +1,159 @@
 # -*- coding: utf-8 -*-
 from datetime import datetime
 
-from playwright.async_api import Playwright, async_playwright, Page
+from playwright.async_api import Page
 import os
 import asyncio
 import re
 
-from conf import LOCAL_CHROME_PATH, LOCAL_CHROME_HEADLESS
+from conf import LOCAL_CHROME_HEADLESS
+from uploader.base_uploader import BaseUploader, OPEN, ATTACH, METADATA, WAIT_UPLOAD, SCHEDULE, PUBLISH, PERSIST_COOKIES
+from utils import diagnostics
+from utils import editor
+from utils import date_picker
+from utils import progress
 from utils.base_social_media import set_init_script
+from utils.browser_pool import browser_context
+from utils.cookie_probe import probe_cookie
 from utils.log import douyin_logger
-
-
-async def _is_login_page(page: Page) -> bool:
-    async def _any_visible(locator) -> bool:
+from utils.network import NAVIGATION_RETRY, PUBLISH_PAGE_RETRY
+from utils import waits
+
+
+# 浏览器被拦截 / 登录页的提示文字
+BROWSER_BLOCKED_RE = r"(浏览器.*版本过低|浏览器不支持|请使用.*Chrome|请使用.*Edge|请升级浏览器|当前浏览器.*不支持)"
+LOGIN_TEXT_RE = r"(扫码.*登录|手机.*登录|验证码登录|登录抖音|抖音登录|立即登录)"
+# 登录页检测：在页面内一次检查登录文字、手机号 / 验证码输入框、二维码和地址（只看可见元素，穿透 shadow root，
+# 忽略我们自己注入的二维码浮层），参数为登录文字的正则
+LOGIN_PROBE_JS = """(pattern) => {
+  const OVERLAY_ID = '__vva_qr_overlay';
+  const roots = [document];
+  const walk = root => root.querySelectorAll('*').forEach(el => {
+    if (el.shadowRoot) { roots.push(el.shadowRoot); walk(el.shadowRoot); }
+  });
+  walk(document);
+  const visible = el => {
+    if (!el || (el.closest && el.closest('#' + OVERLAY_ID))) return false;
+    const rect = el.getBoundingClientRect();
+    if (!rect.width || !rect.height) return false;
+    const style = getComputedStyle(el);
+    return style.visibility !== 'hidden' && style.display !== 'none';
+  };
+  const anyVisible = selector => roots.some(root => Array.from(root.querySelectorAll(selector)).some(visible));
+  const hasVisibleText = re => roots.some(root => {
+    const walker = document.createTreeWalker(root, NodeFilter.SHOW_TEXT);
+    for (let node = walker.nextNode(); node; node = walker.nextNode()) {
+      if (re.test(node.nodeValue) && visible(node.parentElement)) return true;
+    }
+    return false;
+  });
+  const signals = [];
+  if (hasVisibleText(new RegExp(pattern))) signals.push('text');
+  if (anyVisible("input[placeholder*='手机号'], input[placeholder*='验证码'], input[name*='mobile'], input[name*='code']")) {
+    signals.push('input');
+  }
+  if (anyVisible("img[src*='qrcode'], canvas") && hasVisibleText(/(扫码|登录|验证)/)) signals.push('qrcode');
+  const url = location.href;
+  if (url.includes('login') || url.includes('passport')) signals.push('url');
+  return {login: signals.length > 0, signals, url};
+}"""
+# 上传控件的候选 selector：抖音页面结构经常变化，按顺序逐个尝试
+FILE_INPUT_SELECTORS = [
+    "input[type='file']",
+    "input[type='file'][accept*='video']",
+    "div.progress-div input[type='file']",
+    "div.progress-div [class^='upload-btn-input']",
+    "[class^='upload-btn-input']",
+]
+# 上传页状态：一次 evaluate 依次判断登录页、浏览器被拦截、上传控件（主页面和同源 iframe 中按 arg.selectors 查找），
+# 都没有时 iframe 数或地址与 arg.baseline 不同则返回新状态（crossOrigin 为脚本访问不到的跨域 iframe 数），否则继续等待
+UPLOAD_UI_STATE_JS = """(arg, dom) => {
+  if ((%s)(arg.login).login) return {kind: 'login'};
+  const text = document.body ? document.body.innerText : '';
+  if (new RegExp(arg.blocked).test(text)) return {kind: 'blocked'};
+  const selector = arg.selectors.find(sel => dom.q(sel));
+  if (selector) return {kind: 'input', selector};
+  const frames = Array.from(document.querySelectorAll('iframe'));
+  let crossOrigin = 0;
+  for (const frame of frames) {
+    let doc = null;
+    try { doc = frame.contentDocument; } catch (e) {}
+    if (!doc) { crossOrigin += 1; continue; }
+    const found = arg.selectors.find(sel => doc.querySelector(sel));
+    if (found) return {kind: 'input', selector: found, frameUrl: doc.location.href};
+  }
+  const state = [frames.length, crossOrigin, location.href].join('|');
+  return state !== arg.baseline ? {kind: 'state', state, crossOrigin} : null;
+}""" % LOGIN_PROBE_JS
+# 出现"重新上传"代表视频上传完毕
+UPLOAD_DONE_JS = """(arg, dom) => dom.hasText('[class^="long-card"] div', '重新上传')"""
+UPLOAD_ERROR_JS = """(arg, dom) => dom.hasText('div.progress-div > div', '上传失败')"""
+# 诊断快照附带的页面信息：视口、滚动位置和二维码浮层状态
+DEBUG_INFO_JS = """() => {
+  const el = document.scrollingElement || document.documentElement;
+  const overlay = document.getElementById('__vva_qr_overlay');
+  const state = document.getElementById('__vva_qr_state');
+  const r = overlay ? overlay.getBoundingClientRect() : null;
+  return {
+    innerWidth: window.innerWidth,
+    innerHeight: window.innerHeight,
+    dpr: window.devicePixelRatio,
+    scrollLeft: el ? el.scrollLeft : null,
+    scrollWidth: el ? el.scrollWidth : null,
+    scrollTop: el ? el.scrollTop : null,
+    scrollHeight: el ? el.scrollHeight : null,
+    overlayPresent: !!overlay,
+    overlayRect: r ? { left: r.left, top: r.top, width: r.width, height: r.height } : null,
+    overlayState: state ? (state.textContent || '') : null,
+  };
+}"""
+
+
+async def detect_login(page: Page) -> dict:
+    """
+    一次 evaluate 检查所有登录页特征，返回 {"login": 是否登录页, "signals": 命中的特征, "url": 当前地址}。
+    页面脚本不可用（跳转中等）时只按地址判断。
+    """
+    try:
+        return await page.evaluate(LOGIN_PROBE_JS, LOGIN_TEXT_RE)
+    except Exception:
         try:
-            if await locator.count() == 0:
-                return False
-            return await locator.first.is_visible()
+            url = page.url or ""
         except Exception:
-            return False
+            url = ""
+        login = "login" in url or "passport" in url
+        return {"login": login, "signals": ["url"] if login else [], "url": url}
 
+
+async def _is_login_page(page: Page) -> bool:
+    return (await detect_login(page))["login"]
+
+
+async def wait_for_login_state(page: Page, login: bool, timeout: float, url_change: bool = False):
+    """
+    等到登录页特征与 login 一致（url_change 为 True 时地址变化也返回），返回 detect_login 格式的结果；
+    由 DOM 变化触发检查，超时返回 None
+    """
+    predicate = """(arg) => {
+      const verdict = (%s)(arg.pattern);
+      return verdict.login === arg.login || (arg.url && verdict.url !== arg.url) ? verdict : null;
+    }""" % LOGIN_PROBE_JS
     try:
-        if await _any_visible(page.get_by_text('手机号登录')) or await _any_visible(page.get_by_text('扫码登录')):
-            return True
-    except Exception:
-        pass
-    try:
-        # Some login variants do not show explicit "手机号登录/扫码登录" text, but do show phone/code inputs.
-        if await _any_visible(page.get_by_placeholder('请输入手机号')) or await _any_visible(page.get_by_placeholder('请输入验证码')):
-            return True
-    except Exception:
-        pass
-    try:
-        if await _any_visible(page.get_by_text(re.compile(r"(扫码.*登录|手机.*登录|验证码登录|登录抖音|抖音登录|立即登录)"))):
-            return True
-    except Exception:
-        pass
-    try:
-        if await _any_visible(page.locator("input[name*='mobile'], input[placeholder*='手机号'], input[placeholder*='验证码'], input[name*='code']")):
-            return True
-    except Exception:
-        pass
-    try:
-        # QR-code login often renders a canvas/image.
-        if await _any_visible(page.locator("img[src*='qrcode'], canvas")):
-            if await _any_visible(page.get_by_text(re.compile(r"(扫码|登录|验证)"))):
-                return True
-    except Exception:
-        pass
-    try:
-        url = page.url or ""
-        if "login" in url or "passport" in url:
-            return True
+        url = page.url if url_change else None
     except Exception:
-        pass
-    return False
+        url = None
+    return await waits.wait_for_condition(
+        page, predicate, {"login": login, "pattern": LOGIN_TEXT_RE, "url": url}, timeout=timeout)
 
 
 async def cookie_auth(account_file):
-    async with async_playwright() as playwright:
-        browser = await playwright.chromium.launch(headless=LOCAL_CHROME_HEADLESS)
-        context = await browser.new_context(storage_state=account_file)
-        context = await set_init_script(context)
+    # 先用接口快速探测，无法判断时再打开浏览器校验
+    verdict = await probe_cookie('douyin', account_file)
+    if verdict is not None:
+        return verdict
+    # 从浏览器池分配上下文（没有常驻浏览器池时临时启动，用完关闭）
+    async with browser_context(headless=LOCAL_CHROME_HEADLESS, storage_state=account_file) as context:
+        context = await set_init_script(context, 'douyin', lean=True)
         # 创建一个新的页面
         page = await context.new_page()
         # 访问指定的 URL
@@ -70,8 +162,6 @@ async def cookie_auth(account_file):
             await page.wait_for_url("https://creator.douyin.com/creator-micro/content/upload", timeout=5000)
         except:
             print("[+] 等待5秒 cookie 失效")
-            await context.close()
-            await browser.close()
             return False
         # 2024.06.17 抖音创作者中心改版：用更稳健的可见性判断
         if await _is_login_page(page):
@@ -93,14 +183,11 @@ async def douyin_setup(account_file, handle=False):
 
 
 async def douyin_cookie_gen(account_file):
-    async with async_playwright() as playwright:
-        options = {
-            'headless': LOCAL_CHROME_HEADLESS
-        }
-        # Make sure to run headed.
-        browser = await playwright.chromium.launch(**options)
-        # Setup context however you like.
-        context = await browser.new_context()  # Pass any options
+    options = {
+        'headless': LOCAL_CHROME_HEADLESS
+    }
+    # Make sure to run headed.
+    async with browser_context(**options) as context:
         context = await set_init_script(context)
         # Pause the page, and start recording manually.
         page = await context.new_page()
@@ -110,272 +197,152 @@ async def douyin_cookie_gen(account_file):
         await context.storage_state(path=account_file)
 
 
-class DouYinVideo(object):
+class DouYinVideo(BaseUploader):
+    platform = 'douyin'
+    upload_url = "https://creator.douyin.com/creator-micro/content/upload"
+    logger = douyin_logger
+    # settings：商品链接、封面、位置、第三方平台同步
+    STAGES = (OPEN, ATTACH, METADATA, WAIT_UPLOAD, 'settings', SCHEDULE, PUBLISH, PERSIST_COOKIES)
+    WINDOW_W, WINDOW_H = 1500, 900
+
     def __init__(self, title, file_path, tags, publish_date: datetime, account_file, thumbnail_path=None, productLink='', productTitle=''):
-        self.title = title  # 视频标题
-        self.file_path = file_path
-        self.tags = tags
-        self.publish_date = publish_date
-        self.account_file = account_file
+        super().__init__(title, file_path, tags, publish_date, account_file)
         self.date_format = '%Y年%m月%d日 %H:%M'
-        self.local_executable_path = LOCAL_CHROME_PATH
-        self.headless = LOCAL_CHROME_HEADLESS
         self.thumbnail_path = thumbnail_path
         self.productLink = productLink
         self.productTitle = productTitle
+        # 诊断快照：正常流程抽样记录在内存中，出错时才写入 media/diagnostics
+        self.diagnostics = diagnostics.Recorder('douyin', DEBUG_INFO_JS, extra={"headless": self.headless})
 
-    async def set_schedule_time_douyin(self, page, publish_date):
+    async def set_schedule_time(self, page, publish_date):
         # 选择包含特定文本内容的 label 元素
         label_element = page.locator("[class^='radio']:has-text('定时发布')")
         # 在选中的 label 元素下点击 checkbox
         await label_element.click()
-        await asyncio.sleep(1)
         publish_date_hour = publish_date.strftime("%Y-%m-%d %H:%M")
 
-        await asyncio.sleep(1)
-        await page.locator('.semi-input[placeholder="日期和时间"]').click()
-        await page.keyboard.press("Control+KeyA")
-        await page.keyboard.type(str(publish_date_hour))
-        await page.keyboard.press("Enter")
-
-        await asyncio.sleep(1)
+        # 日期输入框在选中定时发布后出现，click 会等到它可见，不再固定等待
+        value = await date_picker.type_into(page, page.locator('.semi-input[placeholder="日期和时间"]'),
+                                            publish_date_hour)
+        if value != publish_date_hour:
+            douyin_logger.warning(f"[-] 定时发布时间为 {value}，期望 {publish_date_hour}")
 
     async def handle_upload_error(self, page):
         douyin_logger.info('视频出错了，重新上传中')
         await page.locator('div.progress-div [class^="upload-btn-input"]').set_input_files(self.file_path)
 
-    async def upload(self, playwright: Playwright) -> None:
-        # 使用 Chromium 浏览器启动一个浏览器实例
+    def browser_options(self):
         # 核心诉求：登录弹窗要稳定、二维码不要被横向滚动条/缩放遮挡。
         # 与其依赖“最大化 + zoom 调整”，不如直接给 Playwright 一个固定 viewport：
         # - 强制窗口为 1500x900 + device scale factor 1，可覆盖 1080p/2K 屏。
         # - 不再调用 CDP setWindowBounds / 手动 zoom，减少页面闪烁。
-        WINDOW_W, WINDOW_H = 1500, 900
         launch_args = ["--window-position=0,0"]
         if not self.headless:
             launch_args += [
                 "--force-device-scale-factor=1",
                 "--high-dpi-support=1",
-                f"--window-size={WINDOW_W},{WINDOW_H}",
+                f"--window-size={self.WINDOW_W},{self.WINDOW_H}",
             ]
-        if self.local_executable_path:
-            browser = await playwright.chromium.launch(
-                headless=self.headless,
-                executable_path=self.local_executable_path,
-                args=launch_args,
-            )
-        else:
-            browser = await playwright.chromium.launch(headless=self.headless, args=launch_args)
-        # 创建一个浏览器上下文，使用指定的 cookie 文件
-        context_kwargs = {
-            "storage_state": f"{self.account_file}",
-            "viewport": {"width": WINDOW_W, "height": WINDOW_H},
-            "screen": {"width": WINDOW_W, "height": WINDOW_H},
-        }
-        context = await browser.new_context(**context_kwargs)
-        context = await set_init_script(context)
+        return {**super().browser_options(), "args": launch_args,
+                "viewport": {"width": self.WINDOW_W, "height": self.WINDOW_H},
+                "screen": {"width": self.WINDOW_W, "height": self.WINDOW_H}}
 
-        # 创建一个新的页面
-        page = await context.new_page()
-        douyin_logger.info(f"[+] 浏览器窗口/viewport 已锁定为 {WINDOW_W}x{WINDOW_H}, headless={self.headless}")
+    async def prepare_page(self, page):
+        self.diagnostics.attach(page)
+        douyin_logger.info(f"[+] 浏览器窗口/viewport 已锁定为 {self.WINDOW_W}x{self.WINDOW_H}, headless={self.headless}")
+        # 按浏览器实际发出的上传请求上报进度（需在打开页面前注入）
+        await super().prepare_page(page)
 
+    async def open(self, page):
         # 访问指定的 URL
-        upload_url = "https://creator.douyin.com/creator-micro/content/upload"
-        await page.goto(upload_url, wait_until="domcontentloaded")
+        progress.emit(progress.OPEN_PAGE, url=self.upload_url)
+        await NAVIGATION_RETRY.run(page.goto, self.upload_url, wait_until="domcontentloaded")
         douyin_logger.info(f'[+]正在上传-------{self.title}.mp4')
         # 等待页面跳转到指定的 URL，没进入，则自动等待到超时
         douyin_logger.info(f'[-] 正在打开主页...')
         try:
-            await page.wait_for_url(upload_url, timeout=15000)
+            await page.wait_for_url(self.upload_url, timeout=15000)
         except Exception:
             pass
         await page.wait_for_load_state("domcontentloaded")
 
-        async def _dump_debug(prefix: str, *, full_page: bool = False, capture_right: bool = False):
-            try:
-                os.makedirs("media", exist_ok=True)
-                ts = int(datetime.now().timestamp())
-                shot = os.path.join("media", f"{prefix}_{ts}.png")
-                shot_right = os.path.join("media", f"{prefix}_{ts}_right.png")
-                shot_viewport = os.path.join("media", f"{prefix}_{ts}_viewport.png")
-                shot_right_viewport = os.path.join("media", f"{prefix}_{ts}_right_viewport.png")
-                html = os.path.join("media", f"{prefix}_{ts}.html")
-                meta = os.path.join("media", f"{prefix}_{ts}.txt")
-                scroll_state = None
-
-                # Save current scroll state so diagnostics won't disturb what user sees.
-                try:
-                    scroll_state = await page.evaluate(
-                        """
-                        () => {
-                          const candidates = [document.scrollingElement, document.documentElement, document.body].filter(Boolean);
-                          return candidates.map(el => ({
-                            left: el.scrollLeft || 0,
-                            top: el.scrollTop || 0,
-                          }));
-                        }
-                        """
-                    )
-                except Exception:
-                    scroll_state = None
+    async def attach(self, page):
+        async def _dump_debug(prefix: str):
+            # 出错时保存当前页面和最近的快照，正常流程不写文件
+            folder = await self.diagnostics.failure(prefix, page)
+            if folder:
+                douyin_logger.error(f"[debug] 已保存诊断文件: {folder}")
 
+        # 上传视频：抖音页面结构经常变化，这里做多套 selector + frame 兜底
+        async def find_file_input(p: Page):
+            """在页面或 frame 中按 FILE_INPUT_SELECTORS 查找上传控件，找不到返回 None"""
+            for sel in FILE_INPUT_SELECTORS:
+                loc = p.locator(sel)
                 try:
-                    # Give the page a moment to render; douyin login is a heavy SPA.
-                    try:
-                        await page.wait_for_load_state("networkidle", timeout=5000)
-                    except Exception:
-                        pass
-                    await page.wait_for_timeout(600)
-                    if full_page:
-                        await page.screenshot(path=shot, full_page=True)
-                    else:
-                        shot = ""
-                    await page.screenshot(path=shot_viewport, full_page=False)
+                    if await loc.count():
+                        return loc.first
                 except Exception:
-                    shot = ""
-                    shot_viewport = ""
+                    continue
+            return None
 
-                # Also capture the far-right view (OPTIONAL): this is useful for offline diagnosis,
-                # but it will visibly scroll the page and may cause "flashing" during manual login.
-                if capture_right:
-                    try:
-                        await page.evaluate(
-                            """
-                            () => {
-                              const candidates = [document.scrollingElement, document.documentElement, document.body].filter(Boolean);
-                              for (const el of candidates) {
-                                try { el.scrollLeft = el.scrollWidth; } catch (e) {}
-                                try { el.scrollTo({ left: el.scrollWidth, behavior: 'instant' }); } catch (e) {}
-                              }
-                            }
-                            """
-                        )
-                        await page.wait_for_timeout(350)
-                        if full_page:
-                            await page.screenshot(path=shot_right, full_page=True)
-                        else:
-                            shot_right = ""
-                        await page.screenshot(path=shot_right_viewport, full_page=False)
-                    except Exception:
-                        shot_right = ""
-                        shot_right_viewport = ""
-                    finally:
-                        try:
-                            if isinstance(scroll_state, list) and scroll_state:
-                                await page.evaluate(
-                                    """
-                                    (state) => {
-                                      const candidates = [document.scrollingElement, document.documentElement, document.body].filter(Boolean);
-                                      for (let i = 0; i < candidates.length && i < state.length; i++) {
-                                        const el = candidates[i];
-                                        const s = state[i] || {};
-                                        const left = Number(s.left || 0);
-                                        const top = Number(s.top || 0);
-                                        try { el.scrollTo({ left, top, behavior: 'instant' }); } catch (e) {
-                                          try { el.scrollLeft = left; } catch (e2) {}
-                                          try { el.scrollTop = top; } catch (e2) {}
-                                        }
-                                      }
-                                    }
-                                    """,
-                                    scroll_state,
-                                )
-                                await page.wait_for_timeout(120)
-                        except Exception:
-                            pass
-                else:
-                    shot_right = ""
-                    shot_right_viewport = ""
-                try:
-                    content = await page.content()
-                    with open(html, "w", encoding="utf-8") as f:
-                        f.write(content)
-                except Exception:
-                    html = ""
-                try:
-                    title = await page.title()
-                except Exception:
-                    title = ""
-                try:
-                    url = page.url or ""
-                except Exception:
-                    url = ""
+        async def find_in_frames():
+            for frame in page.frames:
+                if frame == page.main_frame:
+                    continue
                 try:
-                    info = await page.evaluate(
-                        """
-                        () => {
-                          const el = document.scrollingElement || document.documentElement;
-                          const overlay = document.getElementById('__vva_qr_overlay');
-                          const state = document.getElementById('__vva_qr_state');
-                          const r = overlay ? overlay.getBoundingClientRect() : null;
-                          return {
-                            innerWidth: window.innerWidth,
-                            innerHeight: window.innerHeight,
-                            dpr: window.devicePixelRatio,
-                            scrollLeft: el ? el.scrollLeft : null,
-                            scrollWidth: el ? el.scrollWidth : null,
-                            scrollTop: el ? el.scrollTop : null,
-                            scrollHeight: el ? el.scrollHeight : null,
-                            overlayPresent: !!overlay,
-                            overlayRect: r ? { left: r.left, top: r.top, width: r.width, height: r.height } : null,
-                            overlayState: state ? (state.textContent || '') : null,
-                          };
-                        }
-                        """
-                    )
+                    file_input = await find_file_input(frame)
                 except Exception:
-                    info = {}
-                with open(meta, "w", encoding="utf-8") as f:
-                    f.write(f"url={url}\n")
-                    f.write(f"title={title}\n")
-                    f.write(f"headless={self.headless}\n")
-                    if isinstance(info, dict):
-                        for k, v in info.items():
-                            f.write(f"{k}={v}\n")
-                douyin_logger.error(
-                    f"[debug] 已保存诊断文件: {meta} {shot} {shot_viewport} {shot_right} {shot_right_viewport} {html}"
-                )
-            except Exception:
-                pass
-
-        async def _page_has_text(pattern: "str | re.Pattern") -> bool:
-            try:
-                return bool(await page.get_by_text(pattern).count())
-            except Exception:
-                return False
+                    continue
+                if file_input:
+                    return file_input
+            return None
 
         async def _wait_for_upload_ui(total_timeout_sec: int = 90):
             """
             Douyin upload page is a heavy SPA. After login it may show a long loading screen / browser-check overlay.
             Don't fail fast; wait until upload input appears.
+            登录页、拦截提示和上传控件由 UPLOAD_UI_STATE_JS 在一次 evaluate 中判断，由 DOM 变化唤醒
             """
             started = asyncio.get_event_loop().time()
             last_reload_at = started
+            # 页面状态没有变化时不重复检查
+            state = None
             while (asyncio.get_event_loop().time() - started) < total_timeout_sec:
+                now = asyncio.get_event_loop().time()
+                wait = min(total_timeout_sec - (now - started), 30 - (now - last_reload_at))
+                found = await waits.wait_for_condition(
+                    page, UPLOAD_UI_STATE_JS,
+                    {"baseline": state, "blocked": BROWSER_BLOCKED_RE, "login": LOGIN_TEXT_RE,
+                     "selectors": FILE_INPUT_SELECTORS},
+                    timeout=max(0.5, wait)) or {}
+
                 # If we got redirected to login again, stop waiting here.
-                if await _is_login_page(page):
-                    return
+                if found.get("kind") == "login":
+                    return None
 
                 # Some obvious "blocked/unsupported browser" hints.
-                if await _page_has_text(re.compile(r"(浏览器.*版本过低|浏览器不支持|请使用.*Chrome|请使用.*Edge|请升级浏览器|当前浏览器.*不支持)")):
+                if found.get("kind") == "blocked":
                     await _dump_debug("douyin_browser_blocked")
                     raise RuntimeError("抖音创作者中心提示浏览器不支持/被拦截：请用 Chrome/Edge 正常打开创作者中心确认可进入上传页后再重试。")
 
-                # Try to locate upload input.
-                file_input = await find_file_input(page)
-                if file_input:
-                    return file_input
-
-                # Sometimes the upload input is inside iframes.
-                for frame in page.frames:
-                    try:
-                        if frame == page.main_frame:
-                            continue
-                        loc = frame.locator("input[type='file']")
-                        if await loc.count():
-                            return loc.first
-                    except Exception:
-                        continue
+                if found.get("kind") == "input":
+                    frame = page
+                    if found.get("frameUrl"):
+                        frame = next((f for f in page.frames if f.url == found["frameUrl"]), None)
+                    if frame is not None:
+                        return frame.locator(found["selector"]).first
+                    file_input = await find_in_frames()
+                    if file_input:
+                        return file_input
+                    await asyncio.sleep(1)
+
+                # Sometimes the upload input is inside cross-origin iframes, which the page script can't reach.
+                if found.get("kind") == "state":
+                    state = found["state"]
+                    if found.get("crossOrigin"):
+                        file_input = await find_in_frames()
+                        if file_input:
+                            return file_input
 
                 # If page is stuck in "loading", give it time; occasionally reload once.
                 now = asyncio.get_event_loop().time()
@@ -386,11 +353,8 @@ class DouYinVideo(object):
                     except Exception:
                         pass
 
-                await asyncio.sleep(1)
-
             await _dump_debug("douyin_upload_timeout")
             raise RuntimeError("抖音上传页加载超时：一直未出现上传控件（可能被风控/脚本未加载）。已保存诊断文件到 media 目录。")
-
         async def _wait_for_manual_login(timeout_sec: int = 120) -> bool:
             if self.headless:
                 return False
@@ -608,44 +572,36 @@ class DouYinVideo(object):
                 douyin_logger.warning(f"[!] 尝试滚动到二维码失败: {e}")
 
             # 已经有固定 viewport + 二维码浮层，不再做任何“横向滚动”尝试，
-            # 只在后台保存诊断截图，方便排查是否真的没有二维码。
-            try:
-                await _dump_debug("douyin_login_view")
-            except Exception:
-                pass
+            # 只在后台记录诊断快照（抽样），方便排查是否真的没有二维码。
+            self.diagnostics.checkpoint("douyin_login_view", page)
 
             started = asyncio.get_event_loop().time()
             # 不要在等待期间频繁滚动/点 tab（会造成“闪跳”），只在页面 URL 发生变化时做一次轻量校正。
-            last_url = ""
             adjusted_for_url = 0.0
-            while (asyncio.get_event_loop().time() - started) < timeout_sec:
-                try:
-                    if page.is_closed():
-                        raise RuntimeError("page closed")
-                except Exception:
-                    raise
-                try:
-                    if not await _is_login_page(page):
-                        return True
-                except Exception:
-                    pass
-                try:
-                    current_url = page.url or ""
-                except Exception:
-                    current_url = ""
-                if current_url and current_url != last_url:
-                    last_url = current_url
-                    now = asyncio.get_event_loop().time()
-                    if now - adjusted_for_url >= 2:
-                        adjusted_for_url = now
-                        try:
-                            # URL 变化时，补一次浮层刷新（有时登录页会热更新/切换）
-                            await _install_qr_overlay()
-                            await _dump_debug("douyin_login_view")
-                        except Exception:
-                            pass
-                await asyncio.sleep(1)
-            return False
+            while True:
+                remaining = timeout_sec - (asyncio.get_event_loop().time() - started)
+                if remaining <= 0:
+                    return False
+                if page.is_closed():
+                    raise RuntimeError("page closed")
+                # 登录特征消失或地址变化时由 DOM 变化唤醒
+                verdict = await wait_for_login_state(page, False, remaining, url_change=True)
+                if verdict is None:
+                    return False
+                if not verdict["login"]:
+                    return True
+                now = asyncio.get_event_loop().time()
+                if now - adjusted_for_url >= 2:
+                    adjusted_for_url = now
+                    try:
+                        # URL 变化时，补一次浮层刷新（有时登录页会热更新/切换）
+                        await _install_qr_overlay()
+                        self.diagnostics.checkpoint("douyin_login_view", page)
+                    except Exception:
+                        pass
+                else:
+                    # 地址连续变化时避免频繁刷新浮层
+                    await asyncio.sleep(2 - (now - adjusted_for_url))
 
         # 若 cookie 失效会停留在登录页（URL 可能仍是 upload）。这里不要秒退：给用户扫码时间
         if await _is_login_page(page):
@@ -671,16 +627,16 @@ class DouYinVideo(object):
                     except Exception:
                         pass
                     # 登录后强制回到上传页，避免停留在中间页
-                    await page.goto(upload_url, wait_until="domcontentloaded")
+                    await page.goto(self.upload_url, wait_until="domcontentloaded")
                     try:
-                        await page.wait_for_url(upload_url, timeout=15000)
+                        await page.wait_for_url(self.upload_url, timeout=15000)
                     except Exception:
                         pass
                     try:
                         await page.wait_for_load_state("networkidle", timeout=30000)
                     except Exception:
                         pass
-                    await context.storage_state(path=f"{self.account_file}")
+                    await self.context.storage_state(path=f"{self.account_file}")
                     douyin_logger.info("[+] 登录成功，已更新 storage_state（Cookie）文件")
                 except Exception:
                     pass
@@ -691,24 +647,6 @@ class DouYinVideo(object):
                     pass
                 raise RuntimeError("抖音 Cookie 可能已失效/未登录：请在应用内重新保存该账号 Cookie 后再发布（或确保当前弹出的登录页完成扫码登录）。")
 
-        # 上传视频：抖音页面结构经常变化，这里做多套 selector + frame 兜底
-        async def find_file_input(p: Page):
-            selectors = [
-                "input[type='file']",
-                "input[type='file'][accept*='video']",
-                "div.progress-div input[type='file']",
-                "div.progress-div [class^='upload-btn-input']",
-                "[class^='upload-btn-input']",
-            ]
-            for sel in selectors:
-                loc = p.locator(sel)
-                try:
-                    if await loc.count():
-                        return loc.first
-                except Exception:
-                    continue
-            return None
-
         file_input = await _wait_for_upload_ui(total_timeout_sec=90)
 
         if not file_input:
@@ -717,12 +655,12 @@ class DouYinVideo(object):
                 ok = await _wait_for_manual_login()
                 if ok:
                     try:
-                        await page.goto(upload_url, wait_until="domcontentloaded")
+                        await page.goto(self.upload_url, wait_until="domcontentloaded")
                         try:
-                            await page.wait_for_url(upload_url, timeout=15000)
+                            await page.wait_for_url(self.upload_url, timeout=15000)
                         except Exception:
                             pass
-                        await context.storage_state(path=f"{self.account_file}")
+                        await self.context.storage_state(path=f"{self.account_file}")
                         douyin_logger.info("[+] 登录成功，已更新 storage_state（Cookie）文件")
                     except Exception:
                         pass
@@ -765,7 +703,7 @@ class DouYinVideo(object):
             if not ok:
                 # Last attempt: hard-refresh and try again once (SPA may be stuck).
                 try:
-                    await page.goto(upload_url, wait_until="domcontentloaded")
+                    await page.goto(self.upload_url, wait_until="domcontentloaded")
                 except Exception:
                     pass
                 ok = await upload_via_filechooser()
@@ -780,27 +718,24 @@ class DouYinVideo(object):
                 if not ok:
                     await _dump_debug("douyin_set_input_files_failed")
                     raise
+        self.diagnostics.checkpoint(progress.FILE_ATTACHED)
 
+    async def metadata(self, page):
         # 等待页面跳转到指定的 URL 2025.01.08修改在原有基础上兼容两种页面
-        while True:
+        async def wait_publish_page():
             try:
                 # 尝试等待第一个 URL
                 await page.wait_for_url(
                     "https://creator.douyin.com/creator-micro/content/publish?enter_from=publish_page", timeout=3000)
                 douyin_logger.info("[+] 成功进入version_1发布页面!")
-                break  # 成功进入页面后跳出循环
             except Exception:
-                try:
-                    # 如果第一个 URL 超时，再尝试等待第二个 URL
-                    await page.wait_for_url(
-                        "https://creator.douyin.com/creator-micro/content/post/video?enter_from=publish_page",
-                        timeout=3000)
-                    douyin_logger.info("[+] 成功进入version_2发布页面!")
-
-                    break  # 成功进入页面后跳出循环
-                except:
-                    print("  [-] 超时未进入视频发布页面，重新尝试...")
-                    await asyncio.sleep(0.5)  # 等待 0.5 秒后重新尝试
+                # 如果第一个 URL 超时，再尝试等待第二个 URL，仍未进入时按退避重试
+                await page.wait_for_url(
+                    "https://creator.douyin.com/creator-micro/content/post/video?enter_from=publish_page",
+                    timeout=3000)
+                douyin_logger.info("[+] 成功进入version_2发布页面!")
+
+        await PUBLISH_PAGE_RETRY.run(wait_publish_page)
         # 填充标题和话题
         # 检查是否存在包含输入框的元素
         # 这里为了避免页面变化，故使用相对位置定位：作品标题父级右侧第一个元素的input子元素
@@ -810,42 +745,29 @@ class DouYinVideo(object):
         if await title_container.count():
             await title_container.fill(self.title[:30])
         else:
-            titlecontainer = page.locator(".notranslate")
-            await titlecontainer.click()
-            await page.keyboard.press("Backspace")
-            await page.keyboard.press("Control+KeyA")
-            await page.keyboard.press("Delete")
-            await page.keyboard.type(self.title)
+            await editor.fill_editor(page, ".notranslate", self.title, name='抖音标题')
             await page.keyboard.press("Enter")
-        css_selector = ".zone-container"
-        for index, tag in enumerate(self.tags, start=1):
-            await page.type(css_selector, "#" + tag)
-            await page.press(css_selector, "Space")
+        # 话题一次性写入描述编辑器末尾
+        await editor.fill_editor(page, ".zone-container", tags=self.tags, clear=False, name='抖音话题')
         douyin_logger.info(f'总共添加{len(self.tags)}个话题')
-        while True:
-            # 判断重新上传按钮是否存在，如果不存在，代表视频正在上传，则等待
-            try:
-                #  新版：定位重新上传
-                number = await page.locator('[class^="long-card"] div:has-text("重新上传")').count()
-                if number > 0:
-                    douyin_logger.success("  [-]视频上传完毕")
-                    break
-                else:
-                    douyin_logger.info("  [-] 正在上传视频中...")
-                    await asyncio.sleep(2)
+        self.diagnostics.checkpoint(progress.METADATA_FILLED)
+
+    async def wait_upload(self, page):
+        async def on_upload_error(page):
+            douyin_logger.error("  [-] 发现上传出错了... 准备重试")
+            await self.handle_upload_error(page)
 
-                    if await page.locator('div.progress-div > div:has-text("上传失败")').count():
-                        douyin_logger.error("  [-] 发现上传出错了... 准备重试")
-                        await self.handle_upload_error(page)
-            except:
-                douyin_logger.info("  [-] 正在上传视频中...")
-                await asyncio.sleep(2)
+        # 判断重新上传按钮是否存在，如果不存在，代表视频正在上传，则等待
+        douyin_logger.info("  [-] 正在上传视频中...")
+        await waits.wait_for_upload(page, UPLOAD_DONE_JS, UPLOAD_ERROR_JS, on_upload_error, name='抖音上传')
+        douyin_logger.success("  [-]视频上传完毕")
 
+    async def settings(self, page):
         if self.productLink and self.productTitle:
             douyin_logger.info(f'  [-] 正在设置商品链接...')
             await self.set_product_link(page, self.productLink, self.productTitle)
             douyin_logger.info(f'  [+] 完成设置商品链接...')
-        
+
         #上传视频封面
         await self.set_thumbnail(page, self.thumbnail_path)
 
@@ -861,47 +783,34 @@ class DouYinVideo(object):
             if 'semi-switch-checked' not in await page.eval_on_selector(third_part_element, 'div => div.className'):
                 await page.locator(third_part_element).locator('input.semi-switch-native-control').click()
 
-        if self.publish_date != 0:
-            await self.set_schedule_time_douyin(page, self.publish_date)
-
+    async def publish(self, page):
+        self.diagnostics.checkpoint('before_publish')
         # 判断视频是否发布成功
-        published_ok = False
-        while True:
-            # 判断视频是否发布成功
-            try:
-                publish_button = page.get_by_role('button', name="发布", exact=True)
-                if await publish_button.count():
-                    await publish_button.click()
-                await page.wait_for_url("https://creator.douyin.com/creator-micro/content/manage**",
-                                        timeout=3000)  # 如果自动跳转到作品页面，则代表发布成功
-                douyin_logger.success("  [-]视频发布成功")
-                published_ok = True
-                break
-            except:
-                # 尝试处理封面问题
-                await self.handle_auto_video_cover(page)
-                douyin_logger.info("  [-] 视频正在发布中...")
-                await page.screenshot(full_page=True)
-                await asyncio.sleep(0.5)
+        await super().publish(page)
 
+    async def click_publish(self, page):
         try:
-            await context.storage_state(path=self.account_file)  # 保存cookie
-            douyin_logger.success('  [-]cookie更新完毕！')
+            publish_button = page.get_by_role('button', name="发布", exact=True)
+            if await publish_button.count():
+                await publish_button.click()
+            await page.wait_for_url("https://creator.douyin.com/creator-micro/content/manage**",
+                                    timeout=3000)  # 如果自动跳转到作品页面，则代表发布成功
         except Exception:
-            if published_ok:
-                douyin_logger.warning("  [!] 视频已发布，但 cookie 更新失败（你可能手动关闭了窗口/页面被刷新）。可忽略该提示。")
-            else:
-                raise
-        await asyncio.sleep(2)  # 这里延迟是为了方便眼睛直观的观看
-        # 关闭浏览器上下文和浏览器实例
-        try:
-            await context.close()
-        except Exception:
-            pass
-        try:
-            await browser.close()
-        except Exception:
-            pass
+            # 尝试处理封面问题
+            await self.handle_auto_video_cover(page)
+            douyin_logger.info("  [-] 视频正在发布中...")
+            raise
+        douyin_logger.success("  [-]视频发布成功")
+
+    async def on_error(self, error):
+        # 上传中已保存过出错现场的不再重复保存
+        if isinstance(error, Exception) and not self.diagnostics.flushed:
+            folder = await self.diagnostics.failure('douyin_upload_failed')
+            if folder:
+                douyin_logger.error(f"[debug] 已保存诊断文件: {folder}")
+
+    async def on_finish(self):
+        await self.diagnostics.close()
 
     async def handle_auto_video_cover(self, page):
         """
@@ -1063,7 +972,3 @@ class DouYinVideo(object):
         except Exception as e:
             douyin_logger.error(f"[-] 设置商品链接时出错: {str(e)}")
             return False
-
-    async def main(self):
-        async with async_playwright() as playwright:
-            await self.upload(playwright)
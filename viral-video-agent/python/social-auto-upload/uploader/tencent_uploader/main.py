@@ -1,14 +1,25 @@
 # -*- coding: utf-8 -*-
 from datetime import datetime
 
-from playwright.async_api import Playwright, async_playwright
 import os
-import asyncio
 
-from conf import LOCAL_CHROME_PATH, LOCAL_CHROME_HEADLESS
+from conf import LOCAL_CHROME_HEADLESS
+from uploader.base_uploader import BaseUploader
+from utils import editor
+from utils import date_picker
 from utils.base_social_media import set_init_script
+from utils.browser_pool import browser_context
+from utils.cookie_probe import probe_cookie
 from utils.files_times import get_absolute_path
 from utils.log import tencent_logger
+from utils import waits
+
+# "发表"按钮可点击代表视频上传完毕
+UPLOAD_DONE_JS = """(arg, dom) => dom.qa('button').some(
+    el => el.textContent.trim() === '发表' && !el.className.includes('weui-desktop-btn_disabled'))"""
+# 出现错误提示且有删除按钮代表上传出错
+UPLOAD_ERROR_JS = """(arg, dom) => !!dom.q('div.status-msg.error')
+    && dom.hasText('div.media-status-content div.tag-inner', '删除')"""
 
 
 def format_str_for_short_title(origin_title: str) -> str:
@@ -32,10 +43,13 @@ def format_str_for_short_title(origin_title: str) -> str:
 
 
 async def cookie_auth(account_file):
-    async with async_playwright() as playwright:
-        browser = await playwright.chromium.launch(headless=LOCAL_CHROME_HEADLESS)
-        context = await browser.new_context(storage_state=account_file)
-        context = await set_init_script(context)
+    # 先用接口快速探测，无法判断时再打开浏览器校验
+    verdict = await probe_cookie('tencent', account_file)
+    if verdict is not None:
+        return verdict
+    # 从浏览器池分配上下文（没有常驻浏览器池时临时启动，用完关闭）
+    async with browser_context(headless=LOCAL_CHROME_HEADLESS, storage_state=account_file) as context:
+        context = await set_init_script(context, 'tencent', lean=True)
         # 创建一个新的页面
         page = await context.new_page()
         # 访问指定的 URL
@@ -50,17 +64,14 @@ async def cookie_auth(account_file):
 
 
 async def get_tencent_cookie(account_file):
-    async with async_playwright() as playwright:
-        options = {
-            'args': [
-                '--lang en-GB'
-            ],
-            'headless': LOCAL_CHROME_HEADLESS,  # Set headless option here
-        }
-        # Make sure to run headed.
-        browser = await playwright.chromium.launch(**options)
-        # Setup context however you like.
-        context = await browser.new_context()  # Pass any options
+    options = {
+        'args': [
+            '--lang en-GB'
+        ],
+        'headless': LOCAL_CHROME_HEADLESS,  # Set headless option here
+    }
+    # Make sure to run headed.
+    async with browser_context(**options) as context:
         # Pause the page, and start recording manually.
         context = await set_init_script(context)
         page = await context.new_page()
@@ -81,49 +92,33 @@ async def weixin_setup(account_file, handle=False):
     return True
 
 
-class TencentVideo(object):
+class TencentVideo(BaseUploader):
+    platform = 'tencent'
+    upload_url = "https://channels.weixin.qq.com/platform/post/create"
+    logger = tencent_logger
+
     def __init__(self, title, file_path, tags, publish_date: datetime, account_file, category=None, is_draft=False):
-        self.title = title  # 视频标题
-        self.file_path = file_path
-        self.tags = tags
-        self.publish_date = publish_date
-        self.account_file = account_file
+        super().__init__(title, file_path, tags, publish_date, account_file)
         self.category = category
-        self.headless = LOCAL_CHROME_HEADLESS
         self.is_draft = is_draft  # 是否保存为草稿
-        self.local_executable_path = LOCAL_CHROME_PATH or None
 
-    async def set_schedule_time_tencent(self, page, publish_date):
+    async def set_schedule_time(self, page, publish_date):
         label_element = page.locator("label").filter(has_text="定时").nth(1)
         await label_element.click()
 
         await page.click('input[placeholder="请选择发表时间"]')
 
-        str_month = str(publish_date.month) if publish_date.month > 9 else "0" + str(publish_date.month)
-        current_month = str_month + "月"
-        # 获取当前的月份
-        page_month = await page.inner_text('span.weui-desktop-picker__panel__label:has-text("月")')
-
-        # 检查当前月份是否与目标月份相同
-        if page_month != current_month:
-            await page.click('button.weui-desktop-btn__icon__right')
-
-        # 获取页面元素
-        elements = await page.query_selector_all('table.weui-desktop-picker__table a')
-
-        # 遍历元素并点击匹配的元素
-        for element in elements:
-            if 'weui-desktop-picker__disabled' in await element.evaluate('el => el.className'):
-                continue
-            text = await element.inner_text()
-            if text.strip() == str(publish_date.day):
-                await element.click()
-                break
+        # 在页面内一次完成：翻到目标月份，点击目标日期（跳过不可选的日期）
+        await date_picker.pick(page, [
+            date_picker.step('button.weui-desktop-btn__icon__right', until=date_picker.step(
+                'span.weui-desktop-picker__panel__label', text=f"{publish_date.month:02d}月")),
+            date_picker.step('table.weui-desktop-picker__table a', text=str(publish_date.day),
+                             exclude='weui-desktop-picker__disabled'),
+        ], name='视频号定时发表')
 
-        # 输入小时部分（假设选择11小时）
-        await page.click('input[placeholder="请选择时间"]')
-        await page.keyboard.press("Control+KeyA")
-        await page.keyboard.type(str(publish_date.hour))
+        # 输入小时部分
+        await date_picker.type_into(page, page.locator('input[placeholder="请选择时间"]'), str(publish_date.hour),
+                                    commit=None)
 
         # 选择标题栏（令定时时间生效）
         await page.locator("div.input-editor").click()
@@ -135,23 +130,12 @@ class TencentVideo(object):
         file_input = page.locator('input[type="file"]')
         await file_input.set_input_files(self.file_path)
 
-    async def upload(self, playwright: Playwright) -> None:
-        # 使用 Chromium (这里使用系统内浏览器，用chromium 会造成h264错误
-        browser = await playwright.chromium.launch(headless=self.headless, executable_path=self.local_executable_path)
-        # 创建一个浏览器上下文，使用指定的 cookie 文件
-        context = await browser.new_context(storage_state=f"{self.account_file}")
-        context = await set_init_script(context)
-
-        # 创建一个新的页面
-        page = await context.new_page()
-        # 访问指定的 URL
-        await page.goto("https://channels.weixin.qq.com/platform/post/create")
-        tencent_logger.info(f'[+]正在上传-------{self.title}.mp4')
-        # 等待页面跳转到指定的 URL，没进入，则自动等待到超时
-        await page.wait_for_url("https://channels.weixin.qq.com/platform/post/create")
+    async def attach(self, page):
         # await page.wait_for_selector('input[type="file"]', timeout=10000)
         file_input = page.locator('input[type="file"]')
         await file_input.set_input_files(self.file_path)
+
+    async def metadata(self, page):
         # 填充标题和话题
         await self.add_title_tags(page)
         # 添加商品
@@ -160,21 +144,15 @@ class TencentVideo(object):
         await self.add_collection(page)
         # 原创选择
         await self.add_original(page)
+
+    async def wait_upload(self, page):
         # 检测上传状态
         await self.detect_upload_status(page)
-        if self.publish_date != 0:
-            await self.set_schedule_time_tencent(page, self.publish_date)
+
+    async def publish(self, page):
         # 添加短标题
         await self.add_short_title(page)
-
-        await self.click_publish(page)
-
-        await context.storage_state(path=f"{self.account_file}")  # 保存cookie
-        tencent_logger.success('  [-]cookie更新完毕！')
-        await asyncio.sleep(2)  # 这里延迟是为了方便眼睛直观的观看
-        # 关闭浏览器上下文和浏览器实例
-        await context.close()
-        await browser.close()
+        await super().publish(page)
 
     async def add_short_title(self, page):
         short_title_element = page.get_by_text("短标题", exact=True).locator("..").locator(
@@ -185,68 +163,50 @@ class TencentVideo(object):
             await short_title_element.fill(short_title)
 
     async def click_publish(self, page):
-        while True:
-            try:
-                if self.is_draft:
-                    # 点击"保存草稿"按钮
-                    draft_button = page.locator('div.form-btns button:has-text("保存草稿")')
-                    if await draft_button.count():
-                        await draft_button.click()
-                    # 等待跳转到草稿箱页面或确认保存成功
-                    await page.wait_for_url("**/post/list**", timeout=5000)  # 使用通配符匹配包含post/list的URL
+        try:
+            if self.is_draft:
+                # 点击"保存草稿"按钮
+                draft_button = page.locator('div.form-btns button:has-text("保存草稿")')
+                if await draft_button.count():
+                    await draft_button.click()
+                # 等待跳转到草稿箱页面或确认保存成功
+                await page.wait_for_url("**/post/list**", timeout=5000)  # 使用通配符匹配包含post/list的URL
+                tencent_logger.success("  [-]视频草稿保存成功")
+            else:
+                # 点击"发表"按钮
+                publish_button = page.locator('div.form-btns button:has-text("发表")')
+                if await publish_button.count():
+                    await publish_button.click()
+                await page.wait_for_url("https://channels.weixin.qq.com/platform/post/list", timeout=5000)
+                tencent_logger.success("  [-]视频发布成功")
+        except Exception as e:
+            current_url = page.url
+            if self.is_draft:
+                # 检查是否在草稿相关的页面
+                if "post/list" in current_url or "draft" in current_url:
                     tencent_logger.success("  [-]视频草稿保存成功")
-                else:
-                    # 点击"发表"按钮
-                    publish_button = page.locator('div.form-btns button:has-text("发表")')
-                    if await publish_button.count():
-                        await publish_button.click()
-                    await page.wait_for_url("https://channels.weixin.qq.com/platform/post/list", timeout=5000)
+                    return
+            else:
+                # 检查是否在发布列表页面
+                if "https://channels.weixin.qq.com/platform/post/list" in current_url:
                     tencent_logger.success("  [-]视频发布成功")
-                break
-            except Exception as e:
-                current_url = page.url
-                if self.is_draft:
-                    # 检查是否在草稿相关的页面
-                    if "post/list" in current_url or "draft" in current_url:
-                        tencent_logger.success("  [-]视频草稿保存成功")
-                        break
-                else:
-                    # 检查是否在发布列表页面
-                    if "https://channels.weixin.qq.com/platform/post/list" in current_url:
-                        tencent_logger.success("  [-]视频发布成功")
-                        break
-                tencent_logger.exception(f"  [-] Exception: {e}")
-                tencent_logger.info("  [-] 视频正在发布中...")
-                await asyncio.sleep(0.5)
+                    return
+            tencent_logger.info(f"  [-] 视频正在发布中... {e}")
+            raise
 
     async def detect_upload_status(self, page):
-        while True:
-            # 匹配删除按钮，代表视频上传完毕，如果不存在，代表视频正在上传，则等待
-            try:
-                # 匹配删除按钮，代表视频上传完毕
-                if "weui-desktop-btn_disabled" not in await page.get_by_role("button", name="发表").get_attribute(
-                        'class'):
-                    tencent_logger.info("  [-]视频上传完毕")
-                    break
-                else:
-                    tencent_logger.info("  [-] 正在上传视频中...")
-                    await asyncio.sleep(2)
-                    # 出错了视频出错
-                    if await page.locator('div.status-msg.error').count() and await page.locator(
-                            'div.media-status-content div.tag-inner:has-text("删除")').count():
-                        tencent_logger.error("  [-] 发现上传出错了...准备重试")
-                        await self.handle_upload_error(page)
-            except:
-                tencent_logger.info("  [-] 正在上传视频中...")
-                await asyncio.sleep(2)
+        async def on_error(page):
+            tencent_logger.error("  [-] 发现上传出错了...准备重试")
+            await self.handle_upload_error(page)
+
+        tencent_logger.info("  [-] 正在上传视频中...")
+        # "发表"按钮不再是禁用状态代表视频上传完毕；出现错误提示和删除按钮代表上传出错
+        await waits.wait_for_upload(page, UPLOAD_DONE_JS, UPLOAD_ERROR_JS, on_error, name='视频号上传')
+        tencent_logger.info("  [-]视频上传完毕")
 
     async def add_title_tags(self, page):
-        await page.locator("div.input-editor").click()
-        await page.keyboard.type(self.title)
-        await page.keyboard.press("Enter")
-        for index, tag in enumerate(self.tags, start=1):
-            await page.keyboard.type("#" + tag)
-            await page.keyboard.press("Space")
+        # 标题和话题各一次写入，不逐字输入
+        await editor.fill_editor(page, "div.input-editor", self.title, self.tags, clear=False, name='视频号描述')
         tencent_logger.info(f"成功添加hashtag: {len(self.tags)}")
 
     async def add_collection(self, page):
@@ -279,7 +239,3 @@ class TencentVideo(object):
                 await page.wait_for_timeout(1000)
             if await page.locator('button:has-text("声明原创"):visible').count():
                 await page.locator('button:has-text("声明原创"):visible').click()
-
-    async def main(self):
-        async with async_playwright() as playwright:
-            await self.upload(playwright)
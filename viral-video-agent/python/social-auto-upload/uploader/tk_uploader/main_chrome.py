@@ -1,22 +1,23 @@
 # -*- coding: utf-8 -*-
 import re
-from datetime import datetime
-
-from playwright.async_api import Playwright, async_playwright
 import os
 import asyncio
 
-from conf import LOCAL_CHROME_PATH, LOCAL_CHROME_HEADLESS
+from conf import LOCAL_CHROME_HEADLESS
+from uploader.base_uploader import BaseUploader, OPEN, ATTACH, METADATA, WAIT_UPLOAD, SCHEDULE, PUBLISH, PERSIST_COOKIES
 from uploader.tk_uploader.tk_config import Tk_Locator
+from utils import date_picker
+from utils import progress
 from utils.base_social_media import set_init_script
+from utils.browser_pool import browser_context
 from utils.files_times import get_absolute_path
 from utils.log import tiktok_logger
+from utils.network import NAVIGATION_RETRY
 
 
 async def cookie_auth(account_file):
-    async with async_playwright() as playwright:
-        browser = await playwright.chromium.launch(headless=LOCAL_CHROME_HEADLESS)
-        context = await browser.new_context(storage_state=account_file)
+    # 从浏览器池分配上下文（没有常驻浏览器池时临时启动，用完关闭）
+    async with browser_context(headless=LOCAL_CHROME_HEADLESS, storage_state=account_file) as context:
         context = await set_init_script(context)
         # 创建一个新的页面
         page = await context.new_page()
@@ -50,17 +51,14 @@ async def tiktok_setup(account_file, handle=False):
 
 
 async def get_tiktok_cookie(account_file):
-    async with async_playwright() as playwright:
-        options = {
-            'args': [
-                '--lang en-GB',
-            ],
-            'headless': LOCAL_CHROME_HEADLESS,  # Set headless option here
-        }
-        # Make sure to run headed.
-        browser = await playwright.chromium.launch(**options)
-        # Setup context however you like.
-        context = await browser.new_context()  # Pass any options
+    options = {
+        'args': [
+            '--lang en-GB',
+        ],
+        'headless': LOCAL_CHROME_HEADLESS,  # Set headless option here
+    }
+    # Make sure to run headed.
+    async with browser_context(**options) as context:
         context = await set_init_script(context)
         # Pause the page, and start recording manually.
         page = await context.new_page()
@@ -70,16 +68,16 @@ async def get_tiktok_cookie(account_file):
         await context.storage_state(path=account_file)
 
 
-class TiktokVideo(object):
+class TiktokVideo(BaseUploader):
+    platform = 'tiktok'
+    upload_url = "https://www.tiktok.com/tiktokstudio/upload"
+    logger = tiktok_logger
+    stealth = False
+    STAGES = (OPEN, ATTACH, METADATA, WAIT_UPLOAD, 'thumbnail', SCHEDULE, PUBLISH, PERSIST_COOKIES)
+
     def __init__(self, title, file_path, tags, publish_date, account_file, thumbnail_path=None):
-        self.title = title
-        self.file_path = file_path
-        self.tags = tags
-        self.publish_date = publish_date
+        super().__init__(title, file_path, tags, publish_date, account_file)
         self.thumbnail_path = thumbnail_path
-        self.account_file = account_file
-        self.local_executable_path = LOCAL_CHROME_PATH
-        self.headless = LOCAL_CHROME_HEADLESS
         self.locator_base = None
 
     async def set_schedule_time(self, page, publish_date):
@@ -90,50 +88,16 @@ class TiktokVideo(object):
         if await self.locator_base.locator('div.TUXButton-content >> text=Allow').count():
             await self.locator_base.locator('div.TUXButton-content >> text=Allow').click()
 
-        scheduled_picker = self.locator_base.locator('div.scheduled-picker')
-        await scheduled_picker.locator('div.TUXInputBox').nth(1).click()
-
-        calendar_month = await self.locator_base.locator(
-            'div.calendar-wrapper span.month-title').inner_text()
-
-        n_calendar_month = datetime.strptime(calendar_month, '%B').month
-
-        schedule_month = publish_date.month
-
-        if n_calendar_month != schedule_month:
-            if n_calendar_month < schedule_month:
-                arrow = self.locator_base.locator('div.calendar-wrapper span.arrow').nth(-1)
-            else:
-                arrow = self.locator_base.locator('div.calendar-wrapper span.arrow').nth(0)
-            await arrow.click()
-
-        # day set
-        valid_days_locator = self.locator_base.locator(
-            'div.calendar-wrapper span.day.valid')
-        valid_days = await valid_days_locator.count()
-        for i in range(valid_days):
-            day_element = valid_days_locator.nth(i)
-            text = await day_element.inner_text()
-            if text.strip() == str(publish_date.day):
-                await day_element.click()
-                break
-        # time set
-        await scheduled_picker.locator('div.TUXInputBox').nth(0).click()
-
-        hour_str = publish_date.strftime("%H")
-        correct_minute = int(publish_date.minute / 5)
-        minute_str = f"{correct_minute:02d}"
-
-        hour_selector = f"span.tiktok-timepicker-left:has-text('{hour_str}')"
-        minute_selector = f"span.tiktok-timepicker-right:has-text('{minute_str}')"
-
-        # pick hour first
-        await page.wait_for_timeout(1000)  # 等待500毫秒
-        await self.locator_base.locator(hour_selector).click()
-        # click time button again
-        await page.wait_for_timeout(1000)  # 等待500毫秒
-        # pick minutes after
-        await self.locator_base.locator(minute_selector).click()
+        # 在页面内一次完成：打开日历、翻到目标月份、点日期，再打开时间选择点小时和分钟（分钟按 5 分钟取整）
+        await date_picker.pick(self.locator_base, [
+            date_picker.step('div.scheduled-picker div.TUXInputBox', index=1),
+            date_picker.step('div.calendar-wrapper span.arrow', index=-1, until=date_picker.step(
+                'div.calendar-wrapper span.month-title', text=publish_date.strftime('%B'))),
+            date_picker.step('div.calendar-wrapper span.day.valid', text=str(publish_date.day)),
+            date_picker.step('div.scheduled-picker div.TUXInputBox', index=0),
+            date_picker.step('span.tiktok-timepicker-left', text=publish_date.strftime("%H")),
+            date_picker.step('span.tiktok-timepicker-right', text=f"{publish_date.minute // 5 * 5:02d}"),
+        ], name='TikTok 定时发布')
 
         # click title to remove the focus.
         # await self.locator_base.locator("h1:has-text('Upload video')").click()
@@ -146,18 +110,14 @@ class TiktokVideo(object):
         file_chooser = await fc_info.value
         await file_chooser.set_files(self.file_path)
 
-    async def upload(self, playwright: Playwright) -> None:
-        browser = await playwright.chromium.launch(headless=self.headless, executable_path=self.local_executable_path)
-        context = await browser.new_context(storage_state=f"{self.account_file}")
-        # context = await set_init_script(context)
-        page = await context.new_page()
-
+    async def open(self, page):
         # change language to eng first
         await self.change_language(page)
-        await page.goto("https://www.tiktok.com/tiktokstudio/upload")
+        progress.emit(progress.OPEN_PAGE, url=self.upload_url)
+        await NAVIGATION_RETRY.run(page.goto, self.upload_url)
         tiktok_logger.info(f'[+]Uploading-------{self.title}.mp4')
 
-        await page.wait_for_url("https://www.tiktok.com/tiktokstudio/upload", timeout=10000)
+        await page.wait_for_url(self.upload_url, timeout=10000)
 
         try:
             await page.wait_for_selector('iframe[data-tt="Upload_index_iframe"], div.upload-container', timeout=10000)
@@ -167,6 +127,7 @@ class TiktokVideo(object):
 
         await self.choose_base_locator(page)
 
+    async def attach(self, page):
         upload_button = self.locator_base.locator(
             'button:has-text("Select video"):visible')
         await upload_button.wait_for(state='visible')  # 确保按钮可见
@@ -176,26 +137,23 @@ class TiktokVideo(object):
         file_chooser = await fc_info.value
         await file_chooser.set_files(self.file_path)
 
+    async def metadata(self, page):
         await self.add_title_tags(page)
+
+    async def wait_upload(self, page):
         # detect upload status
         await self.detect_upload_status(page)
-        if self.thumbnail_path:
-            tiktok_logger.info(f'[+] Uploading thumbnail file {self.title}.png')
-            await self.upload_thumbnails(page)
 
-        if self.publish_date != 0:
-            await self.set_schedule_time(page, self.publish_date)
+    async def thumbnail(self, page):
+        if not self.thumbnail_path:
+            return False
+        tiktok_logger.info(f'[+] Uploading thumbnail file {self.title}.png')
+        await self.upload_thumbnails(page)
 
-        await self.click_publish(page)
+    async def publish(self, page):
+        await super().publish(page)
         tiktok_logger.success(f"video_id: {await self.get_last_video_id(page)}")
 
-        await context.storage_state(path=f"{self.account_file}")  # save cookie
-        tiktok_logger.info('  [-] update cookie！')
-        await asyncio.sleep(2)  # close delay for look the video status
-        # close all
-        await context.close()
-        await browser.close()
-
     async def add_title_tags(self, page):
 
         editor_locator = self.locator_base.locator('div.public-DraftEditor-content')
@@ -254,20 +212,12 @@ class TiktokVideo(object):
         await page.locator('#creator-tools-selection-menu-header >> text=English (US)').click()
 
     async def click_publish(self, page):
-        success_flag_div = 'div.common-modal-confirm-modal'
-        while True:
-            try:
-                publish_button = self.locator_base.locator('div.button-group button').nth(0)
-                if await publish_button.count():
-                    await publish_button.click()
-
-                await page.wait_for_url("https://www.tiktok.com/tiktokstudio/content",  timeout=3000)
-                tiktok_logger.success("  [-] video published success")
-                break
-            except Exception as e:
-                tiktok_logger.exception(f"  [-] Exception: {e}")
-                tiktok_logger.info("  [-] video publishing")
-                await asyncio.sleep(0.5)
+        publish_button = self.locator_base.locator('div.button-group button').nth(0)
+        if await publish_button.count():
+            await publish_button.click()
+
+        await page.wait_for_url("https://www.tiktok.com/tiktokstudio/content",  timeout=3000)
+        tiktok_logger.success("  [-] video published success")
 
     async def get_last_video_id(self, page):
         await page.wait_for_selector('div[data-tt="components_PostTable_Container"]')
@@ -303,7 +253,3 @@ class TiktokVideo(object):
             self.locator_base = page.frame_locator(Tk_Locator.tk_iframe)
         else:
             self.locator_base = page.locator(Tk_Locator.default) 
-
-    async def main(self):
-        async with async_playwright() as playwright:
-            await self.upload(playwright)
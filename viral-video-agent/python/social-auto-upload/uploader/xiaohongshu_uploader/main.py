@@ -1,20 +1,33 @@
 # -*- coding: utf-8 -*-
 from datetime import datetime
 
-from playwright.async_api import Playwright, async_playwright, Page
+from playwright.async_api import Page
 import os
 import asyncio
 
-from conf import LOCAL_CHROME_PATH, LOCAL_CHROME_HEADLESS
+from conf import LOCAL_CHROME_HEADLESS
+from uploader.base_uploader import BaseUploader, OPEN, ATTACH, WAIT_UPLOAD, METADATA, SCHEDULE, PUBLISH, \
+    PERSIST_COOKIES
+from utils import editor
+from utils import date_picker
 from utils.base_social_media import set_init_script
+from utils.browser_pool import browser_context
+from utils.cookie_probe import probe_cookie
 from utils.log import xiaohongshu_logger
+from utils import waits
+
+# 上传控件后面的预览区域出现"上传成功"代表视频上传完毕
+UPLOAD_DONE_JS = """(arg, dom) => dom.hasText('input.upload-input ~ div[class*="preview-new"] div.stage', '上传成功')"""
 
 
 async def cookie_auth(account_file):
-    async with async_playwright() as playwright:
-        browser = await playwright.chromium.launch(headless=LOCAL_CHROME_HEADLESS)
-        context = await browser.new_context(storage_state=account_file)
-        context = await set_init_script(context)
+    # 先用接口快速探测，无法判断时再打开浏览器校验
+    verdict = await probe_cookie('xiaohongshu', account_file)
+    if verdict is not None:
+        return verdict
+    # 从浏览器池分配上下文（没有常驻浏览器池时临时启动，用完关闭）
+    async with browser_context(headless=LOCAL_CHROME_HEADLESS, storage_state=account_file) as context:
+        context = await set_init_script(context, 'xiaohongshu', lean=True)
         # 创建一个新的页面
         page = await context.new_page()
         # 访问指定的 URL
@@ -23,8 +36,6 @@ async def cookie_auth(account_file):
             await page.wait_for_url("https://creator.xiaohongshu.com/creator-micro/content/upload", timeout=5000)
         except:
             print("[+] 等待5秒 cookie 失效")
-            await context.close()
-            await browser.close()
             return False
         # 2024.06.17 抖音创作者中心改版
         if await page.get_by_text('手机号登录').count() or await page.get_by_text('扫码登录').count():
@@ -46,14 +57,11 @@ async def xiaohongshu_setup(account_file, handle=False):
 
 
 async def xiaohongshu_cookie_gen(account_file):
-    async with async_playwright() as playwright:
-        options = {
-            'headless': LOCAL_CHROME_HEADLESS
-        }
-        # Make sure to run headed.
-        browser = await playwright.chromium.launch(**options)
-        # Setup context however you like.
-        context = await browser.new_context()  # Pass any options
+    options = {
+        'headless': LOCAL_CHROME_HEADLESS
+    }
+    # Make sure to run headed.
+    async with browser_context(**options) as context:
         context = await set_init_script(context)
         # Pause the page, and start recording manually.
         page = await context.new_page()
@@ -63,19 +71,22 @@ async def xiaohongshu_cookie_gen(account_file):
         await context.storage_state(path=account_file)
 
 
-class XiaoHongShuVideo(object):
+class XiaoHongShuVideo(BaseUploader):
+    platform = 'xiaohongshu'
+    upload_url = "https://creator.xiaohongshu.com/publish/publish?from=homepage&target=video"
+    logger = xiaohongshu_logger
+    # 小红书上传完成后才出现标题和正文编辑器
+    STAGES = (OPEN, ATTACH, WAIT_UPLOAD, METADATA, SCHEDULE, PUBLISH, PERSIST_COOKIES)
+
     def __init__(self, title, file_path, tags, publish_date: datetime, account_file, thumbnail_path=None):
-        self.title = title  # 视频标题
-        self.file_path = file_path
-        self.tags = tags
-        self.publish_date = publish_date
-        self.account_file = account_file
+        super().__init__(title, file_path, tags, publish_date, account_file)
         self.date_format = '%Y年%m月%d日 %H:%M'
-        self.local_executable_path = LOCAL_CHROME_PATH
-        self.headless = LOCAL_CHROME_HEADLESS
         self.thumbnail_path = thumbnail_path
 
-    async def set_schedule_time_xiaohongshu(self, page, publish_date):
+    def browser_options(self):
+        return {**super().browser_options(), "viewport": {"width": 1600, "height": 900}}
+
+    async def set_schedule_time(self, page, publish_date):
         print("  [-] 正在设置定时发布时间...")
         print(f"publish_date: {publish_date}")
 
@@ -90,75 +101,29 @@ class XiaoHongShuVideo(object):
         label_element = page.locator("label:has-text('定时发布')")
         # # 在选中的 label 元素下点击 checkbox
         await label_element.click()
-        await asyncio.sleep(1)
         publish_date_hour = publish_date.strftime("%Y-%m-%d %H:%M")
         print(f"publish_date_hour: {publish_date_hour}")
 
-        await asyncio.sleep(1)
-        await page.locator('.el-input__inner[placeholder="选择日期和时间"]').click()
-        await page.keyboard.press("Control+KeyA")
-        await page.keyboard.type(str(publish_date_hour))
-        await page.keyboard.press("Enter")
-
-        await asyncio.sleep(1)
+        # 日期输入框在选中定时发布后出现，click 会等到它可见，不再固定等待
+        value = await date_picker.type_into(page, page.locator('.el-input__inner[placeholder="选择日期和时间"]'),
+                                            publish_date_hour)
+        if value != publish_date_hour:
+            xiaohongshu_logger.warning(f"[-] 定时发布时间为 {value}，期望 {publish_date_hour}")
 
     async def handle_upload_error(self, page):
         xiaohongshu_logger.info('视频出错了，重新上传中')
         await page.locator('div.progress-div [class^="upload-btn-input"]').set_input_files(self.file_path)
 
-    async def upload(self, playwright: Playwright) -> None:
-        # 使用 Chromium 浏览器启动一个浏览器实例
-        if self.local_executable_path:
-            browser = await playwright.chromium.launch(headless=self.headless, executable_path=self.local_executable_path)
-        else:
-            browser = await playwright.chromium.launch(headless=self.headless)
-        # 创建一个浏览器上下文，使用指定的 cookie 文件
-        context = await browser.new_context(
-            viewport={"width": 1600, "height": 900},
-            storage_state=f"{self.account_file}"
-        )
-        context = await set_init_script(context)
-
-        # 创建一个新的页面
-        page = await context.new_page()
-        # 访问指定的 URL
-        await page.goto("https://creator.xiaohongshu.com/publish/publish?from=homepage&target=video")
-        xiaohongshu_logger.info(f'[+]正在上传-------{self.title}.mp4')
-        # 等待页面跳转到指定的 URL，没进入，则自动等待到超时
-        xiaohongshu_logger.info(f'[-] 正在打开主页...')
-        await page.wait_for_url("https://creator.xiaohongshu.com/publish/publish?from=homepage&target=video")
+    async def attach(self, page):
         # 点击 "上传视频" 按钮
         await page.locator("div[class^='upload-content'] input[class='upload-input']").set_input_files(self.file_path)
 
+    async def wait_upload(self, page):
         # 等待页面跳转到指定的 URL 2025.01.08修改在原有基础上兼容两种页面
-        while True:
-            try:
-                # 等待upload-input元素出现
-                upload_input = await page.wait_for_selector('input.upload-input', timeout=3000)
-                # 获取下一个兄弟元素
-                preview_new = await upload_input.query_selector(
-                    'xpath=following-sibling::div[contains(@class, "preview-new")]')
-                if preview_new:
-                    # 在preview-new元素中查找包含"上传成功"的stage元素
-                    stage_elements = await preview_new.query_selector_all('div.stage')
-                    upload_success = False
-                    for stage in stage_elements:
-                        text_content = await page.evaluate('(element) => element.textContent', stage)
-                        if '上传成功' in text_content:
-                            upload_success = True
-                            break
-                    if upload_success:
-                        xiaohongshu_logger.info("[+] 检测到上传成功标识!")
-                        break  # 成功检测到上传成功后跳出循环
-                    else:
-                        print("  [-] 未找到上传成功标识，继续等待...")
-                else:
-                    print("  [-] 未找到预览元素，继续等待...")
-                    await asyncio.sleep(1)
-            except Exception as e:
-                print(f"  [-] 检测过程出错: {str(e)}，重新尝试...")
-                await asyncio.sleep(0.5)  # 等待0.5秒后重新尝试
+        await waits.wait_for_upload(page, UPLOAD_DONE_JS, name='小红书上传')
+        xiaohongshu_logger.info("[+] 检测到上传成功标识!")
 
+    async def metadata(self, page):
         # 填充标题和话题
         # 检查是否存在包含输入框的元素
         # 这里为了避免页面变化，故使用相对位置定位：作品标题父级右侧第一个元素的input子元素
@@ -168,17 +133,11 @@ class XiaoHongShuVideo(object):
         if await title_container.count():
             await title_container.fill(self.title[:30])
         else:
-            titlecontainer = page.locator(".notranslate")
-            await titlecontainer.click()
-            await page.keyboard.press("Backspace")
-            await page.keyboard.press("Control+KeyA")
-            await page.keyboard.press("Delete")
-            await page.keyboard.type(self.title)
+            await editor.fill_editor(page, ".notranslate", self.title, name='小红书标题')
             await page.keyboard.press("Enter")
         css_selector = ".ql-editor" # 不能加上 .ql-blank 属性，这样只能获取第一次非空状态
-        for index, tag in enumerate(self.tags, start=1):
-            await page.type(css_selector, "#" + tag)
-            await page.press(css_selector, "Space")
+        # 话题一次性写入正文编辑器末尾
+        await editor.fill_editor(page, css_selector, tags=self.tags, clear=False, name='小红书话题')
         xiaohongshu_logger.info(f'总共添加{len(self.tags)}个话题')
 
         # while True:
@@ -214,35 +173,22 @@ class XiaoHongShuVideo(object):
         #     if 'semi-switch-checked' not in await page.eval_on_selector(third_part_element, 'div => div.className'):
         #         await page.locator(third_part_element).locator('input.semi-switch-native-control').click()
 
-        if self.publish_date != 0:
-            await self.set_schedule_time_xiaohongshu(page, self.publish_date)
-
-        # 判断视频是否发布成功
-        while True:
-            try:
-                # 等待包含"定时发布"文本的button元素出现并点击
-                if self.publish_date != 0:
-                    await page.locator('button:has-text("定时发布")').click()
-                else:
-                    await page.locator('button:has-text("发布")').click()
-                await page.wait_for_url(
-                    "https://creator.xiaohongshu.com/publish/success?**",
-                    timeout=3000
-                )  # 如果自动跳转到作品页面，则代表发布成功
-                xiaohongshu_logger.success("  [-]视频发布成功")
-                break
-            except:
-                xiaohongshu_logger.info("  [-] 视频正在发布中...")
-                await page.screenshot(full_page=True)
-                await asyncio.sleep(0.5)
+    async def click_publish(self, page):
+        try:
+            # 等待包含"定时发布"文本的button元素出现并点击
+            if self.publish_date != 0:
+                await page.locator('button:has-text("定时发布")').click()
+            else:
+                await page.locator('button:has-text("发布")').click()
+            await page.wait_for_url(
+                "https://creator.xiaohongshu.com/publish/success?**",
+                timeout=3000
+            )  # 如果自动跳转到作品页面，则代表发布成功
+        except Exception:
+            xiaohongshu_logger.info("  [-] 视频正在发布中...")
+            raise
+        xiaohongshu_logger.success("  [-]视频发布成功")
 
-        await context.storage_state(path=self.account_file)  # 保存cookie
-        xiaohongshu_logger.success('  [-]cookie更新完毕！')
-        await asyncio.sleep(2)  # 这里延迟是为了方便眼睛直观的观看
-        # 关闭浏览器上下文和浏览器实例
-        await context.close()
-        await browser.close()
-    
     async def set_thumbnail(self, page: Page, thumbnail_path: str):
         if thumbnail_path:
             await page.click('text="选择封面"')
@@ -360,9 +306,3 @@ class XiaoHongShuVideo(object):
             # 截图保存（取消注释使用）
             # await page.screenshot(path=f"location_error_{location}.png")
             return False
-
-    async def main(self):
-        async with async_playwright() as playwright:
-            await self.upload(playwright)
-
-
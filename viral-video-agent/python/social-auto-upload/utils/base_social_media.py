@@ -1,7 +1,10 @@
 from pathlib import Path
 from typing import List
+from urllib.parse import urlsplit
 
+import conf
 from conf import BASE_DIR
+from utils import metrics
 
 SOCIAL_MEDIA_DOUYIN = "douyin"
 SOCIAL_MEDIA_TENCENT = "tencent"
@@ -9,6 +12,29 @@ SOCIAL_MEDIA_TIKTOK = "tiktok"
 SOCIAL_MEDIA_BILIBILI = "bilibili"
 SOCIAL_MEDIA_KUAISHOU = "kuaishou"
 
+# 精简模式下放行的资源类型（Playwright request.resource_type），字体、音视频预览一律拦截。
+# 图片默认放行：cookie 失效时上传页内的扫码登录二维码、滑块验证码都是图片
+LEAN_ALLOWED_TYPES = ('document', 'script', 'stylesheet', 'image', 'xhr', 'fetch', 'websocket', 'eventsource',
+                      'manifest', 'other')
+# 第三方统计 / 监控上报域名（含子域名），可在 conf.py 中通过 LEAN_BLOCKED_HOSTS 覆盖
+LEAN_BLOCKED_HOSTS = (
+    'google-analytics.com',
+    'googletagmanager.com',
+    'doubleclick.net',
+    'hm.baidu.com',
+    'cnzz.com',
+    'umeng.com',
+    'sentry.io',
+    'mcs.zijieapi.com',
+    'mon.zijieapi.com',
+    'mcs.snssdk.com',
+    'mon.snssdk.com',
+    'aegis.qq.com',
+    'beacon.qq.com',
+    'apm-fe.xiaohongshu.com',
+    'log-sdk.ksapisrv.com',
+)
+
 
 def get_supported_social_media() -> List[str]:
     return [SOCIAL_MEDIA_DOUYIN, SOCIAL_MEDIA_TENCENT, SOCIAL_MEDIA_TIKTOK, SOCIAL_MEDIA_KUAISHOU]
@@ -18,7 +44,47 @@ def get_cli_action() -> List[str]:
     return ["upload", "login", "watch"]
 
 
-async def set_init_script(context):
+def lean_allowed_types(platform=None):
+    """platform 在精简模式下放行的资源类型：默认 LEAN_ALLOWED_TYPES，conf.py 中 LEAN_ALLOWED_RESOURCES 可按平台收窄"""
+    allowed = frozenset(LEAN_ALLOWED_TYPES)
+    overrides = getattr(conf, 'LEAN_ALLOWED_RESOURCES', {})
+    if platform in overrides:
+        allowed &= frozenset(overrides[platform])
+    return allowed
+
+
+def is_tracker(url, blocked_hosts):
+    host = urlsplit(url).hostname or ''
+    return any(host == blocked or host.endswith('.' + blocked) for blocked in blocked_hosts)
+
+
+async def enable_lean_mode(context, platform=None):
+    """拦截 platform 用不到的资源类型和第三方统计请求，减少页面加载时间和内存占用"""
+    allowed = lean_allowed_types(platform)
+    blocked_hosts = tuple(getattr(conf, 'LEAN_BLOCKED_HOSTS', LEAN_BLOCKED_HOSTS))
+    label = platform or ''
+
+    async def handle(route):
+        request = route.request
+        if request.resource_type not in allowed:
+            metrics.BLOCKED_REQUESTS.inc(platform=label, reason=request.resource_type)
+            await route.abort('blockedbyclient')
+        elif is_tracker(request.url, blocked_hosts):
+            metrics.BLOCKED_REQUESTS.inc(platform=label, reason='tracker')
+            await route.abort('blockedbyclient')
+        else:
+            await route.fallback()
+
+    await context.route('**/*', handle)
+
+
+async def set_init_script(context, platform=None, lean=False):
+    """
+    注入 stealth.js。lean 为 True 时开启精简模式（conf.py 中 LEAN_CONTEXT = False 可全局关闭），
+    只用于上传和 cookie 校验；登录需要显示二维码，不要开启。
+    """
     stealth_js_path = Path(BASE_DIR / "utils/stealth.min.js")
     await context.add_init_script(path=stealth_js_path)
+    if lean and getattr(conf, 'LEAN_CONTEXT', True):
+        await enable_lean_mode(context, platform)
     return context
@@ -0,0 +1,179 @@
+import asyncio
+import json
+import threading
+from contextlib import asynccontextmanager
+
+from playwright.async_api import async_playwright
+
+import conf
+from conf import LOCAL_CHROME_HEADLESS
+from utils import metrics
+from utils.log import logger
+from utils.progress import current_platform
+
+# 单个浏览器最多分配多少个 context 后回收重启，可在 conf.py 中通过 BROWSER_POOL_MAX_USES 配置
+DEFAULT_MAX_USES = 20
+
+# 每个事件循环一个浏览器池（Playwright 对象不能跨事件循环使用）
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class _PooledBrowser(object):
+    def __init__(self, browser):
+        self.browser = browser
+        self.uses = 0
+        self.active = 0
+        self.retired = False
+
+
+class BrowserPool(object):
+    """
+    常驻的 Playwright 浏览器池：按启动参数复用已启动的浏览器，
+    每次 context() 为账号分配一个独立的 BrowserContext，用完即关闭。
+    浏览器累计分配 max_uses 次或崩溃/断开后会被回收，下次使用时重新启动。
+    """
+
+    def __init__(self, max_uses=None):
+        self.max_uses = max_uses or getattr(conf, 'BROWSER_POOL_MAX_USES', DEFAULT_MAX_USES)
+        self._playwright_manager = None
+        self._playwright = None
+        self._browsers = {}
+        self._lock = asyncio.Lock()
+
+    async def _get_playwright(self):
+        if self._playwright is None:
+            self._playwright_manager = async_playwright()
+            self._playwright = await self._playwright_manager.start()
+        return self._playwright
+
+    async def _acquire(self, browser_type, launch_options):
+        key = (browser_type, json.dumps(launch_options, sort_keys=True, default=str))
+        async with self._lock:
+            entry = self._browsers.get(key)
+            if entry is not None and (entry.retired or not entry.browser.is_connected()):
+                self._browsers.pop(key, None)
+                entry.retired = True
+                if entry.active == 0:
+                    await self._close_browser(entry)
+                entry = None
+            if entry is None:
+                playwright = await self._get_playwright()
+                with metrics.timer(metrics.BROWSER_LAUNCH, platform=current_platform(), browser=browser_type):
+                    browser = await getattr(playwright, browser_type).launch(**launch_options)
+                entry = _PooledBrowser(browser)
+                # 浏览器崩溃或被用户关闭时标记回收，下次分配时重新启动
+                browser.on("disconnected", lambda _: setattr(entry, 'retired', True))
+                self._browsers[key] = entry
+                logger.info(f"[browser-pool] 启动 {browser_type} 浏览器: {launch_options}")
+            entry.uses += 1
+            entry.active += 1
+            if entry.uses >= self.max_uses:
+                # 不再分配新的 context，当前 context 全部释放后关闭
+                entry.retired = True
+                self._browsers.pop(key, None)
+            return entry
+
+    async def _release(self, entry):
+        async with self._lock:
+            entry.active -= 1
+            if entry.retired and entry.active == 0:
+                await self._close_browser(entry)
+
+    @staticmethod
+    async def _close_browser(entry):
+        try:
+            await entry.browser.close()
+        except Exception:
+            pass
+
+    @asynccontextmanager
+    async def context(self, browser_type='chromium', headless=LOCAL_CHROME_HEADLESS, executable_path=None,
+                      args=None, proxy=None, **context_options):
+        """分配一个隔离的 BrowserContext，context_options 透传给 browser.new_context"""
+        launch_options = {"headless": headless}
+        if executable_path:
+            launch_options["executable_path"] = executable_path
+        if args:
+            launch_options["args"] = list(args)
+        if proxy:
+            launch_options["proxy"] = proxy
+        entry = await self._acquire(browser_type, launch_options)
+        try:
+            context = await entry.browser.new_context(**context_options)
+        except Exception:
+            # 浏览器已不可用（崩溃/被关闭）时回收；参数错误（如 cookie 文件不存在）不影响共用的浏览器
+            if not entry.browser.is_connected():
+                entry.retired = True
+            await self._release(entry)
+            raise
+        try:
+            yield context
+        finally:
+            try:
+                await context.close()
+            except Exception:
+                pass
+            await self._release(entry)
+
+    async def close(self):
+        async with self._lock:
+            entries = list(self._browsers.values())
+            self._browsers.clear()
+        for entry in entries:
+            await self._close_browser(entry)
+        if self._playwright_manager is not None:
+            try:
+                await self._playwright_manager.__aexit__(None, None, None)
+            except Exception:
+                pass
+            self._playwright_manager = None
+            self._playwright = None
+
+
+def get_browser_pool():
+    """当前事件循环上安装的浏览器池，没有则返回 None"""
+    loop = asyncio.get_running_loop()
+    with _pools_lock:
+        return _pools.get(loop)
+
+
+def install_browser_pool(loop=None, pool=None):
+    """为事件循环安装一个常驻浏览器池（后台工作线程在启动时调用）"""
+    loop = loop or asyncio.get_running_loop()
+    with _pools_lock:
+        if loop not in _pools:
+            _pools[loop] = pool or BrowserPool()
+        return _pools[loop]
+
+
+async def close_browser_pool():
+    loop = asyncio.get_running_loop()
+    with _pools_lock:
+        pool = _pools.pop(loop, None)
+    if pool is not None:
+        await pool.close()
+
+
+@asynccontextmanager
+async def shared_browser_pool():
+    """在 with 范围内，当前事件循环中的所有上传/校验共用同一个浏览器池"""
+    if get_browser_pool() is not None:
+        yield get_browser_pool()
+        return
+    pool = install_browser_pool()
+    try:
+        yield pool
+    finally:
+        await close_browser_pool()
+
+
+@asynccontextmanager
+async def browser_context(browser_type='chromium', **options):
+    """
+    从当前事件循环的浏览器池中分配 BrowserContext；
+    没有安装浏览器池时（例如单次脚本调用）临时启动一个，用完即关闭。
+    """
+    async with shared_browser_pool() as pool:
+        async with pool.context(browser_type, **options) as context:
+            yield context
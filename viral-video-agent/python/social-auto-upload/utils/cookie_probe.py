@@ -0,0 +1,194 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+import httpx
+
+import conf
+from utils.log import logger
+from utils.metrics import PLATFORM_NAMES
+from utils.network import RetryPolicy, RetryError
+
+# 接口探测的超时时间（秒），可在 conf.py 中通过 COOKIE_PROBE_TIMEOUT 配置
+DEFAULT_TIMEOUT = 3
+
+# 限流和服务端错误按临时错误重试，401 直接判定为失效；
+# 403 常见于风控 / WAF 拦截（登录态可能仍有效），只有响应内容确认未登录时才判定为失效
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# 连接失败、超时和上面的状态码最多请求 3 次，总共不超过 5 秒，仍失败时回退浏览器校验
+PROBE_RETRY = RetryPolicy('cookie_probe', max_attempts=3, budget=5, base_delay=0.2, max_delay=1,
+                          retry_on=(httpx.TransportError, httpx.HTTPStatusError))
+
+USER_AGENT = ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) '
+              'Chrome/124.0.0.0 Safari/537.36')
+
+
+def _douyin_verdict(status_code, data):
+    if data.get('status_code') == 0 and data.get('user'):
+        return True
+    # status_code 8: 用户未登录
+    if data.get('status_code') == 8:
+        return False
+    return None
+
+
+def _xiaohongshu_verdict(status_code, data):
+    if data.get('success') and data.get('data'):
+        return True
+    # code -100: 登录已过期
+    if data.get('code') == -100:
+        return False
+    return None
+
+
+def _tencent_verdict(status_code, data):
+    if data.get('errCode') == 0 and (data.get('data') or {}).get('finderUser'):
+        return True
+    # 300333 / 300334: 登录态失效
+    if data.get('errCode') in (300333, 300334):
+        return False
+    return None
+
+
+def _kuaishou_verdict(status_code, data):
+    if data.get('result') == 1 and data.get('data'):
+        return True
+    # result 109: 未登录
+    if data.get('result') == 109:
+        return False
+    return None
+
+
+# 每个平台一个轻量的创作者接口：(请求方法, 地址, 结果判断)
+PROBES = {
+    'douyin': ('GET', 'https://creator.douyin.com/web/api/media/user/info/', _douyin_verdict),
+    'xiaohongshu': ('GET', 'https://creator.xiaohongshu.com/api/galaxy/user/info', _xiaohongshu_verdict),
+    'tencent': ('POST', 'https://channels.weixin.qq.com/cgi-bin/mmfinderassistant-bin/auth/auth_data',
+                _tencent_verdict),
+    'kuaishou': ('POST', 'https://cp.kuaishou.com/rest/v2/creator/pc/authority/account/current',
+                 _kuaishou_verdict),
+}
+
+_client = None
+_client_lock = threading.Lock()
+# storage_state 解析结果缓存：路径 -> (修改时间, cookies)
+_state_cache = {}
+
+
+def get_client():
+    """进程内共用的 HTTP 客户端（带连接池，线程安全，可跨事件循环使用）"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = httpx.Client(
+                timeout=getattr(conf, 'COOKIE_PROBE_TIMEOUT', DEFAULT_TIMEOUT),
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+                headers={'User-Agent': USER_AGENT},
+                follow_redirects=False,
+            )
+        return _client
+
+
+def load_cookies(account_file):
+    """读取 Playwright storage_state 中的 cookies，按文件修改时间缓存"""
+    account_file = str(account_file)
+    mtime = os.path.getmtime(account_file)
+    cached = _state_cache.get(account_file)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    with open(account_file, 'r', encoding='utf-8') as f:
+        cookies = json.load(f).get('cookies', [])
+    _state_cache[account_file] = (mtime, cookies)
+    return cookies
+
+
+def cookie_header(cookies, url):
+    """拼出访问 url 时浏览器会带上的 Cookie 头（忽略已过期的 cookie）"""
+    parts = urlsplit(url)
+    host, path = parts.hostname or '', parts.path or '/'
+    now = time.time()
+    pairs = []
+    for cookie in cookies:
+        domain = cookie.get('domain', '').lstrip('.')
+        if not domain or not (host == domain or host.endswith('.' + domain)):
+            continue
+        if not path.startswith(cookie.get('path') or '/'):
+            continue
+        expires = cookie.get('expires', -1)
+        if expires not in (None, -1) and 0 < expires < now:
+            continue
+        pairs.append(f"{cookie['name']}={cookie['value']}")
+    return '; '.join(pairs)
+
+
+def _rebase(url, base_url):
+    """把平台地址的协议和域名替换为 base_url（对接本地桩服务时使用）"""
+    if not base_url:
+        return url
+    parts = urlsplit(url)
+    return base_url.rstrip('/') + parts.path + (f'?{parts.query}' if parts.query else '')
+
+
+def probe_cookie_sync(platform, account_file, base_url=None):
+    """
+    用接口探测 cookie 是否有效：返回 True / False；无法判断（网络错误、接口变化等）时返回 None，
+    由调用方回退到浏览器校验。base_url 默认取 conf.py 中的 COOKIE_PROBE_BASE_URL。
+    """
+    platform = PLATFORM_NAMES.get(platform, platform)
+    if platform not in PROBES:
+        return None
+    method, url, verdict = PROBES[platform]
+    try:
+        cookies = cookie_header(load_cookies(account_file), url)
+    except (OSError, ValueError) as e:
+        logger.warning(f"[cookie-probe] 读取 cookie 文件失败 {account_file}: {e}")
+        return None
+    if not cookies:
+        return False
+
+    base_url = base_url if base_url is not None else getattr(conf, 'COOKIE_PROBE_BASE_URL', '')
+    start = time.perf_counter()
+
+    def request():
+        response = get_client().request(method, _rebase(url, base_url), headers={
+            'Cookie': cookies,
+            'Referer': f"{urlsplit(url).scheme}://{urlsplit(url).hostname}/",
+        }, json={} if method == 'POST' else None)
+        if response.status_code in RETRY_STATUSES:
+            raise httpx.HTTPStatusError(f"status {response.status_code}", request=response.request,
+                                        response=response)
+        return response
+
+    try:
+        response = PROBE_RETRY.call(request)
+    except (httpx.HTTPError, RetryError) as e:
+        logger.warning(f"[cookie-probe] {platform} 请求失败，回退浏览器校验: {e}")
+        return None
+
+    if response.status_code == 401:
+        result = False
+    elif response.status_code not in (200, 403):
+        result = None
+    else:
+        try:
+            data = response.json()
+        except ValueError:
+            data = None
+        # 只有 JSON 对象才交给各平台判断，列表、字符串等一律视为无法判定
+        result = verdict(response.status_code, data) if isinstance(data, dict) else None
+        if response.status_code == 403 and result is not False:
+            # 被拦截的页面不能说明 cookie 有效，交给浏览器校验
+            result = None
+    logger.info(f"[cookie-probe] {platform} {os.path.basename(str(account_file))}: {result} "
+                f"({(time.perf_counter() - start) * 1000:.0f}ms)")
+    return result
+
+
+async def probe_cookie(platform, account_file, base_url=None):
+    """probe_cookie_sync 的异步版本，在线程池中执行，不阻塞事件循环"""
+    if not getattr(conf, 'COOKIE_PROBE_ENABLED', True):
+        return None
+    return await asyncio.to_thread(probe_cookie_sync, platform, account_file, base_url)
@@ -0,0 +1,134 @@
+# 单步等待目标元素出现的最长时间（秒）
+STEP_TIMEOUT = 5
+# 翻页类步骤（如切换月份）最多点击的次数
+MAX_UNTIL_CLICKS = 12
+
+# 在页面内按顺序执行选择步骤：等待目标元素出现（只看可见元素）后模拟鼠标点击，
+# 每一步由 UI 的实际变化推进，不做固定等待。返回 {ok, step, clicked}，step 为失败的步骤序号
+PICK_JS = """
+async (el, [steps, timeout, maxClicks]) => {
+  const doc = el.ownerDocument;
+  const win = doc.defaultView;
+  const sleep = ms => new Promise(resolve => win.setTimeout(resolve, ms));
+  const textOf = e => (e.innerText || e.textContent || '').trim();
+  const visible = e => {
+    const rect = e.getBoundingClientRect();
+    if (!rect.width && !rect.height) return false;
+    const style = win.getComputedStyle(e);
+    return style.visibility !== 'hidden' && style.display !== 'none';
+  };
+  const find = step => {
+    let found = Array.from(doc.querySelectorAll(step.selector)).filter(visible);
+    if (step.exclude) found = found.filter(e => !String(e.className || '').includes(step.exclude));
+    if (step.text != null) found = found.filter(e => textOf(e) === step.text);
+    if (step.contains != null) found = found.filter(e => textOf(e).includes(step.contains));
+    const index = step.index || 0;
+    return found[index < 0 ? found.length + index : index] || null;
+  };
+  // 虚拟列表只渲染可见的选项：找不到时把列表往下翻一屏
+  const scroll = step => {
+    const boxes = Array.from(doc.querySelectorAll(step.scroll)).filter(visible);
+    const box = boxes[boxes.length - 1];
+    if (box && box.scrollTop + box.clientHeight < box.scrollHeight) box.scrollTop += box.clientHeight;
+  };
+  const waitFor = async (step, ms) => {
+    const end = Date.now() + ms;
+    while (true) {
+      const found = find(step);
+      if (found || Date.now() >= end) return found;
+      if (step.scroll) scroll(step);
+      await sleep(50);
+    }
+  };
+  const click = e => {
+    e.scrollIntoView({block: 'nearest', inline: 'nearest'});
+    const init = {bubbles: true, cancelable: true, view: win};
+    for (const type of ['pointerdown', 'mousedown', 'pointerup', 'mouseup']) {
+      const Event = type.startsWith('pointer') && win.PointerEvent ? win.PointerEvent : win.MouseEvent;
+      e.dispatchEvent(new Event(type, init));
+    }
+    e.click();
+  };
+  const clicked = [];
+  for (let i = 0; i < steps.length; i++) {
+    const step = steps[i];
+    if (step.until) {
+      // 重复点击（翻页箭头）直到 until 对应的元素出现
+      for (let times = 0; !find(step.until); times++) {
+        const target = times < maxClicks ? await waitFor(step, timeout) : null;
+        if (!target) return {ok: false, step: i, clicked};
+        click(target);
+        await waitFor(step.until, 1000);
+      }
+      continue;
+    }
+    const target = await waitFor(step, timeout);
+    if (!target) {
+      if (step.optional) continue;
+      return {ok: false, step: i, clicked};
+    }
+    click(target);
+    clicked.push(textOf(target));
+  }
+  return {ok: true, step: null, clicked};
+}
+"""
+
+
+class DatePickerError(Exception):
+    """某一步找不到要点击的元素，step 为步骤序号"""
+
+    def __init__(self, message, step=None, clicked=None):
+        super().__init__(message)
+        self.step = step
+        self.clicked = clicked or []
+
+
+def step(selector, text=None, contains=None, index=0, exclude=None, scroll=None, until=None, optional=False):
+    """
+    一个选择步骤：点击 selector 匹配的第 index 个可见元素（负数从后往前数）。
+    - text / contains：按文字完全匹配 / 包含筛选；exclude：跳过 class 中包含该字符串的元素（如禁用的日期）；
+    - scroll：目标在虚拟列表中时，找不到就滚动该容器；
+    - until：另一个 step，重复点击本步骤的元素直到它出现（翻到目标月份）；
+    - optional：找不到时跳过而不是失败。
+    """
+    return {"selector": selector, "text": text, "contains": contains, "index": index, "exclude": exclude,
+            "scroll": scroll, "until": until, "optional": optional}
+
+
+def _scope(target):
+    """page / frame_locator / locator 统一为一个元素 locator，脚本从它所在的 document 开始查找"""
+    if hasattr(target, 'goto') or not hasattr(target, 'evaluate'):
+        return target.locator('html')
+    return target
+
+
+async def pick(target, steps, timeout=STEP_TIMEOUT, name='日期选择'):
+    """
+    在页面内一次执行全部选择步骤（一次 evaluate），返回依次点击的元素文字；
+    某一步找不到元素时抛出 DatePickerError。
+    """
+    result = await _scope(target).first.evaluate(PICK_JS, [steps, int(timeout * 1000), MAX_UNTIL_CLICKS])
+    if not result['ok']:
+        failed = steps[result['step']]
+        raise DatePickerError(
+            f"{name} 第 {result['step'] + 1} 步未找到 {failed['selector']} "
+            f"{failed['text'] or failed['contains'] or ''}（已点击 {result['clicked']}）",
+            result['step'], result['clicked'])
+    return result['clicked']
+
+
+async def type_into(page, locator, text, commit="Enter"):
+    """
+    输入框类的日期选择器：点击（等待输入框出现）、全选后一次写入文字并按 commit 确认，
+    返回输入框最终的值，由调用方核对
+    """
+    await locator.click()
+    await page.keyboard.press("Control+KeyA")
+    await page.keyboard.insert_text(text)
+    if commit:
+        await page.keyboard.press(commit)
+    try:
+        return await locator.input_value(timeout=1000)
+    except Exception:
+        return None
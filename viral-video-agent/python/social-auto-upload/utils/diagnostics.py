@@ -0,0 +1,184 @@
+import asyncio
+import os
+import random
+import re
+import shutil
+import time
+import uuid
+import zlib
+from collections import deque
+from pathlib import Path
+
+import conf
+from conf import BASE_DIR
+from utils.log import logger
+
+# 诊断文件的保存目录
+DIAGNOSTICS_DIR = Path(BASE_DIR / "media" / "diagnostics")
+# 每次上传在内存中保留的最近快照数，可在 conf.py 中通过 DIAGNOSTICS_BUFFER_SIZE 配置
+DEFAULT_BUFFER_SIZE = 5
+# 正常流程中记录检查点快照的上传比例（0~1），出错时的快照不受影响，可通过 DIAGNOSTICS_SAMPLE_RATE 配置
+DEFAULT_SAMPLE_RATE = 0.1
+# 诊断目录的总大小上限（字节），超出时从最早的开始删除，可通过 DIAGNOSTICS_MAX_BYTES 配置
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+# 单次截图的超时（秒）
+CAPTURE_TIMEOUT = 10
+# 出错时等待后台快照完成的最长时间（秒）
+DRAIN_TIMEOUT = 5
+
+_UNSAFE_NAME_RE = re.compile(r'[^\w.-]+')
+
+
+def _safe_name(name):
+    return _UNSAFE_NAME_RE.sub('_', str(name))[:60] or 'snapshot'
+
+
+def _dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def enforce_retention(max_bytes=None):
+    """诊断目录超过大小上限时，按时间从旧到新删除，至少保留最新的一份"""
+    max_bytes = getattr(conf, 'DIAGNOSTICS_MAX_BYTES', DEFAULT_MAX_BYTES) if max_bytes is None else max_bytes
+    if not DIAGNOSTICS_DIR.exists():
+        return
+    entries = sorted((entry for entry in DIAGNOSTICS_DIR.iterdir() if entry.is_dir()),
+                     key=lambda entry: entry.stat().st_mtime)
+    sizes = [_dir_size(entry) for entry in entries]
+    total = sum(sizes)
+    for entry, size in zip(entries[:-1], sizes):
+        if total <= max_bytes:
+            break
+        shutil.rmtree(entry, ignore_errors=True)
+        total -= size
+
+
+def _write(name, reason, snapshots, extra=None):
+    """在线程中执行：把快照写入 media/diagnostics/<时间>_<名称>_<原因>_<随机>/"""
+    folder = DIAGNOSTICS_DIR / (f"{time.strftime('%Y%m%d_%H%M%S')}_{_safe_name(name)}_"
+                                f"{_safe_name(reason)}_{uuid.uuid4().hex[:6]}")
+    folder.mkdir(parents=True, exist_ok=True)
+    for index, snapshot in enumerate(snapshots):
+        base = folder / f"{index:02d}_{_safe_name(snapshot['label'])}"
+        if snapshot.get('screenshot'):
+            base.with_suffix('.jpg').write_bytes(snapshot['screenshot'])
+        if snapshot.get('html'):
+            base.with_suffix('.html').write_bytes(zlib.decompress(snapshot['html']))
+        with open(base.with_suffix('.txt'), 'w', encoding='utf-8') as f:
+            f.write(f"time={time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(snapshot['time']))}\n")
+            f.write(f"url={snapshot.get('url', '')}\n")
+            f.write(f"title={snapshot.get('title', '')}\n")
+            for k, v in {**(extra or {}), **snapshot.get('info', {})}.items():
+                f.write(f"{k}={v}\n")
+            for error in snapshot.get('errors', []):
+                f.write(f"error={error}\n")
+    enforce_retention()
+    return folder
+
+
+class Recorder(object):
+    """
+    单次上传的诊断记录：
+    - checkpoint() 在后台截取快照（视口截图 + HTML + 页面信息），不等待页面空闲，不阻塞上传流程；
+      只对按 DIAGNOSTICS_SAMPLE_RATE 抽中的上传记录，保存在内存中最近 DIAGNOSTICS_BUFFER_SIZE 份；
+    - failure() 在出错时截取当前页面，连同内存中的快照一起写入磁盘，成功的上传不写任何文件。
+    """
+
+    def __init__(self, name, info_script=None, extra=None, sample_rate=None):
+        self.name = name
+        self.info_script = info_script
+        self.extra = extra or {}
+        rate = getattr(conf, 'DIAGNOSTICS_SAMPLE_RATE', DEFAULT_SAMPLE_RATE) if sample_rate is None else sample_rate
+        self.sampled = random.random() < rate
+        self.buffer = deque(maxlen=max(1, getattr(conf, 'DIAGNOSTICS_BUFFER_SIZE', DEFAULT_BUFFER_SIZE)))
+        self.page = None
+        # 是否已经保存过出错现场，避免同一次失败在外层重复保存
+        self.flushed = False
+        self._tasks = set()
+
+    def attach(self, page):
+        """设置默认截取的页面"""
+        self.page = page
+
+    def checkpoint(self, label, page=None):
+        """记录一个检查点：未被抽中或没有页面时不做任何事，否则在后台截取，立即返回"""
+        page = page or self.page
+        if not self.sampled or page is None:
+            return
+        task = asyncio.create_task(self._capture(page, label))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def failure(self, label, page=None):
+        """出错时调用：截取当前页面并把内存中的快照写入磁盘，返回保存目录（失败时返回 None）"""
+        page = page or self.page
+        try:
+            await self._drain()
+            if page is not None:
+                await self._capture(page, label)
+            return await self.flush(label)
+        except Exception as e:
+            logger.warning(f"[diagnostics] 保存诊断文件失败: {e}")
+            return None
+
+    async def flush(self, reason):
+        """把内存中的快照写入磁盘并清空，没有快照时返回 None"""
+        snapshots = list(self.buffer)
+        self.buffer.clear()
+        if not snapshots:
+            return None
+        folder = await asyncio.to_thread(_write, self.name, reason, snapshots, self.extra)
+        self.flushed = True
+        return folder
+
+    async def close(self):
+        """上传结束：取消未完成的后台快照并释放内存"""
+        for task in list(self._tasks):
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        self.buffer.clear()
+
+    async def _drain(self):
+        if self._tasks:
+            await asyncio.wait(list(self._tasks), timeout=DRAIN_TIMEOUT)
+
+    async def _capture(self, page, label):
+        snapshot = {"label": label, "time": time.time(), "errors": []}
+        try:
+            snapshot["url"] = page.url
+        except Exception:
+            pass
+        if page.is_closed():
+            snapshot["errors"].append("page closed")
+            self.buffer.append(snapshot)
+            return
+        try:
+            snapshot["screenshot"] = await page.screenshot(type='jpeg', quality=70, timeout=CAPTURE_TIMEOUT * 1000)
+        except Exception as e:
+            snapshot["errors"].append(f"screenshot: {e}")
+        try:
+            content = await page.content()
+            # 内存中压缩保存，写盘时再解压
+            snapshot["html"] = await asyncio.to_thread(zlib.compress, content.encode('utf-8'), 1)
+        except Exception as e:
+            snapshot["errors"].append(f"html: {e}")
+        try:
+            snapshot["title"] = await page.title()
+        except Exception:
+            pass
+        if self.info_script:
+            try:
+                info = await page.evaluate(self.info_script)
+                if isinstance(info, dict):
+                    snapshot["info"] = info
+            except Exception as e:
+                snapshot["errors"].append(f"info: {e}")
+        self.buffer.append(snapshot)
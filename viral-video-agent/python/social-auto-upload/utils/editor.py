@@ -0,0 +1,88 @@
+import re
+
+from utils.log import logger
+
+# 聚焦编辑器并把光标移到末尾：contenteditable 取自身或内部第一个可编辑元素，input / textarea 直接移动光标
+FOCUS_END_JS = """el => {
+  const target = el.isContentEditable ? el : (el.querySelector('[contenteditable="true"]') || el);
+  target.focus();
+  if (typeof target.value === 'string' && target.setSelectionRange) {
+    target.setSelectionRange(target.value.length, target.value.length);
+    return;
+  }
+  const selection = window.getSelection();
+  if (selection) {
+    const range = document.createRange();
+    range.selectNodeContents(target);
+    range.collapse(false);
+    selection.removeAllRanges();
+    selection.addRange(range);
+  }
+}"""
+# 读取编辑器的全部文字
+READ_TEXT_JS = "el => typeof el.value === 'string' ? el.value : (el.innerText || el.textContent || '')"
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def _normalize(text):
+    return _WHITESPACE_RE.sub('', text or '')
+
+
+def hashtag_text(tags, separator=' '):
+    """话题拼成一段文字：#a #b #c"""
+    return separator.join(f"#{tag}" for tag in tags)
+
+
+async def focus_end(page, editor):
+    """聚焦编辑器并把光标放到内容末尾，返回编辑器的 locator"""
+    locator = page.locator(editor) if isinstance(editor, str) else editor
+    locator = locator.first
+    await locator.evaluate(FOCUS_END_JS)
+    return locator
+
+
+async def read_text(locator):
+    return await locator.evaluate(READ_TEXT_JS)
+
+
+async def fill_editor(page, editor, title=None, tags=(), clear=True, title_newline=True, name='editor'):
+    """
+    在富文本编辑器中填写标题和话题：标题和全部话题各用一次 insertText 写入（不逐字按键），
+    最后按一次空格让平台把最后一个话题转换为话题标签并关闭联想弹窗，再读取一次内容确认。
+    - editor 为选择器或 locator；clear 为 True 时先清空原有内容；
+    - title_newline 为 True 时标题后按回车换行再写话题；
+    - 确认时发现缺少的部分（编辑器不接受 insertText 等）按原来的方式逐字补输入（clear 时清空后全部重新输入）。
+    返回内容是否完整。
+    """
+    tags = [tag for tag in tags if tag]
+    locator = await focus_end(page, editor)
+    if clear:
+        await page.keyboard.press("Control+KeyA")
+        await page.keyboard.press("Delete")
+    if title:
+        await page.keyboard.insert_text(title)
+        if tags and title_newline:
+            await page.keyboard.press("Enter")
+    if tags:
+        await page.keyboard.insert_text(hashtag_text(tags))
+        await page.keyboard.press("Space")
+
+    parts = ([title] if title else []) + [f"#{tag}" for tag in tags]
+    content = _normalize(await read_text(locator))
+    missing = [part for part in parts if _normalize(part) not in content]
+    if not missing:
+        return True
+
+    logger.warning(f"[editor] {name} 批量输入后缺少 {missing}，改为逐字输入")
+    await focus_end(page, locator)
+    if clear:
+        # 原内容已清空，重新完整输入，避免留下批量输入时多出的换行和空格
+        await page.keyboard.press("Control+KeyA")
+        await page.keyboard.press("Delete")
+        missing = parts
+    for part in missing:
+        await page.keyboard.type(part)
+        await page.keyboard.press("Space" if part.startswith('#') else "Enter")
+    content = _normalize(await read_text(locator))
+    return all(_normalize(part) in content for part in parts)
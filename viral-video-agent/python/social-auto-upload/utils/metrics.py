@@ -0,0 +1,198 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# 平台标识与名称，标签统一使用名称
+PLATFORM_NAMES = {1: 'xiaohongshu', 2: 'tencent', 3: 'douyin', 4: 'kuaishou'}
+
+# 页面操作类耗时的分桶（秒）
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+# 数据库操作的分桶（秒）
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+
+
+def platform_name(platform):
+    if platform is None:
+        return ''
+    return PLATFORM_NAMES.get(platform, str(platform))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric(object):
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} 需要标签 {self.labelnames}，实际为 {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        with self._lock:
+            lines.extend(self._samples())
+        return lines
+
+
+class Counter(_Metric):
+    """只增不减的计数"""
+    type = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self):
+        for key, value in sorted(self._values.items()):
+            yield f"{self.name}{_format_labels(zip(self.labelnames, key))} {_format_value(value)}"
+
+
+class Histogram(_Metric):
+    """按分桶统计的耗时分布，输出 _bucket / _sum / _count"""
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[index] += 1
+            self._values[key] = (counts, total + value)
+
+    def _samples(self):
+        for key, (counts, total) in sorted(self._values.items()):
+            pairs = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                yield f"{self.name}_bucket{_format_labels(pairs + [('le', _format_value(bound))])} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(pairs)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(pairs)} {cumulative}"
+
+
+class Registry(object):
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Prometheus 文本格式（text/plain; version=0.0.4）"""
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+BROWSER_LAUNCH = registry.register(Histogram(
+    'sau_browser_launch_seconds', '启动浏览器耗时', ('platform', 'browser')))
+PAGE_NAVIGATION = registry.register(Histogram(
+    'sau_page_navigation_seconds', '打开上传页面耗时', ('platform',)))
+UPLOAD_TRANSFER = registry.register(Histogram(
+    'sau_upload_transfer_seconds', '从选择文件到平台提示上传完成的耗时', ('platform',)))
+UPLOAD_WAIT = registry.register(Histogram(
+    'sau_upload_wait_seconds', '轮询等待上传完成（detect_upload_status）的耗时', ('platform',)))
+PUBLISH_WAIT = registry.register(Histogram(
+    'sau_publish_wait_seconds', '点击发布并轮询等待发布成功（click_publish）的耗时', ('platform',)))
+UPLOADER_STAGE = registry.register(Histogram(
+    'sau_uploader_stage_seconds', '上传器各阶段（open / attach / metadata / wait_upload / schedule / publish 等）的耗时',
+    ('platform', 'stage')))
+PUBLISH_STAGE = registry.register(Histogram(
+    'sau_publish_stage_seconds', '发布子任务从开始到进入各阶段的耗时', ('platform', 'stage')))
+PUBLISH_TASKS = registry.register(Counter(
+    'sau_publish_tasks_total', '已结束的发布子任务数（status 为 success / failed / skipped）', ('platform', 'status')))
+COOKIE_CHECK = registry.register(Histogram(
+    'sau_cookie_check_seconds', '账号 cookie 校验耗时', ('platform', 'source')))
+COOKIE_CHECKS = registry.register(Counter(
+    'sau_cookie_checks_total', '账号 cookie 校验次数（source 为 cache / probe / browser）',
+    ('platform', 'source', 'result')))
+BLOCKED_REQUESTS = registry.register(Counter(
+    'sau_blocked_requests_total', '精简模式拦截的请求数（reason 为资源类型或 tracker）', ('platform', 'reason')))
+RETRIES = registry.register(Counter(
+    'sau_retries_total', '重试策略执行结果（result 为 success / retry / permanent / exhausted / timeout）',
+    ('operation', 'result')))
+DB_QUERY = registry.register(Histogram(
+    'sau_db_query_seconds', '数据库操作（取连接到提交）耗时', ('platform',), buckets=DB_BUCKETS))
+
+
+@contextmanager
+def timer(histogram, **labels):
+    """统计 with 块的耗时（异步代码中同样可用），出现异常时也会记录"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.observe(time.perf_counter() - start, **labels)
+
+
+# 发布子任务的结束阶段 -> sau_publish_tasks_total 的 status 标签
+FINAL_STAGES = {'published': 'success', 'failed': 'failed', 'skipped': 'skipped'}
+# 发布子任务进入各阶段的时间：(jobId, taskId) -> {阶段: 时间}
+_task_stages = {}
+_task_stages_lock = threading.Lock()
+
+
+def observe_stage(scope, stage, now=None):
+    """由 utils.progress.emit 调用：记录发布子任务各阶段的耗时"""
+    now = now or time.time()
+    key = (scope['jobId'], scope['taskId'])
+    platform = platform_name(scope['platform'])
+    with _task_stages_lock:
+        stages = _task_stages.setdefault(key, {})
+        stages.setdefault(stage, now)
+        started = stages.get('started', now)
+        attached = stages.get('file_attached')
+        if stage in FINAL_STAGES:
+            _task_stages.pop(key, None)
+    if stage == 'uploading':
+        return
+    PUBLISH_STAGE.observe(now - started, platform=platform, stage=stage)
+    if stage == 'uploaded' and attached is not None:
+        UPLOAD_TRANSFER.observe(now - attached, platform=platform)
+    if stage in FINAL_STAGES:
+        PUBLISH_TASKS.inc(platform=platform, status=FINAL_STAGES[stage])
+
+
+def forget_task(job_id, task_id):
+    """子任务执行结束（包括崩溃、被取消而没有到达结束阶段）时丢弃它的阶段时间"""
+    with _task_stages_lock:
+        _task_stages.pop((job_id, task_id), None)
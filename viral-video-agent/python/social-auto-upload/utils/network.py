@@ -1,28 +1,166 @@
 import asyncio
+import random
 import time
 from functools import wraps
 
+import conf
+from utils import metrics
+from utils.log import logger
+
+# 浏览器 / 页面已被关闭时 Playwright 报错信息中的关键字，重试不会有结果
+CLOSED_MARKERS = (
+    'Target page, context or browser has been closed',
+    'Target closed',
+    'Browser has been closed',
+    'Browser closed',
+    'Connection closed',
+)
+
+# 点击发布后等待发布成功的最长时间（秒），可在 conf.py 中通过 PUBLISH_CONFIRM_TIMEOUT 配置
+DEFAULT_PUBLISH_CONFIRM_TIMEOUT = 600
+
+
+class PermanentError(Exception):
+    """不应重试的错误，RetryPolicy 遇到时立即抛出"""
+
+
+class RetryError(Exception):
+    """重试次数用完仍然失败，last_error 为最后一次的异常"""
+
+    def __init__(self, message, last_error=None, attempts=0):
+        super().__init__(message)
+        self.last_error = last_error
+        self.attempts = attempts
+
+
+class RetryTimeout(RetryError, TimeoutError):
+    """重试的总时间预算用完"""
+
+
+def is_closed_error(error):
+    message = str(error)
+    return any(marker in message for marker in CLOSED_MARKERS)
+
+
+def is_transient(error):
+    """默认的错误分类：页面已关闭、文件不存在、权限、编程错误等属于永久错误，其余按临时错误重试"""
+    if isinstance(error, (PermanentError, FileNotFoundError, PermissionError, TypeError, NotImplementedError,
+                          AttributeError, KeyError, ValueError)):
+        return False
+    return not is_closed_error(error)
 
-def async_retry(timeout=60, max_retries=None):
-    def decorator(func):
-        @wraps(func)
-        async def wrapper(*args, **kwargs):
-            start_time = time.time()
-            attempts = 0
-            while True:
-                try:
-                    return await func(*args, **kwargs)
-                except Exception as e:
-                    attempts += 1
-                    if max_retries is not None and attempts >= max_retries:
-                        print(f"Reached maximum retries of {max_retries}.")
-                        raise Exception(f"Failed after {max_retries} retries.") from e
-                    if time.time() - start_time > timeout:
-                        print(f"Function timeout after {timeout} seconds.")
-                        raise TimeoutError(f"Function execution exceeded {timeout} seconds timeout.") from e
-                    print(f"Attempt {attempts} failed: {e}. Retrying...")
-                    await asyncio.sleep(1)  # Sleep to avoid tight loop or provide backoff logic here
 
+class RetryPolicy(object):
+    """
+    重试策略：指数退避 + 抖动，按异常类型 / 分类函数区分临时错误和永久错误，
+    同时限制重试次数（max_attempts，包含第一次）和总时间（budget 秒），两者为 None 表示不限制。
+    - retry_on 之外的异常、give_up_on 中的异常以及 classify 返回 False 的异常立即抛出；
+    - 次数用完抛出 RetryError，时间用完抛出 RetryTimeout，原始异常在 last_error / __cause__ 中。
+    每次重试和最终结果计入 /metrics 的 sau_retries_total（operation 为 name）。
+    """
+
+    def __init__(self, name, max_attempts=None, budget=None, base_delay=0.5, max_delay=10, multiplier=2,
+                 jitter=True, retry_on=(Exception,), give_up_on=(), classify=is_transient):
+        self.name = name
+        self.max_attempts = max_attempts
+        self.budget = budget
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.retry_on = tuple(retry_on)
+        self.give_up_on = tuple(give_up_on)
+        self.classify = classify
+
+    def delay(self, attempt):
+        """第 attempt 次失败后的等待时间：指数增长到 max_delay，抖动取 [一半, 全部] 之间的随机值"""
+        delay = min(self.max_delay, self.base_delay * self.multiplier ** (attempt - 1))
+        return random.uniform(delay / 2, delay) if self.jitter else delay
+
+    def retryable(self, error):
+        if not isinstance(error, self.retry_on) or isinstance(error, self.give_up_on):
+            return False
+        return self.classify is None or self.classify(error)
+
+    def _count(self, result):
+        metrics.RETRIES.inc(operation=self.name, result=result)
+
+    def _next_delay(self, error, attempt, start):
+        """失败后决定是否继续：返回等待秒数，不再重试时抛出异常"""
+        if not self.retryable(error):
+            self._count('permanent')
+            raise error
+        if self.max_attempts is not None and attempt >= self.max_attempts:
+            self._count('exhausted')
+            raise RetryError(f"{self.name} 重试 {attempt} 次后仍失败: {error}", error, attempt) from error
+        delay = self.delay(attempt)
+        if self.budget is not None and time.monotonic() - start + delay > self.budget:
+            self._count('timeout')
+            raise RetryTimeout(f"{self.name} 超过 {self.budget} 秒仍未成功: {error}", error, attempt) from error
+        self._count('retry')
+        logger.warning(f"[retry] {self.name} 第 {attempt} 次失败: {error}，{delay:.1f} 秒后重试")
+        return delay
+
+    async def run(self, func, *args, **kwargs):
+        """按策略执行协程函数 func(*args, **kwargs)"""
+        start = time.monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                result = await func(*args, **kwargs)
+            except Exception as e:
+                await asyncio.sleep(self._next_delay(e, attempt, start))
+            else:
+                self._count('success')
+                return result
+
+    def call(self, func, *args, **kwargs):
+        """run 的同步版本"""
+        start = time.monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                time.sleep(self._next_delay(e, attempt, start))
+            else:
+                self._count('success')
+                return result
+
+    def __call__(self, func):
+        """作为装饰器使用，同步函数和协程函数均可"""
+        if asyncio.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                return await self.run(func, *args, **kwargs)
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            return self.call(func, *args, **kwargs)
         return wrapper
 
-    return decorator
\ No newline at end of file
+
+# 打开上传页面：网络抖动时重试，页面被关闭时立即失败
+NAVIGATION_RETRY = RetryPolicy('navigation', max_attempts=3, base_delay=1, max_delay=5)
+# 选择文件后等待进入发布页面
+PUBLISH_PAGE_RETRY = RetryPolicy('publish_page', budget=180, base_delay=0.5, max_delay=5)
+# 点击发布并等待跳转到作品管理页
+PUBLISH_RETRY = RetryPolicy(
+    'publish', budget=getattr(conf, 'PUBLISH_CONFIRM_TIMEOUT', DEFAULT_PUBLISH_CONFIRM_TIMEOUT),
+    base_delay=0.5, max_delay=5)
+
+
+def async_retry(timeout=60, max_retries=None, policy=None):
+    """
+    兼容旧接口的重试装饰器：最多 max_retries 次（None 不限）、总共 timeout 秒，
+    次数用完抛出 RetryError（Exception），超时抛出 RetryTimeout（TimeoutError）。
+    传入 policy 时直接使用该策略。
+    """
+    def decorator(func):
+        return (policy or RetryPolicy(func.__qualname__, max_attempts=max_retries, budget=timeout,
+                                      base_delay=1, max_delay=10))(func)
+
+    return decorator
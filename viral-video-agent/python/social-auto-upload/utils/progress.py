@@ -0,0 +1,202 @@
+import contextvars
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from queue import Queue
+
+from utils import metrics
+
+# 发布阶段，按发生顺序排列
+QUEUED = 'queued'
+STARTED = 'started'
+OPEN_PAGE = 'open_page'
+FILE_ATTACHED = 'file_attached'
+UPLOADING = 'uploading'
+UPLOADED = 'uploaded'
+METADATA_FILLED = 'metadata_filled'
+SCHEDULE_SET = 'schedule_set'
+PUBLISHED = 'published'
+FAILED = 'failed'
+# 发布台账中已发布过，未重复发布
+SKIPPED = 'skipped'
+# 整个任务（所有 文件×账号）结束，流的最后一个事件
+JOB_DONE = 'job_done'
+
+# 每个任务保留的历史事件数（新订阅者先收到历史事件）
+HISTORY_SIZE = 200
+# 任务结束后历史事件的保留时间（秒），之后再订阅只能从数据库读取最终状态
+RETENTION = 600
+
+# 当前协程所属的发布子任务，由发布队列在执行 publish_one 前设置
+_current = contextvars.ContextVar('publish_progress', default=None)
+
+
+class _JobStream(object):
+    def __init__(self):
+        self.events = deque(maxlen=HISTORY_SIZE)
+        self.subscribers = []
+        self.closed_at = None
+
+
+class ProgressBus(object):
+    """
+    进程内的发布进度事件总线：上传器在各阶段 emit 事件，
+    /jobEvents 按任务订阅，先补发历史事件再实时推送，任务结束时推送 job_done 并关闭。
+    """
+
+    def __init__(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._seq = itertools.count(1)
+
+    def _prune(self):
+        now = time.time()
+        for job_id in [job_id for job_id, stream in self._jobs.items()
+                       if stream.closed_at and now - stream.closed_at > RETENTION and not stream.subscribers]:
+            del self._jobs[job_id]
+
+    def publish(self, job_id, event):
+        event = {"id": next(self._seq), "jobId": job_id, "time": time.time(), **event}
+        with self._lock:
+            stream = self._jobs.setdefault(job_id, _JobStream())
+            stream.events.append(event)
+            for queue in stream.subscribers:
+                queue.put(event)
+        return event
+
+    def close(self, job_id, **fields):
+        """任务结束：推送 job_done 事件，订阅者收到后结束"""
+        self.publish(job_id, {"stage": JOB_DONE, **fields})
+        with self._lock:
+            self._jobs[job_id].closed_at = time.time()
+            self._prune()
+
+    def subscribe(self, job_id, after=0, running=False):
+        """
+        订阅任务事件，返回 (历史事件, 队列, 是否已结束)；after 为浏览器重连时带上的 Last-Event-ID，
+        只补发之后的事件。running 为数据库中的任务尚未结束：还没有事件时先建立流等待，
+        否则（未知、已结束或事件已过期的任务）不建立流，直接返回已结束，由调用方给出数据库中的最终状态
+        """
+        queue = Queue()
+        with self._lock:
+            stream = self._jobs.get(job_id)
+            if stream is None:
+                if not running:
+                    return [], queue, True
+                stream = self._jobs[job_id] = _JobStream()
+            history = [event for event in stream.events if event['id'] > after]
+            if stream.closed_at is None:
+                stream.subscribers.append(queue)
+            return history, queue, stream.closed_at is not None
+
+    def unsubscribe(self, job_id, queue):
+        with self._lock:
+            stream = self._jobs.get(job_id)
+            if stream is not None and queue in stream.subscribers:
+                stream.subscribers.remove(queue)
+            self._prune()
+
+
+progress_bus = ProgressBus()
+
+
+@contextmanager
+def progress_scope(job_id, task_id, platform=None, account=None, file=None):
+    """在 with 范围内（包括其中创建的协程）emit 的事件都归属于这个发布子任务"""
+    token = _current.set({
+        "jobId": job_id,
+        "taskId": task_id,
+        "platform": platform,
+        "account": account,
+        "file": os.path.basename(str(file)) if file else None,
+    })
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+def current_scope():
+    return _current.get()
+
+
+def current_platform():
+    """当前发布子任务的平台名称（用作 metrics 标签），不在发布任务中时为空字符串"""
+    scope = _current.get()
+    return metrics.platform_name(scope['platform']) if scope else ''
+
+
+def emit(stage, scope=None, **fields):
+    """上报一个阶段事件；不在发布队列中运行（如命令行直接调用上传器）时不做任何事"""
+    scope = scope or _current.get()
+    if scope is None:
+        return None
+    metrics.observe_stage(scope, stage)
+    return progress_bus.publish(scope['jobId'], {
+        "taskId": scope['taskId'],
+        "platform": scope['platform'],
+        "account": scope['account'],
+        "file": scope['file'],
+        "stage": stage,
+        **fields,
+    })
+
+
+# 注入页面的脚本：统计 XMLHttpRequest 已发送的请求体字节数（分片上传时累加各分片），
+# 通过 expose_function 暴露的 __sauUploadProgress 回传
+UPLOAD_PROGRESS_JS = """
+(() => {
+  if (window.__sauUploadHooked) return;
+  window.__sauUploadHooked = true;
+  let done = 0, seq = 0, last = 0;
+  const inflight = new Map();
+  const report = (force) => {
+    const now = Date.now();
+    if (!force && now - last < 500) return;
+    last = now;
+    let sent = done;
+    inflight.forEach(v => { sent += v; });
+    if (typeof window.__sauUploadProgress === 'function') window.__sauUploadProgress(sent);
+  };
+  const send = XMLHttpRequest.prototype.send;
+  XMLHttpRequest.prototype.send = function (body) {
+    if (body && (body instanceof Blob || body instanceof ArrayBuffer || ArrayBuffer.isView(body) || body instanceof FormData)) {
+      const id = ++seq;
+      this.upload.addEventListener('progress', e => { inflight.set(id, e.loaded); report(false); });
+      this.addEventListener('loadend', () => {
+        if (this.status >= 200 && this.status < 300) done += inflight.get(id) || 0;
+        inflight.delete(id);
+        report(true);
+      });
+    }
+    return send.apply(this, arguments);
+  };
+})();
+"""
+
+
+async def track_upload_progress(page, file_path):
+    """
+    在页面打开前调用：按浏览器实际发出的上传请求字节数，以 uploading 事件上报百分比（每变化 1% 最多一次）。
+    百分比在收到 uploaded 之前最多到 99
+    """
+    scope = _current.get()
+    if scope is None:
+        return
+    try:
+        total = os.path.getsize(file_path)
+    except OSError:
+        return
+    state = {"percent": -1}
+
+    def on_progress(sent):
+        percent = min(99, int(sent * 100 / total)) if total else 0
+        if percent > state['percent']:
+            state['percent'] = percent
+            emit(UPLOADING, scope, percent=percent, bytes=sent, total=total)
+
+    await page.expose_function('__sauUploadProgress', on_progress)
+    await page.add_init_script(UPLOAD_PROGRESS_JS)
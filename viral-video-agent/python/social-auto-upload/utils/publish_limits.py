@@ -0,0 +1,53 @@
+import asyncio
+
+import conf
+from utils.log import logger
+
+# 本机同时进行的上传总数上限，可在 conf.py 中通过 PUBLISH_MAX_CONCURRENCY 配置
+DEFAULT_MAX_CONCURRENCY = 4
+# 每个平台同时进行的上传数上限（1 小红书 2 视频号 3 抖音 4 快手），可通过 PUBLISH_PLATFORM_CONCURRENCY 覆盖
+DEFAULT_PLATFORM_CONCURRENCY = {1: 2, 2: 2, 3: 3, 4: 2}
+
+
+def max_concurrency():
+    return max(1, int(getattr(conf, 'PUBLISH_MAX_CONCURRENCY', DEFAULT_MAX_CONCURRENCY)))
+
+
+def platform_concurrency(type):
+    limits = {**DEFAULT_PLATFORM_CONCURRENCY, **getattr(conf, 'PUBLISH_PLATFORM_CONCURRENCY', {})}
+    return max(1, int(limits.get(type, 1)))
+
+
+async def fan_out(apps, type, concurrency=None, run=None):
+    """
+    并发执行一批上传：不同账号同时上传，同一账号的多个视频按顺序上传（共用同一个 cookie 文件）。
+    同时进行的上传数受本机上限和平台上限约束，concurrency 可进一步收紧（传 1 即逐个上传）。
+    run 为执行单个上传的协程函数，默认 app.main()。
+    所有上传结束后，若有失败则抛出第一个异常。
+    """
+    run = run or (lambda app: app.main())
+    limit = min(max_concurrency(), platform_concurrency(type))
+    if concurrency:
+        limit = min(limit, concurrency)
+    semaphore = asyncio.Semaphore(limit)
+
+    by_account = {}
+    for app in apps:
+        by_account.setdefault(str(app.account_file), []).append(app)
+
+    errors = []
+
+    async def run_account(account_apps):
+        for app in account_apps:
+            async with semaphore:
+                try:
+                    await run(app)
+                except Exception as e:
+                    # 单个上传失败不影响其他账号和该账号后续的视频
+                    logger.error(f"[publish] 平台 {type} 上传失败 {app.file_path} -> {app.account_file}: {e}")
+                    errors.append(e)
+
+    logger.info(f"[publish] 平台 {type}: {len(apps)} 个上传，{len(by_account)} 个账号，并发上限 {limit}")
+    await asyncio.gather(*(run_account(account_apps) for account_apps in by_account.values()))
+    if errors:
+        raise errors[0]
@@ -0,0 +1,137 @@
+import asyncio
+
+from playwright.async_api import Error as PlaywrightError
+
+import conf
+from utils.network import is_closed_error
+
+# 等待视频上传完成的最长时间（秒），可在 conf.py 中通过 UPLOAD_WAIT_TIMEOUT 配置
+DEFAULT_UPLOAD_TIMEOUT = 3600
+# 页面没有 DOM 变化时的兜底检查间隔（毫秒），覆盖 canvas、closed shadow root 等观察不到的变化
+FALLBACK_INTERVAL = 1000
+# 同一批 DOM 变化最多每隔多少毫秒检查一次条件，避免上传进度频繁刷新时反复计算
+THROTTLE = 100
+# 处理上传错误（重新上传）后，等待错误提示消失的最长时间（秒）
+ERROR_CLEAR_TIMEOUT = 30
+# 页面跳转 / 刷新导致脚本中断时 Playwright 报错信息中的关键字，只有这类错误在新页面上继续等待
+NAVIGATION_MARKERS = (
+    'Execution context was destroyed',
+    'because of a navigation',
+    'Cannot find context with specified id',
+)
+
+# 在页面中执行的等待脚本：先检查一次，之后在 DOM 变化（包括已打开的 shadow root 内）或兜底定时器触发时
+# 重新检查，条件为真时返回其值，超时返回 null。条件函数签名为 (arg, dom) => 值，
+# dom.q / dom.qa / dom.hasText 会穿透 shadow root 查找元素（与 Playwright 的 locator 一致）
+WAIT_JS = """
+async ([arg, timeout, interval, throttle]) => {
+  const predicate = %s;
+  let roots = [document];
+  const collect = () => {
+    const found = [document];
+    const walk = root => root.querySelectorAll('*').forEach(el => {
+      if (el.shadowRoot) { found.push(el.shadowRoot); walk(el.shadowRoot); }
+    });
+    walk(document);
+    roots = found;
+  };
+  const qa = selector => roots.flatMap(root => Array.from(root.querySelectorAll(selector)));
+  const dom = {
+    qa,
+    q: selector => qa(selector)[0] || null,
+    hasText: (selector, text) => qa(selector).some(el => (el.textContent || '').includes(text)),
+  };
+  const check = () => { try { return predicate(arg, dom); } catch (e) { return null; } };
+  collect();
+  const first = check();
+  if (first) return first;
+  return await new Promise(resolve => {
+    const observed = new WeakSet();
+    let done = false, scheduled = null, poll = null, timer = null;
+    const finish = value => {
+      if (done) return;
+      done = true;
+      observer.disconnect();
+      clearTimeout(scheduled);
+      clearInterval(poll);
+      clearTimeout(timer);
+      resolve(value);
+    };
+    const run = () => { scheduled = null; const value = check(); if (value) finish(value); };
+    const observer = new MutationObserver(() => { if (!scheduled) scheduled = setTimeout(run, throttle); });
+    const observe = () => roots.forEach(root => {
+      if (observed.has(root)) return;
+      observed.add(root);
+      observer.observe(root, {childList: true, subtree: true, attributes: true, characterData: true});
+    });
+    observe();
+    poll = setInterval(() => { collect(); observe(); run(); }, interval);
+    timer = setTimeout(() => finish(null), timeout);
+  });
+}
+"""
+
+
+class WaitTimeout(TimeoutError):
+    """事件等待超时"""
+
+
+def upload_timeout():
+    return getattr(conf, 'UPLOAD_WAIT_TIMEOUT', DEFAULT_UPLOAD_TIMEOUT)
+
+
+def is_navigation_error(error):
+    message = str(error)
+    return any(marker in message for marker in NAVIGATION_MARKERS)
+
+
+def _remaining(deadline):
+    return deadline - asyncio.get_running_loop().time()
+
+
+async def wait_for_condition(page, predicate, arg=None, timeout=30):
+    """
+    在页面（或 frame）中等待 JS 条件 predicate（(arg, dom) => 值）为真，返回条件的值，超时返回 None。
+    条件由 DOM 变化触发检查，不在 Python 侧轮询；页面跳转导致脚本中断时在新页面上继续等待，
+    页面 / 浏览器被关闭或脚本本身出错（语法错误等）时直接抛出异常。
+    """
+    deadline = asyncio.get_running_loop().time() + timeout
+    script = WAIT_JS % predicate
+    while True:
+        remaining = _remaining(deadline)
+        if remaining <= 0:
+            return None
+        try:
+            return await page.evaluate(script, [arg, int(remaining * 1000), FALLBACK_INTERVAL, THROTTLE]) or None
+        except PlaywrightError as e:
+            if is_closed_error(e) or not is_navigation_error(e):
+                raise
+            # 执行上下文被销毁（页面跳转 / 刷新），等新页面加载后继续
+            try:
+                await page.wait_for_load_state('domcontentloaded', timeout=max(1, _remaining(deadline)) * 1000)
+            except PlaywrightError as e:
+                if is_closed_error(e):
+                    raise
+
+
+async def wait_for_upload(page, done, error=None, on_error=None, timeout=None, name='upload'):
+    """
+    等待视频上传完成：done 条件为真时返回；error 条件为真时调用 on_error(page)（如重新上传），
+    等错误提示消失后继续等待。总时间超过 timeout（默认 UPLOAD_WAIT_TIMEOUT）抛出 WaitTimeout。
+    """
+    timeout = upload_timeout() if timeout is None else timeout
+    deadline = asyncio.get_running_loop().time() + timeout
+    if error:
+        predicate = f"(arg, dom) => ({done})(arg, dom) ? 'done' : ({error})(arg, dom) ? 'error' : null"
+    else:
+        predicate = f"(arg, dom) => ({done})(arg, dom) ? 'done' : null"
+    while True:
+        result = await wait_for_condition(page, predicate, timeout=_remaining(deadline))
+        if result == 'done':
+            return
+        if result is None:
+            raise WaitTimeout(f"{name} 超过 {timeout} 秒仍未完成")
+        if on_error is not None:
+            await on_error(page)
+        await wait_for_condition(page, f"(arg, dom) => !({error})(arg, dom)",
+                                 timeout=min(ERROR_CLEAR_TIMEOUT, max(0, _remaining(deadline))))
@@ -181,6 +181,14 @@ function PublishPanel() {
                 return
             }
             if (!result?.success) throw new Error(result?.error || '发布失败')
+            const pending = (result?.data?.results || []).filter((r: any) => r?.pending)
+            if (pending.length) {
+                // 超过最长等待时间仍未结束的平台，任务还在 social-auto-upload 后台继续执行
+                const names = pending.map((r: any) => r.platform).join('、')
+                message.info({ content: `${names} 仍在后台发布中，请稍后在对应平台确认结果`, key: 'publish', duration: 6 })
+                setLastPublish({ type: 'success', message: `${names} 仍在后台发布中；如失败请查看日志：APPDATA/viral-video-agent/logs/social-auto-upload.log` })
+                return
+            }
             message.success({ content: '已触发发布流程（会自动打开各平台发布页并填充内容）', key: 'publish' })
             setLastPublish({ type: 'success', message: '已触发发布流程；如失败请查看日志：APPDATA/viral-video-agent/logs/social-auto-upload.log' })
         } catch (e: any) {
@@ -191,6 +199,10 @@ function PublishPanel() {
         }
     }
 
+    const handleCancelPublish = async () => {
+        await window.electronAPI?.invoke('publish-one-click-cancel')
+    }
+
     const previewRowStyle: CSSProperties = {
         display: 'flex',
         alignItems: 'center',
@@ -292,6 +304,11 @@ function PublishPanel() {
                     >
                         一键发送
                     </Button>
+                    {publishing && (
+                        <Button size="large" danger onClick={handleCancelPublish}>
+                            取消发布
+                        </Button>
+                    )}
                     <Button
                         type="primary"
                         icon={<FolderOpenOutlined />}